@@ -0,0 +1,175 @@
+"""
+client_presence.py over a 30-day window: distinct clients arriving and leaving,
+roaming between a couple of favourite APs with a daily on/off pattern and a drifting
+RSSI. Two days more than the window are recorded, so expiry and log rewrites run.
+Reports ingest time per bucket, log size on disk (vs the same data as JSONL
+client rows), memory of a store loaded from the log, load time and per-client /
+per-AP query times. Checks per-client answers against the generated ground truth
+and that the reloaded store answers like the one that wrote the log.
+
+Usage:
+    python benchmarks/bench_client_presence.py [--clients 10000] [--aps 200] [--days 30]
+"""
+
+import argparse
+import calendar
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from client_presence import NO_RSSI, ClientPresenceStore  # noqa: E402
+
+BUCKET_MINUTES = 10
+
+
+def visits(clients, aps, buckets, seed=5):
+    """Per client: (mac, first bucket, last bucket, favourite AP indexes, hour on, hour off)."""
+    rng = random.Random(seed)
+    per_day = 1440 // BUCKET_MINUTES
+    out = []
+    for c in range(clients):
+        stay = rng.randint(per_day // 2, per_day * 10)
+        first = rng.randint(-stay // 2, buckets - 1)
+        on = rng.randint(0, 12)
+        out.append(
+            (
+                "02:%02x:%02x:%02x:%02x:%02x" % tuple((c >> s) & 0xFF for s in (32, 24, 16, 8, 0)),
+                max(first, 0),
+                min(first + stay, buckets - 1),
+                rng.sample(range(aps), 2),
+                on,
+                on + rng.randint(4, 12),
+            )
+        )
+    return out
+
+
+def bucket_samples(plan, buckets, seed=6):
+    """Yield (bucket, [(mac, ap, rssi)]) in order; ground truth comes from the same samples."""
+    rng = random.Random(seed)
+    per_hour = 60 // BUCKET_MINUTES
+    per_day = 24 * per_hour
+    starts = sorted(range(len(plan)), key=lambda i: plan[i][1])
+    active, nxt = set(), 0
+    signal = {}
+    for bucket in range(buckets):
+        while nxt < len(starts) and plan[starts[nxt]][1] <= bucket:
+            active.add(starts[nxt])
+            nxt += 1
+        hour = (bucket % per_day) // per_hour
+        samples = []
+        for i in list(active):
+            mac, _, last, favourites, on, off = plan[i]
+            if bucket > last:
+                active.discard(i)
+                continue
+            if not on <= hour < off or rng.random() < 0.05:
+                continue
+            ap = favourites[0] if rng.random() < 0.85 else favourites[1]
+            signal[i] = max(-95, min(-30, signal.get(i, -60) + rng.randint(-3, 3)))
+            samples.append((mac, f"ap-{ap}", signal[i] if rng.random() > 0.02 else None))
+        yield bucket, samples
+
+
+def bucket_of(iso, bucket_sec):
+    return calendar.timegm(time.strptime(iso, "%Y-%m-%dT%H:%M:%SZ")) // bucket_sec
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000, help="distinct clients over the window")
+    parser.add_argument("--aps", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    buckets = args.days * 1440 // BUCKET_MINUTES
+    recorded = buckets + 2 * 1440 // BUCKET_MINUTES
+    bucket_sec = BUCKET_MINUTES * 60
+    base = int(time.time()) // bucket_sec - recorded
+    window = base + recorded - buckets  # first bucket still held at the end
+    plan = visits(args.clients, args.aps, recorded)
+    tracked = {plan[i][0] for i in random.Random(7).sample(range(len(plan)), min(50, len(plan)))}
+    truth = {mac: {} for mac in tracked}
+    jsonl_bytes = 0
+    samples_total = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "client_presence.bin")
+        store = ClientPresenceStore(path, BUCKET_MINUTES, args.days).load()
+        ingest_ms, rewrites = 0.0, 0
+        for bucket, samples in bucket_samples(plan, recorded):
+            ts = (base + bucket) * bucket_sec
+            (_, rewritten), ms = timed(lambda: store.record(ts, samples))
+            ingest_ms += ms
+            rewrites += bool(rewritten)
+            samples_total += len(samples)
+            if bucket % 10 == 0 and base + bucket >= window:  # JSONL estimate, every 10th bucket
+                rows = [{"ts": ts, "mac": m, "ap": a, "signal": r} for m, a, r in samples]
+                jsonl_bytes += 10 * sum(len(json.dumps(row, separators=(",", ":"))) + 1 for row in rows)
+            for mac, ap, rssi in samples:
+                if mac in truth and base + bucket >= window:
+                    truth[mac][base + bucket] = (ap, NO_RSSI if rssi is None else rssi)
+        log_bytes = os.path.getsize(path)
+        stats = store.stats()
+
+        reader, load_ms = timed(lambda: ClientPresenceStore(path, BUCKET_MINUTES, args.days, readonly=True).load())
+        tracemalloc.start()
+        loaded = ClientPresenceStore(path, BUCKET_MINUTES, args.days, readonly=True).load()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+
+        start, end = window * bucket_sec, (base + recorded) * bucket_sec
+        ok = True
+        for mac, seen in truth.items():
+            answer = reader.client(mac, start, end) or {"runs": [], "presence": "", "first_bucket": None}
+            got = {}
+            for run in answer["runs"]:
+                first = bucket_of(run["from"], bucket_sec)
+                for i, rssi in enumerate(run["rssi"]):
+                    got[first + i] = (run["ap"], NO_RSSI if rssi is None else rssi)
+            presence = int.from_bytes(bytes.fromhex(answer["presence"]), "little")
+            first = bucket_of(answer["first_bucket"], bucket_sec) if answer["first_bucket"] else 0
+            bits = {first + i for i in range(presence.bit_length()) if presence >> i & 1}
+            ok = ok and got == seen and bits == set(seen) and answer == (store.client(mac, start, end) or answer)
+
+        macs = [p[0] for p in random.Random(8).sample(plan, min(args.queries, len(plan)))]
+        _, client_ms = timed(lambda: [reader.client(mac, start, end) for mac in macs])
+        aps = [f"ap-{i}" for i in range(min(args.aps, args.queries))]
+        per_ap, ap_ms = timed(lambda: [reader.ap(ap, start, end) for ap in aps])
+        ok = ok and per_ap == [store.ap(ap, start, end) for ap in aps]
+
+    print(
+        f"{args.clients} clients, {args.aps} APs, {recorded} x {BUCKET_MINUTES} min buckets recorded, "
+        f"{stats['samples']} presence samples ({stats['runs']} runs) held of {samples_total}"
+    )
+    print(f"  ingest     {ingest_ms / recorded:8.2f} ms/bucket ({rewrites} log rewrites)")
+    print(
+        f"  disk       {log_bytes / 1e6:8.2f} MB log ({log_bytes / stats['samples']:.2f} B/sample) "
+        f"vs ~{jsonl_bytes / 1e6:.1f} MB as JSONL rows"
+    )
+    print(f"  memory     {memory / 1e6:8.2f} MB loaded ({stats['array_bytes'] / 1e6:.2f} MB in arrays)")
+    print(f"  load       {load_ms:8.1f} ms")
+    print(
+        f"  queries    client {client_ms / len(macs):6.3f} ms | AP {ap_ms / len(aps):6.3f} ms "
+        f"({args.days} days each) {'ok' if ok else 'MISMATCH'}"
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Peak memory of fetching a large UniFi stat/sta client list: full response.json()
+plus grouping (the old path) vs UniFiCollector.get_clients() streaming, served
+by the local stub controller.
+
+Usage:
+    python benchmarks/bench_client_stream.py [--clients 50000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from stub_controller import StubController, default_payloads  # noqa: E402
+from synthetic import unifi_client_body  # noqa: E402
+
+
+def full_parse(col):
+    url = f"{col.base_url}/proxy/network/api/s/{col.site}/stat/sta"
+    response = col.session.get(url, verify=False, timeout=60)
+    return nc.group_clients(nc.unwrap_data(response.json()))
+
+
+def measure(fn, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def retained_size(client_map):
+    """Approximate size of the projected output (dicts + their values)."""
+    seen = set()
+    total = 0
+    for key, entries in client_map.items():
+        total += sys.getsizeof(key) + sys.getsizeof(entries)
+        for entry in entries:
+            total += sys.getsizeof(entry)
+            for value in entry.values():
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=50000)
+    args = parser.parse_args()
+
+    body, _ = unifi_client_body(args.clients)
+    payloads = default_payloads()
+    payloads["/proxy/network/api/s/default/stat/sta"] = body
+    with StubController(payloads) as stub, tempfile.TemporaryDirectory() as tmp:
+        col = nc.UniFiCollector(
+            stub.url, "bench-key", endpoints=nc.EndpointCache(os.path.join(tmp, "endpoints.json"))
+        )
+        old, old_time, old_peak = measure(full_parse, col)
+        new, new_time, new_peak = measure(col.get_clients)
+        new_size = retained_size(new)
+
+    print(f"payload: {args.clients} clients, {len(body) / 1e6:.1f} MB JSON")
+    print(f"projected output: ~{new_size / 1e6:.1f} MB")
+    print(f"full json():  peak {old_peak / 1e6:7.1f} MB, {old_time:.2f}s")
+    print(f"streaming:    peak {new_peak / 1e6:7.1f} MB, {new_time:.2f}s")
+    if old != new:
+        print("FAIL: streaming output differs from full parse")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Wall-clock comparison of sequential vs concurrent endpoint fetching against
+a local stub controller with per-endpoint latency.
+
+Usage:
+    python benchmarks/bench_concurrent_fetch.py [--latency 0.3] [--slow 1.0]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import network_collector as nc  # noqa: E402
+from stub_controller import StubController, default_payloads  # noqa: E402
+
+
+def make_collectors(url, cache_dir):
+    """Collectors with private endpoint/response caches so runs don't share state."""
+    endpoints = nc.EndpointCache(os.path.join(cache_dir, "endpoint_cache.json"))
+    responses = nc.ResponseCache(os.path.join(cache_dir, "response_cache"))
+    return (
+        nc.UniFiCollector(url, "bench-key", endpoints=endpoints),
+        nc.UISPCollector(url, "bench-key", endpoints=endpoints, response_cache=responses),
+    )
+
+
+def run_sequential(unifi_col, uisp_col):
+    return {
+        "unifi_devices": unifi_col.get_devices(),
+        "unifi_clients": unifi_col.get_clients(),
+        "uisp_devices": uisp_col.get_devices(),
+        "uisp_sites": uisp_col.get_sites(),
+        "uisp_links": uisp_col.get_datalinks(),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3, help="delay of every endpoint (s)")
+    parser.add_argument("--slow", type=float, default=1.0, help="delay of the UISP devices endpoint (s)")
+    args = parser.parse_args()
+
+    payloads = default_payloads(
+        unifi_devices=[{"mac": "aa:bb:cc:00:00:01"}],
+        unifi_clients=[{"mac": "11:22:33:44:55:66", "ap_mac": "aa:bb:cc:00:00:01"}],
+        uisp_devices=[{"identification": {"id": "dev-1"}}],
+        uisp_sites=[{"id": "site-1"}],
+        uisp_links=[],
+    )
+    with StubController(
+        payloads,
+        latency=args.latency,
+        path_latency={"/nms/api/v2.1/devices": args.slow},
+    ) as stub, tempfile.TemporaryDirectory() as tmp:
+        seq_time, seq = timed(run_sequential, *make_collectors(stub.url, os.path.join(tmp, "seq")))
+        con_time, con = timed(nc.fetch_all, make_collectors(stub.url, os.path.join(tmp, "con")))
+
+    slowest = max(args.latency, args.slow)
+    print(f"sequential: {seq_time:.3f}s")
+    print(f"concurrent: {con_time:.3f}s (slowest single call {slowest:.3f}s)")
+    print(f"speedup:    {seq_time / con_time:.1f}x")
+
+    if seq != con:
+        print("FAIL: concurrent results differ from sequential")
+        return 1
+    if con_time > slowest + args.latency:
+        print("FAIL: concurrent cycle is not close to the slowest call")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
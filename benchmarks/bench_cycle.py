@@ -0,0 +1,294 @@
+"""
+End-to-end collector benchmark: a full `network_collector.main()` cycle against a
+local stub controller serving seeded synthetic UniFi/UISP payloads, at several
+network sizes. Reports wall time and tracemalloc peak per stage and writes the
+results to benchmarks/results/<git commit>.json so runs can be compared.
+
+Usage:
+    python benchmarks/bench_cycle.py [--sizes 100 1000 10000] [--cycles 2] [--latency 0.05]
+    python benchmarks/bench_cycle.py --sizes 100000            # large network (several GB RAM)
+    python benchmarks/bench_cycle.py --no-memory               # timings without tracemalloc overhead
+    python benchmarks/bench_cycle.py --full-timelines          # timelines backfilled to a full window
+    python benchmarks/bench_cycle.py --compare benchmarks/results/<old>.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO_ROOT)
+
+import network_collector as nc  # noqa: E402
+from stub_controller import StubController, default_payloads  # noqa: E402
+from synthetic import network_payloads  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Collector functions timed as stages of run_cycle, in call order. Time between
+# format_network_data returning and build_snapshot starting is the network_data.json write.
+STAGES = ("fetch_all", "format_network_data", "build_snapshot", "record_history")
+
+
+class StageRecorder:
+    """Wraps collector functions to record wall time and peak traced memory per stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._last_end = None
+        self._originals = {}
+
+    def _record(self, name, seconds, peak):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "peak_bytes": 0})
+        stage["seconds"] += seconds
+        stage["peak_bytes"] = max(stage["peak_bytes"], peak)
+
+    def _wrap(self, name, fn):
+        recorder = self
+
+        def wrapper(*args, **kwargs):
+            if name == "build_snapshot" and recorder._last_end is not None:
+                # gap since format_network_data: writing network_data.json
+                recorder._record(
+                    "write_network_data",
+                    time.perf_counter() - recorder._last_end,
+                    tracemalloc.get_traced_memory()[1],
+                )
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                recorder._record(name, end - start, tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+                recorder._last_end = end if name == "format_network_data" else None
+
+        return wrapper
+
+    def __enter__(self):
+        for name in STAGES:
+            self._originals[name] = getattr(nc, name)
+            setattr(nc, name, self._wrap(name, self._originals[name]))
+        return self
+
+    def __exit__(self, *exc):
+        for name, fn in self._originals.items():
+            setattr(nc, name, fn)
+
+
+def reset_collector_state():
+    """Forget per-process caches so each size starts cold in its own directory."""
+    nc._lookup_cache.clear()
+    nc._timeline_builders.clear()
+    nc._snapshot_log_state = None
+    nc._written_content.clear()
+    nc._last_tiles = None
+    nc._write_rate = None
+    nc._topology = None
+    nc._presence_store = None
+    nc._last_good.clear()
+    nc._last_good_loaded = nc._last_good_changed = False
+    nc._last_good_saved_at = None
+    nc._endpoint_cache = None
+    nc._response_cache = None
+    if nc._history_store is not None:
+        nc._history_store.close()
+        nc._history_store = None
+
+
+def backfill_timelines(seed):
+    """
+    Fill every timeline window with frames before the newest one, as if the collector
+    had been running for 30 days: each earlier bucket moves the counters of ~5% of
+    the devices back (the other device records are shared between frames).
+    """
+    rng = random.Random(seed)
+    for builder in nc._timeline_builders:
+        newest = builder.frames()[-1]
+        ts = nc.parse_iso_utc(newest["ts"])
+        devices = list(newest["devices"])
+        counted = [i for i, dev in enumerate(devices) if dev.get("tx_bytes") is not None]
+        for back in range(1, builder.hours * 60 // builder.bucket_minutes):
+            for i in rng.sample(counted, max(1, len(counted) // 20)):
+                dev = devices[i]
+                devices[i] = {
+                    **dev,
+                    "tx_bytes": max(0, dev["tx_bytes"] - rng.randint(0, 10**8)),
+                    "rx_bytes": max(0, (dev.get("rx_bytes") or 0) - rng.randint(0, 10**9)),
+                }
+            stamp = ts - timedelta(minutes=back * builder.bucket_minutes)
+            builder._put({**newest, "ts": nc.iso_utc(stamp.timestamp()), "devices": list(devices)})
+        builder.write()
+
+
+def encode_payloads(network):
+    """Stub payloads pre-encoded to bytes so serving them is not traced as collector memory."""
+    payloads = default_payloads(
+        unifi_devices=network["unifi_devices"],
+        unifi_clients=network["unifi_clients"],
+        uisp_devices=network["uisp_devices"],
+        uisp_sites=network["uisp_sites"],
+        uisp_links=network["uisp_links"],
+    )
+    return {path: json.dumps(body).encode("utf-8") for path, body in payloads.items()}
+
+
+def bench_size(devices, cycles, latency, seed, trace_memory=True, full_timelines=False):
+    start = time.perf_counter()
+    network = network_payloads(devices, seed=seed)
+    counts = {key: len(network[key]) for key in nc.FETCH_KEYS}
+    payloads = encode_payloads(network)
+    generate_seconds = time.perf_counter() - start
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, StubController(payloads, latency=latency) as stub:
+        with open(os.path.join(tmp, nc.UNIFI_POSITION_LOOKUP), "w", encoding="utf-8") as f:
+            json.dump(network["unifi_positions"], f)
+        with open(os.path.join(tmp, nc.UISP_POSITION_LOOKUP), "w", encoding="utf-8") as f:
+            json.dump(network["uisp_positions"], f)
+        del network
+        os.environ.update(
+            {"UNIFI_URL": stub.url, "UNIFI_KEY": "bench", "UISP_URL": stub.url, "UISP_KEY": "bench"}
+        )
+        os.chdir(tmp)
+        reset_collector_state()
+        try:
+            for cycle in range(cycles):
+                if cycle == 1 and full_timelines:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        backfill_timelines(seed)
+                if trace_memory:
+                    tracemalloc.start()
+                requests_before = stub.requests
+                with StageRecorder() as recorder, contextlib.redirect_stdout(io.StringIO()):
+                    cycle_start = time.perf_counter()
+                    nc.main([])
+                    total = time.perf_counter() - cycle_start
+                tracemalloc.stop()
+                output_bytes = os.path.getsize("network_data.json")
+                results.append(
+                    {
+                        "seconds": total,
+                        "peak_bytes": max(s["peak_bytes"] for s in recorder.stages.values()),
+                        "http_requests": stub.requests - requests_before,
+                        "network_data_bytes": output_bytes,
+                        "stages": recorder.stages,
+                    }
+                )
+        finally:
+            os.chdir(cwd)
+            reset_collector_state()
+    return {"generate_seconds": generate_seconds, "payload_counts": counts, "cycles": results}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "-C", REPO_ROOT, "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "-C", REPO_ROOT, "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def mb(n):
+    return f"{n / 1e6:.1f}MB"
+
+
+def print_report(report):
+    for size, entry in report["sizes"].items():
+        counts = ", ".join(f"{k}={v}" for k, v in entry["payload_counts"].items())
+        print(f"\n== {size} devices ({counts})")
+        for i, cycle in enumerate(entry["cycles"], 1):
+            print(
+                f"  cycle {i}: {cycle['seconds']:.3f}s, peak {mb(cycle['peak_bytes'])}, "
+                f"{cycle['http_requests']} requests, network_data.json {mb(cycle['network_data_bytes'])}"
+            )
+            for name, stage in cycle["stages"].items():
+                print(f"    {name:<22} {stage['seconds']:8.3f}s  peak {mb(stage['peak_bytes'])}")
+
+
+def print_comparison(old, new):
+    print(f"\n== {old['commit']} -> {new['commit']} (last cycle per size)")
+    for size, entry in new["sizes"].items():
+        before = old["sizes"].get(size)
+        if not before:
+            continue
+        a, b = before["cycles"][-1], entry["cycles"][-1]
+        print(
+            f"  {size:>7} devices: {a['seconds']:.3f}s -> {b['seconds']:.3f}s "
+            f"({b['seconds'] / a['seconds']:.2f}x), peak {mb(a['peak_bytes'])} -> {mb(b['peak_bytes'])}"
+        )
+        for name, stage in b["stages"].items():
+            prev = a["stages"].get(name)
+            if prev:
+                print(f"    {name:<22} {prev['seconds']:8.3f}s -> {stage['seconds']:8.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="device counts")
+    parser.add_argument("--cycles", type=int, default=2, help="cycles per size (first is cold)")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub delay per request (s)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="skip tracemalloc (it slows Python-heavy stages several times over)",
+    )
+    parser.add_argument(
+        "--full-timelines",
+        action="store_true",
+        help="backfill every timeline to a full window after the first cycle",
+    )
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": nc.iso_utc_now(),
+        "python": platform.python_version(),
+        "history_backend": nc.HISTORY_BACKEND,
+        "latency": args.latency,
+        "trace_memory": args.memory,
+        "sizes": {},
+    }
+    for size in args.sizes:
+        report["sizes"][str(size)] = bench_size(
+            size, args.cycles, args.latency, args.seed, trace_memory=args.memory, full_timelines=args.full_timelines
+        )
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,364 @@
+"""
+format_network_data before and after the restructuring (prebuilt ID index, median
+by selection, devices emitted with their final coordinates in one pass, links kept
+only when both ends are on the map or UISP sites), on synthetic networks with many
+clients and extra UISP links: backhaul between APs plus site-level links, links to
+unknown devices and UniFi devices left off the map. Checks the output equals the
+legacy output with its unresolved links removed (same JSON, key order included),
+first on a small fixture of site-level links.
+
+Usage:
+    python benchmarks/bench_format.py [--sizes 10000 20000] [--links-per-device 5] [--clients-per-device 10]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from synthetic import _uuid, network_payloads  # noqa: E402
+
+
+def legacy_format_network_data(unifi_devs, uisp_devs, uisp_sites, uisp_links, unifi_clients=None):
+    """
+    format_network_data as it was before the ID index: sorts for the medians, walks
+    the UISP and UniFi lists again for coordinates and keeps every link.
+    """
+    combined = {"unifi": [], "uisp": [], "links": [], "map_metadata": {}}
+    position_lookup = nc.load_unifi_position_lookup()
+    uisp_position_lookup = nc.load_uisp_position_lookup()
+
+    # Build client lookup: device_mac -> [list of client dicts]
+    # UniFiCollector.get_clients already streams clients into this shape;
+    # a raw client list is grouped here
+    if isinstance(unifi_clients, dict):
+        client_map = unifi_clients
+    else:
+        client_map = nc.group_clients(unifi_clients or [])
+
+    # Build site coords lookup
+    site_map = {}
+    if isinstance(uisp_sites, list):
+        for site in uisp_sites:
+            s_id = site.get("id")
+            loc = site.get("location") or {}
+            if s_id:
+                site_map[s_id] = {
+                    "lat": loc.get("latitude"),
+                    "lon": loc.get("longitude"),
+                }
+
+    # UniFi devices — only include devices listed in unifi_position_lookup.json
+    if isinstance(unifi_devs, list):
+        for dev in unifi_devs:
+            mac = dev.get("mac")
+            if nc.lookup_position(position_lookup, mac) is None:
+                continue
+            uplink_mac = dev.get("uplink_mac") or dev.get("uplink", {}).get("uplink_mac")
+            combined["unifi"].append(
+                {
+                    "id": mac,
+                    "name": dev.get("name", mac),
+                    "type": dev.get("type"),
+                    "model": dev.get("model"),
+                    "state": dev.get("state", 1),
+                    "clients": dev.get("num_sta", 0),
+                    "client_list": client_map.get(mac, []),
+                    "x": dev.get("x"),
+                    "y": dev.get("y"),
+                    "ip": dev.get("ip"),
+                    "version": dev.get("version"),
+                    "uptime": dev.get("uptime"),
+                    "tx_bytes": dev.get("tx_bytes"),
+                    "rx_bytes": dev.get("rx_bytes"),
+                }
+            )
+            if uplink_mac:
+                combined["links"].append(
+                    {"from": uplink_mac, "to": mac, "type": "wired_unifi"}
+                )
+
+    # UISP devices with coordinates
+    lats, lons = [], []
+    temp_uisp = []
+    if isinstance(uisp_devs, list):
+        for dev in uisp_devs:
+            id_info = dev.get("identification") or {}
+            attr = dev.get("attributes") or {}
+            loc = dev.get("location") or {}
+            s_id = id_info.get("siteId")
+            d_id = id_info.get("id")
+            site_coords = site_map.get(s_id, {})
+            lat = (
+                attr.get("latitude")
+                or loc.get("latitude")
+                or site_coords.get("lat")
+            )
+            lon = (
+                attr.get("longitude")
+                or loc.get("longitude")
+                or site_coords.get("lon")
+            )
+            if lat and lon:
+                lat, lon = float(lat), float(lon)
+                if abs(lat) > 0.1:
+                    temp_uisp.append((lat, lon, d_id, dev))
+
+    if temp_uisp:
+        all_lats = sorted([x[0] for x in temp_uisp])
+        all_lons = sorted([x[1] for x in temp_uisp])
+        med_lat = all_lats[len(all_lats) // 2]
+        med_lon = all_lons[len(all_lons) // 2]
+        for lat, lon, d_id, dev in temp_uisp:
+            if abs(lat - med_lat) < 0.03 and abs(lon - med_lon) < 0.03:
+                lats.append(lat)
+                lons.append(lon)
+                id_info = dev.get("identification") or {}
+                combined["uisp"].append(
+                    {
+                        "id": d_id,
+                        "name": id_info.get("name"),
+                        "model": id_info.get("model"),
+                        "type": id_info.get("type"),
+                        "state": dev.get("overview", {}).get("status"),
+                        "clients": dev.get("overview", {}).get("stationsCount", 0),
+                        "lat": lat,
+                        "lon": lon,
+                    }
+                )
+
+    # Apply manual UISP position overrides (from map drag & export)
+    for dev in combined["uisp"]:
+        override = nc.lookup_position(uisp_position_lookup, dev["id"])
+        if override and override.get("lat") is not None and override.get("lon") is not None:
+            dev["lat"] = float(override["lat"])
+            dev["lon"] = float(override["lon"])
+
+    # Assign coordinates to UniFi devices: manual lookup > API x/y > centroid
+    centroid_lat = sum(lats) / len(lats) if lats else None
+    centroid_lon = sum(lons) / len(lons) if lons else None
+    for dev in combined["unifi"]:
+        manual = nc.lookup_position(position_lookup, dev["id"])
+        if manual and manual.get("lat") is not None and manual.get("lon") is not None:
+            dev["lat"] = float(manual["lat"])
+            dev["lon"] = float(manual["lon"])
+        elif dev.get("x") is not None and dev.get("y") is not None:
+            dev["lat"] = float(dev["y"])
+            dev["lon"] = float(dev["x"])
+        elif centroid_lat and centroid_lon:
+            dev["lat"] = centroid_lat
+            dev["lon"] = centroid_lon
+
+    # UISP links
+    if isinstance(uisp_links, list):
+        for link in uisp_links:
+            from_data = link.get("from") or {}
+            to_data = link.get("to") or {}
+            from_dev_ident = (from_data.get("device") or {}).get("identification") or {}
+            from_site_ident = (from_data.get("site") or {}).get("identification") or {}
+            to_dev_ident = (to_data.get("device") or {}).get("identification") or {}
+            to_site_ident = (to_data.get("site") or {}).get("identification") or {}
+            side_a = (
+                from_dev_ident.get("id")
+                or from_site_ident.get("id")
+                or link.get("deviceIdA")
+                or link.get("siteIdA")
+            )
+            side_b = (
+                to_dev_ident.get("id")
+                or to_site_ident.get("id")
+                or link.get("deviceIdB")
+                or link.get("siteIdB")
+            )
+            if side_a and side_b:
+                signal = link.get("signal") or (from_data.get("device") or {}).get(
+                    "overview", {}
+                ).get("signal")
+                combined["links"].append(
+                    {
+                        "from": side_a,
+                        "to": side_b,
+                        "type": link.get("type", "wireless"),
+                        "state": link.get("state", "active"),
+                        "signal": signal,
+                    }
+                )
+
+    # Map metadata (bounding box for initial view)
+    if lats and lons:
+        lat_min, lat_max = min(lats), max(lats)
+        lon_min, lon_max = min(lons), max(lons)
+        pad_lat = (lat_max - lat_min) * 0.1 or 0.001
+        pad_lon = (lon_max - lon_min) * 0.1 or 0.001
+        combined["map_metadata"] = {
+            "lat_min": lat_min - pad_lat,
+            "lat_max": lat_max + pad_lat,
+            "lon_min": lon_min - pad_lon,
+            "lon_max": lon_max + pad_lon,
+        }
+
+    return combined
+
+
+def extra_links(payloads, count, seed=11, unresolved=0.05):
+    """
+    `count` more UISP data-links between random devices; `unresolved` of them have one
+    end moved: to a site (half of them, kept) or to an unknown device (dropped).
+    """
+    rng = random.Random(seed)
+    idents = [dev["identification"] for dev in payloads["uisp_devices"]]
+    sites = [site["id"] for site in payloads["uisp_sites"]]
+    links = []
+    for _ in range(count):
+        a, b = rng.sample(idents, 2)
+        link = {
+            "id": _uuid(rng),
+            "from": {"device": {"identification": a}, "site": None},
+            "to": {"device": {"identification": b}, "site": None},
+            "type": "wireless",
+            "state": "active" if rng.random() > 0.05 else "disconnected",
+            "signal": rng.randint(-80, -45),
+        }
+        if rng.random() < unresolved:
+            end = rng.choice(("to", "from"))
+            if rng.random() < 0.5:
+                link[end] = {"device": None, "site": {"identification": {"id": rng.choice(sites)}}}
+            else:
+                link[end] = {"device": {"identification": {"id": _uuid(rng)}}, "site": None}
+        links.append(link)
+    return links
+
+
+def site_link_fixture():
+    """
+    Format inputs whose data-links end at sites: device to site, site to site (by
+    nested site or by siteIdA/siteIdB), a site only known from a device's siteId and
+    an unknown site.
+    """
+    sites = [
+        {"id": "site-a", "location": {"latitude": 50.0, "longitude": 14.0}},
+        {"id": "site-b", "location": {"latitude": 50.001, "longitude": 14.001}},
+    ]
+    devices = [
+        {
+            "identification": {"id": f"dev-{i}", "name": f"dev-{i}", "siteId": site, "type": "airMax"},
+            "attributes": {"latitude": 50.0 + i / 1000, "longitude": 14.0 + i / 1000},
+            "overview": {"status": "active", "signal": -60 - i},
+        }
+        for i, site in enumerate(("site-a", "site-b", "site-c"))
+    ]
+
+    def end(kind, ident):
+        return {"device": None, "site": None, kind: {"identification": {"id": ident}}}
+
+    links = [
+        {"from": end("device", "dev-0"), "to": end("site", "site-b"), "signal": -55},
+        {"from": end("site", "site-a"), "to": end("device", "dev-1")},
+        {"from": end("site", "site-a"), "to": end("site", "site-b"), "type": "ptp"},
+        {"from": {}, "to": {}, "siteIdA": "site-b", "siteIdB": "site-c"},
+        {"from": end("device", "dev-2"), "to": end("site", "site-unknown")},
+        {"from": end("device", "dev-0"), "to": end("device", "dev-1"), "state": "disconnected"},
+    ]
+    return [], devices, sites, links, {}
+
+
+def expected_output(legacy, uisp_devs, uisp_sites):
+    """The legacy output without the links that have an end neither on the map nor a UISP site."""
+    known = {dev["id"] for dev in legacy["unifi"] + legacy["uisp"]}
+    known.update(site["id"] for site in uisp_sites if site.get("id"))
+    known.update((dev.get("identification") or {}).get("siteId") for dev in uisp_devs)
+    return {**legacy, "links": [link for link in legacy["links"] if link["from"] in known and link["to"] in known]}
+
+
+def check_site_links():
+    """format_network_data against the legacy version on site_link_fixture."""
+    inputs = site_link_fixture()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            legacy = legacy_format_network_data(*inputs)
+            new = nc.format_network_data(*inputs)
+        finally:
+            os.chdir(cwd)
+    expected = expected_output(legacy, inputs[1], inputs[2])
+    same = json.dumps(new) == json.dumps(expected) and len(new["links"]) == len(inputs[3]) - 1
+    print(
+        f"site-level links fixture: {len(inputs[3])} links, {len(new['links'])} kept | "
+        f"{'identical' if same else 'MISMATCH'}"
+    )
+    return same
+
+
+def timed(fns, repeat):
+    """Best ms of each function over `repeat` interleaved runs, with GC paused while timing."""
+    best = [None] * len(fns)
+    for _ in range(repeat):
+        for i, fn in enumerate(fns):
+            gc.collect()
+            gc.disable()
+            start = time.perf_counter()
+            fn()
+            ms = (time.perf_counter() - start) * 1000
+            gc.enable()
+            best[i] = ms if best[i] is None else min(best[i], ms)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 20000])
+    parser.add_argument("--links-per-device", type=float, default=5)
+    parser.add_argument("--clients-per-device", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = check_site_links()
+    cwd = os.getcwd()
+    for devices in args.sizes:
+        payloads = network_payloads(devices, clients_per_device=args.clients_per_device)
+        rng = random.Random(12)
+        for mac in rng.sample(sorted(payloads["unifi_positions"]), len(payloads["unifi_positions"]) // 20):
+            if mac != "_comment":  # some UniFi devices off the map: their uplink links dangle
+                del payloads["unifi_positions"][mac]
+        links = payloads["uisp_links"]
+        links += extra_links(payloads, max(0, int(devices * args.links_per_device) - len(links)))
+        clients = nc.group_clients(payloads["unifi_clients"])
+        inputs = (payloads["unifi_devices"], payloads["uisp_devices"], payloads["uisp_sites"], links, clients)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                lookups = {nc.UNIFI_POSITION_LOOKUP: "unifi_positions", nc.UISP_POSITION_LOOKUP: "uisp_positions"}
+                for path, key in lookups.items():
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump(payloads[key], f)
+                legacy_ms, new_ms = timed(
+                    (lambda: legacy_format_network_data(*inputs), lambda: nc.format_network_data(*inputs)),
+                    args.repeat,
+                )
+                legacy = legacy_format_network_data(*inputs)
+                new = nc.format_network_data(*inputs)
+            finally:
+                os.chdir(cwd)
+        expected = expected_output(legacy, payloads["uisp_devices"], payloads["uisp_sites"])
+        same = json.dumps(new) == json.dumps(expected)
+        ok = ok and same
+        print(
+            f"{len(payloads['unifi_devices']) + len(payloads['uisp_devices']):>6} devices, {len(links):>6} UISP links, "
+            f"{len(payloads['unifi_clients']):>7} clients: legacy {legacy_ms:7.1f} ms | new {new_ms:7.1f} ms "
+            f"({legacy_ms / new_ms:.2f}x) | {len(legacy['links']) - len(new['links'])} unresolved links dropped, "
+            f"{len(new['links'])} kept | {'identical' if same else 'MISMATCH'}"
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
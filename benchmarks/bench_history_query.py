@@ -0,0 +1,85 @@
+"""
+history_server.py queries against a delta-encoded snapshot log: full scan
+(load_recent_snapshots + bucket_snapshots, what a timeline rebuild does) vs the
+offset index (first query builds it) vs a repeated query served from the LRU cache.
+
+Usage:
+    python benchmarks/bench_history_query.py [--days 30] [--devices 40] [--links 30] [--interval 300]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import history_server as hs  # noqa: E402
+import network_collector as nc  # noqa: E402
+from history_store import iso_to_epoch  # noqa: E402
+from synthetic import synthetic_frames  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--links", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=300, help="seconds between frames")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.makedirs(nc.HISTORY_DIR)
+            frames = synthetic_frames(args.days, args.devices, args.links, args.interval)
+            with open(nc.SNAPSHOT_LOG, "w", encoding="utf-8") as f:
+                for rec in nc.encode_frames(frames, nc.SNAPSHOT_KEYFRAME_INTERVAL):
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            log_mb = os.path.getsize(nc.SNAPSHOT_LOG) / 1e6
+            print(f"log: {args.days}d, {log_mb:.1f} MB")
+
+            queries = hs.HistoryQueries(hs.JSONLHistory(nc.SNAPSHOT_LOG))
+            _, index_ms = timed(queries.backend.version)
+            print(f"index build: {index_ms:8.1f} ms ({len(queries.backend.index.ts)} lines)")
+
+            for hours, bucket in ((24, 10), (24 * 7, 60), (24 * 30, 180)):
+                params = {"hours": str(hours), "bucket": str(bucket)}
+                body, indexed_ms = timed(lambda: queries.query("frames", params))
+                _, cached_ms = timed(lambda: queries.query("frames", params))
+                payload = json.loads(body)
+                start = iso_to_epoch(payload["range_start"])
+
+                def full_scan():
+                    scanned = nc.bucket_snapshots(nc.load_recent_snapshots(hours=hours + bucket / 60), bucket)
+                    return [f for f in scanned if iso_to_epoch(f["ts"]) >= start]
+
+                expected, scan_ms = timed(full_scan)
+                same = nc.decode_timeline_frames(payload) == nc.decode_columnar(nc.encode_columnar(expected))
+                ok = ok and same
+                print(
+                    f"{hours:>4}h/{bucket:>3}m  full scan {scan_ms:8.1f} ms | indexed {indexed_ms:8.1f} ms | "
+                    f"cached {cached_ms:6.3f} ms | frames {len(expected)} {'ok' if same else 'MISMATCH'}"
+                )
+
+            params = {"id": "dev-4", "hours": "168", "bucket": "60", "agg": "max"}
+            _, device_ms = timed(lambda: queries.query("device", params))
+            print(f"device series 7d/60m: {device_ms:8.1f} ms")
+        finally:
+            os.chdir(cwd)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Query time for the 30-day timeline with 30 and 365 days of history:
+JSONL scan (load_recent_snapshots + bucket_snapshots) vs SQLite rollups.
+Also imports the first frames a second time (nothing may be added) and reports
+the database size after pruning to a 7-day raw retention.
+
+Usage:
+    python benchmarks/bench_history_store.py [--devices 40] [--links 30] [--interval 300]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from history_store import SQLiteHistoryStore  # noqa: E402
+from synthetic import synthetic_frames  # noqa: E402
+
+
+def bench(days, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.makedirs(nc.HISTORY_DIR)
+        store = SQLiteHistoryStore(nc.HISTORY_DB, raw_retention_days=days + 1,
+                                   rollup_retention_days=days + 1)
+        start = time.perf_counter()
+        first = None
+        with open(nc.SNAPSHOT_LOG, "w", encoding="utf-8") as f:
+            batch = []
+            for frame in synthetic_frames(days, args.devices, args.links, args.interval):
+                f.write(json.dumps(frame, ensure_ascii=False) + "\n")
+                batch.append(frame)
+                if len(batch) >= 2000:
+                    store.append_many(batch)
+                    first = first or batch
+                    batch = []
+            store.append_many(batch)
+            first = first or batch
+        build_time = time.perf_counter() - start
+        stored = store.frame_count()
+        reimported = store.append_many(first)
+        idempotent = reimported == 0 and store.frame_count() == stored
+
+        start = time.perf_counter()
+        jsonl_frames = nc.bucket_snapshots(nc.load_recent_snapshots(hours=24 * 30), 180)
+        jsonl_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sqlite_frames = store.rollup_frames(180, 24 * 30)
+        sqlite_time = time.perf_counter() - start
+
+        log_mb = os.path.getsize(nc.SNAPSHOT_LOG) / 1e6
+        db_mb = os.path.getsize(nc.HISTORY_DB) / 1e6
+        store.raw_retention_days = 7
+        with store.conn:
+            store.prune()
+        store.vacuum()
+        store.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pruned_mb = os.path.getsize(nc.HISTORY_DB) / 1e6
+        store.close()
+        os.chdir(ROOT)
+
+    same = [f["ts"] for f in jsonl_frames] == [f["ts"] for f in sqlite_frames]
+    print(
+        f"{days:>4}d  build {build_time:6.1f}s | log {log_mb:7.1f} MB, db {db_mb:7.1f} MB "
+        f"({pruned_mb:.1f} MB at 7d raw) | 30d query: jsonl {jsonl_time * 1000:8.1f} ms, "
+        f"sqlite {sqlite_time * 1000:6.1f} ms | frames {len(sqlite_frames)} {'ok' if same else 'MISMATCH'} | "
+        f"re-import {'adds nothing' if idempotent else f'added {reimported} frames'}"
+    )
+    return same and idempotent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--links", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=300, help="seconds between frames")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365])
+    args = parser.parse_args()
+    ok = all([bench(days, args) for days in args.days])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Multi-controller fan-out: several stub UniFi controllers (each with a few sites)
+and UISP instances with different latencies, configured through a controllers
+file. Checks that a fetch takes about as long as the slowest controller rather
+than the sum, and that merged device IDs are namespaced without collisions.
+
+Usage:
+    python benchmarks/bench_multi_controller.py [--unifi 2] [--sites 2] [--uisp 2] [--latency 0.2] [--workers 16]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import network_collector as nc  # noqa: E402
+from stub_controller import StubController, default_payloads  # noqa: E402
+from synthetic import network_payloads  # noqa: E402
+
+
+def controller_payloads(network, sites):
+    payloads = {}
+    for site in sites:
+        payloads.update(
+            default_payloads(
+                site=site,
+                unifi_devices=network["unifi_devices"],
+                unifi_clients=network["unifi_clients"],
+                uisp_devices=network["uisp_devices"],
+                uisp_sites=network["uisp_sites"],
+                uisp_links=network["uisp_links"],
+            )
+        )
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--unifi", type=int, default=2, help="UniFi controllers")
+    parser.add_argument("--sites", type=int, default=2, help="sites per UniFi controller")
+    parser.add_argument("--uisp", type=int, default=2, help="UISP instances")
+    parser.add_argument("--latency", type=float, default=0.2, help="base delay; controller i waits (i+1)x")
+    parser.add_argument("--devices", type=int, default=200, help="devices per controller payload")
+    parser.add_argument("--workers", type=int, default=nc.FETCH_WORKERS, help="fetch pool size (FETCH_WORKERS)")
+    args = parser.parse_args()
+
+    # Every controller serves the same network, so without namespaces all IDs would collide
+    network = network_payloads(args.devices)
+    sites = [f"site{i}" for i in range(args.sites)]
+    payloads = controller_payloads(network, sites)
+    count = args.unifi + args.uisp
+    latencies = [args.latency * (i + 1) for i in range(count)]
+
+    with contextlib.ExitStack() as stack:
+        stubs = [stack.enter_context(StubController(payloads, latency=lat)) for lat in latencies]
+        tmp = stack.enter_context(tempfile.TemporaryDirectory())
+        config = {
+            "unifi": [
+                {"name": f"unifi{i}", "url": stubs[i].url, "key": "bench", "sites": sites}
+                for i in range(args.unifi)
+            ],
+            "uisp": [
+                {"name": f"uisp{i}", "url": stubs[args.unifi + i].url, "key": "bench"}
+                for i in range(args.uisp)
+            ],
+        }
+        config_path = os.path.join(tmp, "controllers.json")
+        with open(config_path, "w", encoding="utf-8") as f:
+            json.dump(config, f)
+        nc.CONTROLLERS_FILE = config_path
+        nc.FETCH_WORKERS = args.workers
+        nc._endpoint_cache = nc.EndpointCache(os.path.join(tmp, "endpoint_cache.json"))
+        nc._response_cache = nc.ResponseCache(os.path.join(tmp, "response_cache"))
+
+        collectors = nc.build_collectors()
+        start = time.perf_counter()
+        fetched = nc.fetch_all(collectors)
+        elapsed = time.perf_counter() - start
+        sequential = sum(lat * len(col.jobs()) for lat, col in zip(
+            [latencies[i] for i in range(args.unifi) for _ in sites] + latencies[args.unifi:], collectors
+        ))
+
+    unifi_ids = [d["mac"] for d in fetched["unifi_devices"]]
+    uisp_ids = [d["identification"]["id"] for d in fetched["uisp_devices"]]
+    jobs = sum(len(col.jobs()) for col in collectors)
+    print(f"collectors: {len(collectors)} ({args.unifi} UniFi x {args.sites} sites, {args.uisp} UISP), "
+          f"{jobs} endpoint fetches on {min(jobs, args.workers)} workers")
+    print(f"devices:    {len(unifi_ids)} UniFi, {len(uisp_ids)} UISP, {len(fetched['uisp_links'])} links")
+    print(f"fan-out:    {elapsed:.3f}s (slowest controller {max(latencies):.3f}s, sequential ~{sequential:.3f}s)")
+
+    if len(set(unifi_ids)) != len(unifi_ids) or len(set(uisp_ids)) != len(uisp_ids):
+        print("FAIL: namespaced device IDs collide")
+        return 1
+    if jobs <= args.workers and elapsed > max(latencies) + args.latency:
+        print("FAIL: fan-out is not close to the slowest controller")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Controller outage: collection cycles against a local stub controller whose UniFi
+device list and UISP device list stop answering (requests hang). Compares cycles
+with the cycle deadline and circuit breaker against the same outage with both
+disabled, reporting per cycle the fetch time, requests sent, devices in
+network_data.json (and how many are marked stale) and the history frame recorded.
+Then restarts the collector during the outage (the last good data saved before
+the restart is shown, marked stale, and the frame is still recorded) and ends the
+outage to check devices come back fresh once the breaker lets requests through again.
+
+Usage:
+    python benchmarks/bench_outage.py [--devices 1000] [--deadline 5] [--cycles 5]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from bench_cycle import encode_payloads, reset_collector_state  # noqa: E402
+from stub_controller import StubController  # noqa: E402
+from synthetic import network_payloads  # noqa: E402
+
+HANG_SECONDS = 60
+OUTAGE_PATHS = (
+    "/proxy/network/integration/v1/sites/default/devices",
+    "/proxy/network/api/s/default/stat/device",
+    "/api/s/default/stat/device",
+    "/nms/api/v2.1/devices",
+)
+
+
+class FrameRecorder:
+    """Keeps the frames run_cycle hands to record_history."""
+
+    def __init__(self):
+        self.frames = []
+        self._original = None
+
+    def __enter__(self):
+        self._original = nc.record_history
+
+        def record(frame):
+            self.frames.append(frame)
+            return self._original(frame)
+
+        nc.record_history = record
+        return self
+
+    def __exit__(self, *exc):
+        nc.record_history = self._original
+
+
+def cycle(collectors, stub, recorder):
+    """Run one cycle quietly; returns its row for the report."""
+    requests_before, frames_before = stub.requests, len(recorder.frames)
+    with contextlib.redirect_stdout(io.StringIO()):
+        nc.run_cycle(collectors)
+    with open(nc.NETWORK_DATA, encoding="utf-8") as f:
+        data = json.load(f)
+    devices = [*data["unifi"], *data["uisp"]]
+    frame = recorder.frames[-1] if len(recorder.frames) > frames_before else None
+    fetch = next(st["seconds"] for st in nc._cycle_metrics.finish(True)["stages"] if st["name"] == "fetch")
+    return {
+        "fetch": fetch,
+        "requests": stub.requests - requests_before,
+        "devices": len(devices),
+        "stale": sum(1 for dev in devices if dev.get("stale")),
+        "frame": None if frame is None else len(frame["devices"]),
+        "circuit_open": sum(info["circuit_open"] for info in nc.stale_sources().values()),
+    }
+
+
+def report(label, row):
+    frame = "not recorded" if row["frame"] is None else f"{row['frame']} devices"
+    print(
+        f"  {label:<26} fetch {row['fetch']:6.2f}s | {row['requests']:>2} requests | "
+        f"{row['devices']:>5} devices ({row['stale']:>5} stale) | "
+        f"{row['circuit_open']} circuit open | frame {frame}"
+    )
+
+
+def run(args, payloads, positions, bounded):
+    """Healthy cycle, outage cycles, restart during the outage, recovery."""
+    rows = []
+    cwd = os.getcwd()
+    settings = (nc.CYCLE_DEADLINE_SECONDS, nc.BREAKER_FAILURES, nc.BREAKER_BASE_SECONDS)
+    if bounded:
+        nc.CYCLE_DEADLINE_SECONDS, nc.BREAKER_BASE_SECONDS = args.deadline, args.backoff
+    else:
+        nc.CYCLE_DEADLINE_SECONDS, nc.BREAKER_FAILURES = 0, 10**9
+    with tempfile.TemporaryDirectory() as tmp, StubController(payloads) as stub, FrameRecorder() as recorder:
+        for path, positions_payload in positions.items():
+            with open(os.path.join(tmp, path), "w", encoding="utf-8") as f:
+                json.dump(positions_payload, f)
+        os.environ.update({"UNIFI_URL": stub.url, "UNIFI_KEY": "bench", "UISP_URL": stub.url, "UISP_KEY": "bench"})
+        os.chdir(tmp)
+        reset_collector_state()
+        try:
+            collectors = nc.build_collectors()
+            rows.append(("healthy", cycle(collectors, stub, recorder)))
+            stub.path_latency.update(dict.fromkeys(OUTAGE_PATHS, HANG_SECONDS))
+            for i in range(args.cycles if bounded else args.baseline_cycles):
+                rows.append((f"outage {i + 1}", cycle(collectors, stub, recorder)))
+            if bounded:
+                nc._last_good.clear()
+                nc._last_good_loaded = False
+                rows.append(("restart during outage", cycle(collectors, stub, recorder)))
+                stub.path_latency.clear()
+                retry_at = max(entry.get("retry_at", 0) for entry in nc.get_endpoint_cache().entries.values())
+                time.sleep(max(0.0, retry_at - time.time()) + 0.1)
+                rows.append(("recovered", cycle(collectors, stub, recorder)))
+        finally:
+            os.chdir(cwd)
+            reset_collector_state()
+            nc.CYCLE_DEADLINE_SECONDS, nc.BREAKER_FAILURES, nc.BREAKER_BASE_SECONDS = settings
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--deadline", type=float, default=5.0, help="CYCLE_DEADLINE_SECONDS for the bounded run")
+    parser.add_argument("--backoff", type=float, default=5.0, help="BREAKER_BASE_SECONDS for the bounded run")
+    parser.add_argument("--cycles", type=int, default=5, help="outage cycles with deadline and breaker")
+    parser.add_argument("--baseline-cycles", type=int, default=2, help="outage cycles without them")
+    args = parser.parse_args()
+
+    network = network_payloads(args.devices)
+    positions = {nc.UNIFI_POSITION_LOOKUP: network["unifi_positions"], nc.UISP_POSITION_LOOKUP: network["uisp_positions"]}
+    payloads = encode_payloads(network)
+    del network
+
+    bounded = run(args, payloads, positions, bounded=True)
+    print(
+        f"{args.devices} devices, device lists hanging {HANG_SECONDS}s | deadline {args.deadline:g}s, "
+        f"breaker after {nc.BREAKER_FAILURES} failures, backoff from {args.backoff:g}s:"
+    )
+    for label, row in bounded:
+        report(label, row)
+    baseline = run(args, payloads, positions, bounded=False)
+    print("no deadline, no breaker (last good fallback still on):")
+    for label, row in baseline:
+        report(label, row)
+
+    healthy = bounded[0][1]
+    outage = [row for label, row in bounded if label.startswith("outage")]
+    ok = (
+        all(row["devices"] == healthy["devices"] and row["frame"] == healthy["frame"] for row in outage)
+        and all(row["fetch"] <= args.deadline + 1 for row in outage)
+        and outage[-1]["circuit_open"] == 2
+        and bounded[-2][1]["frame"] == healthy["frame"]
+        and bounded[-2][1]["stale"] > 0
+        and bounded[-1][1]["stale"] == 0
+        and bounded[-1][1]["frame"] == healthy["frame"]
+    )
+    worst = max(row["fetch"] for label, row in baseline if label.startswith("outage"))
+    print(
+        f"worst outage fetch: {max(row['fetch'] for row in outage):.2f}s bounded vs {worst:.2f}s unbounded | "
+        f"{'ok' if ok else 'MISMATCH'}"
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Tiered polling: a full format_network_data() run vs patching the fast-changing fields
+of the previous payload (patch_network_data) on a fast tick, on synthetic networks
+where device stats, UISP signals and the client lists changed. Checks the patched
+payload equals a full format of the same data: the data-links keep their own signal
+(which differs from the device overviews) and a third of them have none, so their
+signal comes from the from-device. Prints the controller requests per hour of polling
+everything at the fast cadence vs the POLL_TIERS cadences.
+
+Usage:
+    python benchmarks/bench_poll_tiers.py [--sizes 1000 10000] [--repeat 5]
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from synthetic import network_payloads, unifi_clients  # noqa: E402
+
+
+def fast_changes(payloads, seed=9, share=0.3):
+    """Copies of the device payloads with `share` of the stats changed, and new client lists."""
+    rng = random.Random(seed)
+    unifi = [dict(dev) for dev in payloads["unifi_devices"]]
+    for dev in rng.sample(unifi, int(len(unifi) * share)):
+        dev.update(
+            num_sta=rng.randint(0, 40),
+            state=rng.choice((0, 1, 1, 1)),
+            tx_bytes=dev["tx_bytes"] + rng.randint(0, 10**8),
+            rx_bytes=dev["rx_bytes"] + rng.randint(0, 10**8),
+            uptime=dev["uptime"] + 30,
+        )
+    uisp = [{**dev, "overview": dict(dev["overview"])} for dev in payloads["uisp_devices"]]
+    for dev in rng.sample(uisp, int(len(uisp) * share)):
+        overview = dev["overview"]
+        overview["status"] = rng.choice(("active", "active", "disconnected"))
+        if overview["signal"] is None:
+            overview["stationsCount"] = rng.randint(0, 20)
+        else:
+            overview["signal"] = rng.randint(-80, -45)
+    ap_macs = [dev["mac"] for dev in unifi]
+    clients = nc.group_clients(unifi_clients(len(payloads["unifi_clients"]), ap_macs, seed=seed))
+    return unifi, uisp, clients
+
+
+def datalinks(links, devices, seed=10):
+    """
+    Copies of `links` embedding `devices` (the same data a full format would see) with
+    an own signal unlike any overview signal on two thirds of them and none on the rest.
+    """
+    rng = random.Random(seed)
+    by_id = {dev["identification"]["id"]: dev for dev in devices}
+    out = []
+    for i, link in enumerate(links):
+        ends = {
+            side: {**link[side], "device": by_id[link[side]["device"]["identification"]["id"]]}
+            for side in ("from", "to")
+        }
+        out.append({**link, **ends, "signal": None if i % 3 == 0 else rng.randint(-95, -86)})
+    return out
+
+
+def timed(fn, repeat=1):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn(None)
+        ms = (time.perf_counter() - start) * 1000
+        best = ms if best is None else min(best, ms)
+    return result, best
+
+
+def requests_per_hour(tiers, flat_every):
+    """(everything every flat_every seconds, tiered) endpoint fetches per hour and controller."""
+    flat = sum(len(keys) for keys, _ in tiers.values()) * 3600 / flat_every
+    tiered = sum(len(keys) * 3600 / every for keys, every in tiers.values())
+    return flat, tiered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = True
+    cwd = os.getcwd()
+    for devices in args.sizes:
+        payloads = network_payloads(devices)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                lookups = {nc.UNIFI_POSITION_LOOKUP: "unifi_positions", nc.UISP_POSITION_LOOKUP: "uisp_positions"}
+                for path, key in lookups.items():
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump(payloads[key], f)
+                clients = nc.group_clients(payloads["unifi_clients"])
+                links = datalinks(payloads["uisp_links"], payloads["uisp_devices"])
+                base, full_ms = timed(
+                    lambda _: nc.format_network_data(
+                        payloads["unifi_devices"],
+                        payloads["uisp_devices"],
+                        payloads["uisp_sites"],
+                        links,
+                        clients,
+                    ),
+                    args.repeat,
+                )
+                unifi, uisp, new_clients = fast_changes(payloads)
+                # The daemon patches the same payload tick after tick
+                data = copy.deepcopy(base)
+                applied, stats_ms = timed(
+                    lambda _: nc.patch_network_data(data, unifi_devs=unifi, uisp_devs=uisp, uisp_links=links),
+                    args.repeat,
+                )
+                _, clients_ms = timed(lambda _: nc.patch_network_data(data, unifi_clients=new_clients), args.repeat)
+                # Data-links are not refetched on a fast tick; a full format sees them
+                # embedding the fresh devices
+                expected = nc.format_network_data(
+                    unifi, uisp, payloads["uisp_sites"], datalinks(links, uisp), new_clients
+                )
+                overview = {dev["identification"]["id"]: dev["overview"]["signal"] for dev in uisp}
+                own = [link for link in expected["links"] if link.get("type") == "wireless"]
+                differs = sum(
+                    link["signal"] not in (overview.get(link["from"]), overview.get(link["to"])) for link in own
+                )
+                same = applied and data == expected and differs > 0
+                ok = ok and same
+            finally:
+                os.chdir(cwd)
+        print(
+            f"{devices:>6} devices, {len(base['links']):>6} links: full format {full_ms:8.1f} ms | "
+            f"patch stats {stats_ms:7.1f} ms ({full_ms / stats_ms:.0f}x) | "
+            f"patch clients {clients_ms:6.1f} ms | {'ok' if same else 'MISMATCH'}"
+        )
+
+    fast = min(every for _, every in nc.POLL_TIERS.values())
+    flat, tiered = requests_per_hour(nc.POLL_TIERS, fast)
+    cadences = ", ".join(f"{name} {every:g}s" for name, (_, every) in nc.POLL_TIERS.items())
+    print(f"requests/hour per controller: everything every {fast:g}s {flat:.0f} | tiered ({cadences}) {tiered:.0f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
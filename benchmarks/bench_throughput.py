@@ -0,0 +1,128 @@
+"""
+Throughput rate block for a timeline: NumPy array pass vs pure-Python fallback,
+on synthetic counters with missing samples and counter resets. Checks both paths
+give identical output. Then slides the window by --pushes buckets the way a
+TimelineBuilder does (append one frame, expire the oldest) and times
+ThroughputSeries for the whole window (checked against recomputing the block) and
+for the newest segment, the block the collector actually re-emits.
+
+Usage:
+    python benchmarks/bench_throughput.py [--frames 240] [--devices 100 1000 10000] [--pushes 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import throughput  # noqa: E402
+
+
+def counter_frames(frames, devices, interval=600, seed=3, missing=0.02, resets=0.001, repeated=0.0):
+    """
+    Frames whose devices carry growing tx/rx counters, some missing, some reset to ~0
+    and some listed a second time with a stale value (the later entry counts).
+    """
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(seconds=frames * interval)
+    tx = [rng.randint(0, 10**12) for _ in range(devices)]
+    rx = [rng.randint(0, 10**12) for _ in range(devices)]
+    out = []
+    for f in range(frames):
+        rows = []
+        for d in range(devices):
+            if rng.random() < resets:
+                tx[d], rx[d] = rng.randint(0, 10**6), rng.randint(0, 10**6)
+            else:
+                tx[d] += rng.randint(0, 10**8)
+                rx[d] += rng.randint(0, 10**9)
+            if rng.random() < missing:
+                continue
+            if rng.random() < repeated:
+                rows.append({"id": f"dev-{d}", "source": "uisp", "tx_bytes": tx[d] // 2, "rx_bytes": rx[d] // 2})
+            rows.append({"id": f"dev-{d}", "source": "uisp", "tx_bytes": tx[d], "rx_bytes": rx[d]})
+        ts = (start + timedelta(seconds=f * interval)).isoformat().replace("+00:00", "Z")
+        out.append({"ts": ts, "devices": rows, "links": []})
+    return out
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def sliding(frames, window, pushes, segment):
+    """
+    Per push: (ThroughputSeries ms for the whole window, for the newest `segment`
+    buckets as the collector writes them, throughput_block ms, same output).
+    """
+    series = throughput.ThroughputSeries()
+    series.update(list(enumerate(frames[:window])))
+    newest = throughput.ThroughputSeries()
+    newest.update(list(enumerate(frames[:window])))
+    rows = []
+    for push in range(1, pushes + 1):
+        buckets = list(enumerate(frames[push : push + window], start=push))
+        keys = [key for key, _ in buckets[-segment:]]
+
+        def incremental():
+            series.update(buckets)
+            return series.block()
+
+        def incremental_segment():
+            newest.update(buckets)
+            return newest.block(keys)
+
+        block, series_ms = timed(incremental)
+        _, segment_ms = timed(incremental_segment)
+        full, full_ms = timed(lambda: throughput.throughput_block([frame for _, frame in buckets]))
+        rows.append((series_ms, segment_ms, full_ms, block == full))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=240, help="frames per timeline (30d at 180 min = 240)")
+    parser.add_argument("--devices", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--pushes", type=int, default=5, help="buckets to slide the window by")
+    parser.add_argument("--segment", type=int, default=24, help="buckets per timeline segment")
+    args = parser.parse_args()
+
+    ok = True
+    for devices in args.devices:
+        frames = counter_frames(args.frames, devices)
+        python_block, python_ms = timed(lambda: throughput.throughput_block(frames, use_numpy=False))
+        line = f"{args.frames} frames x {devices:>6} devices: python {python_ms:8.1f} ms"
+        if throughput.np is not None:
+            numpy_block, numpy_ms = timed(lambda: throughput.throughput_block(frames, use_numpy=True))
+            same = numpy_block == python_block
+            ok = ok and same
+            line += f" | numpy {numpy_ms:8.1f} ms ({python_ms / numpy_ms:.1f}x) {'ok' if same else 'MISMATCH'}"
+        else:
+            line += " | numpy not installed"
+        print(f"{line} | resets {python_block['resets']}")
+
+    print(f"sliding window, {args.pushes} pushes (median ms per push):")
+    for devices in args.devices:
+        for missing, repeated in ((0.0, 0.0), (0.02, 0.0), (0.02, 0.01)):
+            frames = counter_frames(args.frames + args.pushes, devices, missing=missing, repeated=repeated)
+            rows = sliding(frames, args.frames, args.pushes, args.segment)
+            same = all(row[3] for row in rows)
+            ok = ok and same
+            series_ms, segment_ms, full_ms = (sorted(row[i] for row in rows)[len(rows) // 2] for i in range(3))
+            print(
+                f"  {devices:>6} devices, {missing:.0%} missing, {repeated:.0%} repeated: incremental {series_ms:8.1f} ms"
+                f" | newest segment {segment_ms:7.1f} ms | full block {full_ms:8.1f} ms"
+                f" ({full_ms / series_ms:.0f}x / {full_ms / segment_ms:.0f}x) {'ok' if same else 'MISMATCH'}"
+            )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
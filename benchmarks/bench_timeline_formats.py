@@ -0,0 +1,143 @@
+"""
+Size and parse time of each timeline range in the legacy format (indented list of
+full frames), as delta frames (the snapshot log encoding), as one columnar body
+(what history_server.py answers) and as the segment files plus index the collector
+writes, raw and precompressed. web_server.py serves the .br sibling first, so br is
+the size that matters for the map.
+Browser-side parse+decode is measured with node when it is installed.
+
+Usage:
+    python benchmarks/bench_timeline_formats.py [--devices 300] [--links 250]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import network_collector as nc  # noqa: E402
+from throughput import throughput_block  # noqa: E402
+from synthetic import synthetic_frames  # noqa: E402
+
+# Loads the timeline through map.js fetchTimelineFrames, with fetch reading local files
+NODE_PARSE = r"""
+const fs = require('fs');
+const path = require('path');
+const src = fs.readFileSync(process.argv[1], 'utf8');
+const dir = process.argv[2];
+global.window = { location: { href: `file://${dir}/` } };
+global.fetch = (url) => {
+  const file = url instanceof URL ? url.pathname : path.join(dir, url);
+  const text = fs.readFileSync(file, 'utf8');
+  return Promise.resolve({ ok: true, status: 200, json: () => Promise.resolve(JSON.parse(text)) });
+};
+const pick = (from, to) => src.slice(src.indexOf(from), src.indexOf(to));
+eval(pick('  // Columnar timelines', '  function getDeviceCoords')
+  + pick('  function attachThroughput', '  function applyTimelineFrame'));
+const t0 = process.hrtime.bigint();
+fetchTimelineFrames(process.argv[3]).then((frames) => {
+  const t1 = process.hrtime.bigint();
+  frames.forEach((f) => f.devices.length + f.links.length);  // materialize lazy frames
+  const t2 = process.hrtime.bigint();
+  console.log(JSON.stringify({ ready_ms: Number(t1 - t0) / 1e6, all_ms: Number(t2 - t0) / 1e6 }));
+});
+"""
+
+
+def dump(payload, **kwargs):
+    return json.dumps(payload, ensure_ascii=False, **kwargs).encode("utf-8")
+
+
+def single_files(frames, hours, bucket_minutes):
+    """{name: [body]} for the one-file formats."""
+    meta = {"generated_at": nc.iso_utc_now(), "range_hours": hours, "bucket_minutes": bucket_minutes}
+    throughput = throughput_block(frames, top_n=nc.THROUGHPUT_TOP_N)
+    legacy = dump({**meta, "frames": frames, "throughput": throughput}, indent=2)
+    delta = dump(
+        {**meta, "encoding": "delta", "frames": nc.encode_frames(frames, nc.SNAPSHOT_KEYFRAME_INTERVAL), "throughput": throughput},
+        separators=(",", ":"),
+    )
+    columnar = dump({**meta, **nc.timeline_body(frames, throughput)}, separators=(",", ":"))
+    return {"legacy": [legacy], "delta": [delta], "columnar": [columnar]}
+
+
+def segment_files(path, frames, hours, bucket_minutes):
+    """Bodies of the index and segment files write_timeline_payload writes."""
+    nc.write_timeline_payload(path, hours, bucket_minutes, frames)
+    segment_dir = nc.timeline_segment_dir(path)
+    names = [path] + [os.path.join(segment_dir, n) for n in sorted(os.listdir(segment_dir)) if n.endswith(".json")]
+    bodies = []
+    for name in names:
+        with open(name, "rb") as f:
+            bodies.append(f.read())
+    return bodies
+
+
+def js_parse(node, tmp, url):
+    out = subprocess.run(
+        [node, "-e", NODE_PARSE, os.path.join(ROOT, "map.js"), tmp, url],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--links", type=int, default=250)
+    args = parser.parse_args()
+
+    node = shutil.which("node")
+    nan = {"ready_ms": float("nan"), "all_ms": float("nan")}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.makedirs("history")
+        for path, hours, bucket_minutes in nc.TIMELINE_RANGES:
+            frames = nc.bucket_snapshots(
+                list(synthetic_frames(hours / 24, args.devices, args.links, 300)), bucket_minutes
+            )
+            files = single_files(frames, hours, bucket_minutes)
+            files["segments"] = segment_files(path, frames, hours, bucket_minutes)
+            print(f"\n{hours}h timeline: {len(frames)} frames, {args.devices} devices, {args.links} links")
+            print(f"{'format':<10}{'files':>6}{'raw KB':>10}{'gzip KB':>10}{'br KB':>10}{'py parse ms':>13}{'js ready ms':>13}{'js all ms':>11}")
+            for name, bodies in files.items():
+                raw = sum(len(b) for b in bodies) / 1024
+                gz = sum(len(gzip.compress(b, 9)) for b in bodies) / 1024
+                br = (
+                    sum(len(nc.brotli.compress(b, quality=nc.BROTLI_QUALITY)) for b in bodies) / 1024
+                    if nc.brotli else float("nan")
+                )
+                start = time.perf_counter()
+                if name == "segments":
+                    nc.load_timeline(path)
+                elif name == "delta":
+                    list(nc.decode_frames(json.loads(bodies[0])["frames"]))
+                else:
+                    nc.decode_timeline_frames(json.loads(bodies[0]))
+                py_ms = (time.perf_counter() - start) * 1000
+                js = nan
+                if node and name != "delta":  # the map only reads timeline and segment bodies
+                    url = path
+                    if name != "segments":
+                        url = f"{name}.json"
+                        with open(os.path.join(tmp, url), "wb") as f:
+                            f.write(bodies[0])
+                    js = js_parse(node, tmp, url)
+                print(
+                    f"{name:<10}{len(bodies):>6}{raw:>10.1f}{gz:>10.1f}{br:>10.1f}"
+                    f"{py_ms:>13.1f}{js['ready_ms']:>13.1f}{js['all_ms']:>11.1f}"
+                )
+        os.chdir(ROOT)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
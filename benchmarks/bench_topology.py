@@ -0,0 +1,118 @@
+"""
+topology.py on a synthetic network: a fresh build vs an incremental update after a
+few links change state vs an update with nothing changed. After every incremental
+step the graph is checked against a fresh build of the same data (hop counts,
+downstream sets and valid shortest-path parents).
+
+Usage:
+    python benchmarks/bench_topology.py [--devices 1000 10000 50000] [--changes 5] [--steps 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from synthetic import uisp_datalinks, uisp_devices, uisp_sites, unifi_devices  # noqa: E402
+from topology import TopologyGraph  # noqa: E402
+
+
+def topology_data(devices, seed=11, mesh=0.02):
+    """
+    Formatted-shape payload: a UniFi uplink tree from one UDM, UISP APs with their
+    stations, each AP wired to a random UniFi switch, and `mesh` extra station links
+    for redundant paths.
+    """
+    rng = random.Random(seed)
+    unifi = unifi_devices(devices // 2, seed=seed)
+    uisp = uisp_devices(devices - devices // 2, uisp_sites(max(1, devices // 20), seed=seed), seed=seed)
+    data = {"unifi": [], "uisp": [], "links": []}
+    for dev in unifi:
+        data["unifi"].append({"id": dev["mac"], "type": dev["type"]})
+        uplink = dev["uplink"].get("uplink_mac")
+        if uplink:
+            data["links"].append({"from": uplink, "to": dev["mac"], "type": "wired_unifi"})
+    for dev in uisp:
+        ident = dev["identification"]
+        data["uisp"].append({"id": ident["id"], "type": ident["type"]})
+        if ident["role"] == "ap":
+            data["links"].append({"from": rng.choice(unifi)["mac"], "to": ident["id"], "type": "wired_unifi"})
+    for link in uisp_datalinks(uisp, seed=seed):
+        data["links"].append(
+            {
+                "from": link["from"]["device"]["identification"]["id"],
+                "to": link["to"]["device"]["identification"]["id"],
+                "type": "wireless",
+                "state": "active",
+            }
+        )
+    stations = [d["identification"]["id"] for d in uisp if d["identification"]["role"] == "station"]
+    for _ in range(int(len(stations) * mesh)):
+        a, b = rng.sample(stations, 2)
+        data["links"].append({"from": a, "to": b, "type": "wireless", "state": "active"})
+    return data
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def same_topology(graph, reference):
+    """Hops and downstream sets match the reference; parents are valid shortest-path steps."""
+    for node_id, ref in reference.index.items():
+        node = graph.index[node_id]
+        if graph.hops[node] != reference.hops[ref]:
+            return False
+        parent = graph.parent[node]
+        if parent >= 0 and (graph.hops[parent] != graph.hops[node] - 1 or parent not in graph.adj[node]):
+            return False
+        if set(graph.downstream(node_id)) != set(reference.downstream(node_id)):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--changes", type=int, default=5, help="links toggled per incremental step")
+    parser.add_argument("--steps", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = True
+    for devices in args.devices:
+        data = topology_data(devices)
+        rng = random.Random(devices)
+        graph = TopologyGraph()
+        stats, build_ms = timed(lambda: graph.update(data))
+        _, payload_ms = timed(graph.to_payload)
+        _, same_ms = timed(lambda: graph.update(data))
+        incremental = []
+        recomputed = []
+        for _ in range(args.steps):
+            for link in rng.sample(data["links"], args.changes):
+                link["state"] = "inactive" if link.get("state", "active") == "active" else "active"
+            step, ms = timed(lambda: graph.update(data))
+            incremental.append(ms)
+            recomputed.append(step["recomputed_nodes"])
+            if devices <= 10000:
+                reference = TopologyGraph()
+                reference.update(data)
+                ok = ok and same_topology(graph, reference)
+        print(
+            f"{devices:>6} devices, {stats['links']:>6} links, {stats['components']:>5} components: "
+            f"build {build_ms:8.1f} ms (+{payload_ms:.1f} ms payload) | unchanged {same_ms:6.1f} ms | "
+            f"{args.changes} links changed {sum(incremental) / len(incremental):8.1f} ms "
+            f"(~{sum(recomputed) // len(recomputed)} nodes recomputed)"
+            + (" ok" if devices <= 10000 and ok else "")
+        )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Local stub that imitates the UniFi and UISP controller APIs for benchmarks.
+Every endpoint answers after a configurable delay with a canned JSON payload.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubController:
+    """
+    Serves path -> payload on 127.0.0.1 with per-path latency (seconds).
+    Responses carry an ETag and answer If-None-Match with 304. A bytes payload is
+    sent as-is (pre-encoded JSON keeps large bodies out of memory benchmarks).
+    Use as a context manager; `url` is the base URL for both collectors.
+    """
+
+    def __init__(self, payloads, latency=0.0, path_latency=None):
+        self.payloads = payloads
+        self.latency = latency
+        self.path_latency = path_latency or {}
+        self.requests = 0
+        self.not_modified = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay_for(self, path):
+        return self.path_latency.get(path, self.latency)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.requests += 1
+                delay = stub.delay_for(self.path)
+                if delay:
+                    time.sleep(delay)
+                payload = stub.payloads.get(self.path)
+                if payload is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (timeout / cycle deadline)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def default_payloads(site="default", unifi_devices=None, unifi_clients=None,
+                     uisp_devices=None, uisp_sites=None, uisp_links=None):
+    """Map the paths the collectors request onto the given payload lists."""
+    return {
+        f"/proxy/network/integration/v1/sites/{site}/devices": {"data": unifi_devices or []},
+        f"/proxy/network/api/s/{site}/stat/sta": {"data": unifi_clients or []},
+        "/nms/api/v2.1/devices": uisp_devices or [],
+        "/nms/api/v2.1/sites": uisp_sites or [],
+        "/nms/api/v2.1/data-links?siteLinksOnly=true": uisp_links or [],
+    }
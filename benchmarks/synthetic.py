@@ -0,0 +1,295 @@
+"""
+Seeded synthetic data for benchmarks.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+
+def synthetic_frames(days, devices, links, interval, seed=1, churn=0.05):
+    """
+    Snapshot frames (build_snapshot shape) every `interval` seconds ending now.
+    Each frame changes roughly `churn` of device client counts/counters and link signals,
+    like consecutive 5-minute samples of a mostly stable network.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    device_state = [
+        {
+            "id": f"dev-{d}",
+            "source": "uisp" if d % 3 else "unifi",
+            "state": "active" if d % 3 else 1,
+            "clients": rng.randint(0, 30),
+            "tx_bytes": rng.randint(0, 10**10),
+            "rx_bytes": rng.randint(0, 10**10),
+        }
+        for d in range(devices)
+    ]
+    link_state = [
+        {
+            "from": f"dev-{l % devices}",
+            "to": f"dev-{(l + 1) % devices}",
+            "type": "wireless",
+            "state": "active",
+            "signal": rng.randint(-80, -45),
+        }
+        for l in range(links)
+    ]
+    count = int(days * 86400 // interval)
+    for i in range(count, 0, -1):
+        for _ in range(max(1, int(devices * churn))):
+            dev = dict(rng.choice(device_state))
+            dev["clients"] = rng.randint(0, 30)
+            dev["tx_bytes"] = (dev["tx_bytes"] or 0) + rng.randint(0, 10**8)
+            dev["rx_bytes"] = (dev["rx_bytes"] or 0) + rng.randint(0, 10**8)
+            idx = int(dev["id"].split("-")[1])
+            device_state[idx] = dev
+        for _ in range(max(1, int(links * churn))):
+            idx = rng.randrange(len(link_state)) if link_state else None
+            if idx is not None:
+                link_state[idx] = {**link_state[idx], "signal": rng.randint(-80, -45)}
+        ts = (now - timedelta(seconds=i * interval)).isoformat().replace("+00:00", "Z")
+        yield {"ts": ts, "devices": list(device_state), "links": list(link_state)}
+
+
+def _mac(rng, prefix=None):
+    octets = [rng.randint(0, 255) for _ in range(6)]
+    if prefix is not None:
+        octets[:3] = prefix
+    return ":".join(f"{o:02x}" for o in octets)
+
+
+def unifi_clients(count, ap_macs, seed=2):
+    """
+    Raw stat/sta client records shaped like a UniFi controller's, including the
+    many fields the collector ignores, spread across `ap_macs`.
+    """
+    rng = random.Random(seed)
+    clients = []
+    for i in range(count):
+        wired = rng.random() < 0.1
+        device = rng.choice(ap_macs)
+        mac = _mac(rng)
+        client = {
+            "_id": f"{rng.getrandbits(96):024x}",
+            "site_id": "5f0c0c0c0c0c0c0c0c0c0c0c",
+            "mac": mac,
+            "oui": rng.choice(["Apple", "Samsung", "Intel", "Espressif"]),
+            "hostname": f"host-{i}",
+            "name": f"client-{i}" if rng.random() < 0.3 else None,
+            "ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "is_wired": wired,
+            "first_seen": 1700000000 + i,
+            "last_seen": 1700100000 + i,
+            "uptime": rng.randint(0, 86400 * 3),
+            "tx_bytes": rng.randint(0, 10**10),
+            "rx_bytes": rng.randint(0, 10**10),
+            "tx_packets": rng.randint(0, 10**7),
+            "rx_packets": rng.randint(0, 10**7),
+            "tx_rate": rng.randint(6000, 866000),
+            "rx_rate": rng.randint(6000, 866000),
+            "os_name": rng.randint(1, 30),
+            "dev_cat": rng.randint(1, 50),
+            "satisfaction": rng.randint(0, 100),
+            "anomalies": 0,
+            "user_id": f"{rng.getrandbits(96):024x}",
+            "network": "LAN",
+            "network_id": "5f0c0c0c0c0c0c0c0c0c0c0d",
+            "qos_policy_applied": True,
+            "_uptime_by_uap": rng.randint(0, 86400),
+            "_last_seen_by_uap": 1700100000 + i,
+        }
+        if wired:
+            client.update({"sw_mac": device, "sw_port": rng.randint(1, 8)})
+        else:
+            client.update(
+                {
+                    "ap_mac": device,
+                    "essid": "Neocities",
+                    "bssid": _mac(rng),
+                    "channel": rng.choice([1, 6, 11, 36, 44, 149]),
+                    "radio": rng.choice(["ng", "na"]),
+                    "radio_proto": rng.choice(["ng", "ac", "ax"]),
+                    "rssi": rng.randint(5, 60),
+                    "signal": rng.randint(-90, -35),
+                    "noise": -95,
+                    "idletime": rng.randint(0, 300),
+                    "ccq": rng.randint(300, 1000),
+                }
+            )
+        clients.append(client)
+    return clients
+
+
+def unifi_client_body(count, ap_count=200, seed=2):
+    """Pre-encoded {"meta": ..., "data": [...]} stat/sta body and the AP MACs used."""
+    rng = random.Random(seed)
+    ap_macs = [_mac(rng, prefix=[0xF4, 0xE2, 0xC6]) for _ in range(ap_count)]
+    payload = {"meta": {"rc": "ok"}, "data": unifi_clients(count, ap_macs, seed=seed)}
+    return json.dumps(payload).encode("utf-8"), ap_macs
+
+
+# Rough footprint of the Mars College / Bombay Beach network, used to scatter devices
+CENTER_LAT = 33.3625
+CENTER_LON = -115.7140
+MODELS_UNIFI = [("uap", "U7LR"), ("uap", "U7NHD"), ("uap", "U7MSH"), ("usw", "US8P60"), ("usw", "US8P150")]
+MODELS_UISP = ["Loco5AC", "LBE-5AC-Gen2", "NBE-5AC-Gen2", "LAP-GPS", "LAP-120"]
+
+
+def _uuid(rng):
+    h = f"{rng.getrandbits(128):032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _near(rng, spread=0.01):
+    return CENTER_LAT + rng.uniform(-spread, spread), CENTER_LON + rng.uniform(-spread, spread)
+
+
+def unifi_devices(count, seed=3):
+    """stat/device records: a gateway, then switches/APs in an uplink tree."""
+    rng = random.Random(seed)
+    devices = []
+    for i in range(count):
+        kind, model = ("ugw", "UDM") if i == 0 else rng.choice(MODELS_UNIFI)
+        mac = _mac(rng, prefix=[0x74, 0xAC, 0xB9])
+        uplink = devices[rng.randrange(len(devices))]["mac"] if devices else None
+        devices.append(
+            {
+                "_id": f"{rng.getrandbits(96):024x}",
+                "mac": mac,
+                "name": f"{kind.upper()} - bench {i}",
+                "type": kind,
+                "model": model,
+                "state": 1 if rng.random() > 0.05 else 0,
+                "num_sta": rng.randint(0, 40),
+                "ip": f"10.0.{i // 256 % 256}.{i % 256}",
+                "version": "6.6.77.15402",
+                "uptime": rng.randint(0, 86400 * 30),
+                "tx_bytes": rng.randint(0, 10**11),
+                "rx_bytes": rng.randint(0, 10**11),
+                "adopted": True,
+                "cfgversion": f"{rng.getrandbits(64):016x}",
+                "port_table": [{"port_idx": p, "up": rng.random() > 0.3} for p in range(1, 5)],
+                "uplink": {"uplink_mac": uplink, "type": "wire"} if uplink else {},
+            }
+        )
+    return devices
+
+
+def uisp_sites(count, seed=4):
+    rng = random.Random(seed)
+    sites = []
+    for i in range(count):
+        lat, lon = _near(rng)
+        sites.append(
+            {
+                "id": _uuid(rng),
+                "identification": {"name": f"site-{i}", "type": "site", "status": "active"},
+                "location": {"latitude": lat, "longitude": lon},
+                "description": {"address": "Bombay Beach, CA", "contact": {}},
+            }
+        )
+    return sites
+
+
+def uisp_devices(count, sites, seed=5):
+    """NMS v2.1 device records; about one in ten is an AP the others attach to."""
+    rng = random.Random(seed)
+    devices = []
+    aps = []
+    for i in range(count):
+        site = rng.choice(sites) if sites else {"id": None}
+        lat, lon = _near(rng)
+        is_ap = i % 10 == 0 or not aps
+        dev_id = _uuid(rng)
+        ap = None if is_ap else rng.choice(aps)
+        attributes = {"ssid": "neocities-bb", "apDevice": {"id": ap} if ap else None}
+        if rng.random() < 0.8:
+            attributes.update({"latitude": lat, "longitude": lon})
+        devices.append(
+            {
+                "identification": {
+                    "id": dev_id,
+                    "siteId": site["id"],
+                    "name": f"mars-rf-{i}",
+                    "model": rng.choice(MODELS_UISP),
+                    "type": "airMax",
+                    "role": "ap" if is_ap else "station",
+                    "mac": _mac(rng),
+                    "firmwareVersion": "8.7.11",
+                },
+                "attributes": attributes,
+                "location": {"latitude": lat, "longitude": lon} if rng.random() < 0.5 else None,
+                "overview": {
+                    "status": "active" if rng.random() > 0.05 else "disconnected",
+                    "stationsCount": rng.randint(0, 20) if is_ap else 0,
+                    "signal": None if is_ap else rng.randint(-80, -45),
+                    "uptime": rng.randint(0, 86400 * 30),
+                    "frequency": rng.choice([5180, 5500, 5805]),
+                    "channelWidth": rng.choice([20, 40, 80]),
+                    "downlinkCapacity": rng.randint(10**7, 5 * 10**8),
+                    "uplinkCapacity": rng.randint(10**7, 5 * 10**8),
+                    "outageScore": rng.random(),
+                },
+                "ipAddress": f"10.1.{i // 256 % 256}.{i % 256}/24",
+            }
+        )
+        if is_ap:
+            aps.append(dev_id)
+    return devices
+
+
+def uisp_datalinks(devices, seed=6):
+    """One wireless data-link per station towards its AP."""
+    rng = random.Random(seed)
+    by_id = {d["identification"]["id"]: d for d in devices}
+    links = []
+    for dev in devices:
+        ap = (dev["attributes"].get("apDevice") or {}).get("id")
+        if not ap:
+            continue
+        links.append(
+            {
+                "id": _uuid(rng),
+                "from": {"device": {"identification": by_id[ap]["identification"]}, "site": None},
+                "to": {"device": {"identification": dev["identification"]}, "site": None},
+                "type": "wireless",
+                "state": "active" if rng.random() > 0.05 else "disconnected",
+                "signal": dev["overview"]["signal"],
+                "frequency": dev["overview"]["frequency"],
+            }
+        )
+    return links
+
+
+def network_payloads(devices, clients_per_device=2, seed=7):
+    """
+    Full synthetic network of about `devices` devices (half UniFi, half UISP):
+    {"unifi_devices", "unifi_clients", "uisp_devices", "uisp_sites", "uisp_links",
+     "unifi_positions", "uisp_positions"}. Position lookups cover every UniFi
+    device (the collector only maps listed ones) and a few UISP overrides.
+    """
+    rng = random.Random(seed)
+    unifi_count = devices // 2
+    unifi = unifi_devices(unifi_count, seed=seed)
+    sites = uisp_sites(max(1, (devices - unifi_count) // 10), seed=seed + 1)
+    uisp = uisp_devices(devices - unifi_count, sites, seed=seed + 2)
+    ap_macs = [d["mac"] for d in unifi] or ["00:00:00:00:00:00"]
+    unifi_positions = {"_comment": "synthetic"}
+    for dev in unifi:
+        lat, lon = _near(rng)
+        unifi_positions[dev["mac"]] = {"name": dev["name"], "lat": lat, "lon": lon}
+    uisp_positions = {"_comment": "synthetic"}
+    for dev in uisp[::20]:
+        lat, lon = _near(rng)
+        uisp_positions[dev["identification"]["id"]] = {"name": dev["identification"]["name"], "lat": lat, "lon": lon}
+    return {
+        "unifi_devices": unifi,
+        "unifi_clients": unifi_clients(devices * clients_per_device, ap_macs, seed=seed + 3),
+        "uisp_devices": uisp,
+        "uisp_sites": sites,
+        "uisp_links": uisp_datalinks(uisp, seed=seed + 4),
+        "unifi_positions": unifi_positions,
+        "uisp_positions": uisp_positions,
+    }
@@ -0,0 +1,519 @@
+"""
+Compact per-client presence history: which AP a client was on, and at what signal,
+per time bucket over the retention window (30 days of 10-minute buckets by default).
+
+In memory every client (interned by MAC, slots reused once its history has expired)
+holds:
+
+- a presence bitmap over a ring of buckets a little longer than the window
+  (bit = bucket % ring; expiry runs an hour of buckets at a time);
+- runs of consecutive buckets on the same AP as parallel arrays (start, length,
+  interned AP);
+- one signed byte of RSSI (dBm) per present bucket, in run order.
+
+Each AP keeps the set of clients with a run on it, so per-AP queries only look at
+those. On disk the store is an append-only binary log: name records intern MACs
+and AP ids, and each bucket record holds the present clients as zlib-compressed
+arrays (log client id, log AP id, RSSI). A bucket can be written more than once
+(every collector cycle writes the open bucket; the last record wins). The log is
+rewritten from memory once it holds more than a day of expired buckets or mostly
+superseded records.
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+PRESENCE_MAGIC = b"CPRS"
+PRESENCE_FORMAT = 1
+NO_RSSI = -128
+# Expired buckets tolerated in the log before it is rewritten
+COMPACT_SLACK_DAYS = 1
+
+_HEADER = struct.Struct("<4sBH")  # magic, format, bucket minutes
+_NAME = struct.Struct("<cH")  # b"M" (client MAC) or b"A" (AP id), byte length
+_BUCKET = struct.Struct("<cIII")  # b"B", bucket, clients, compressed length
+
+
+def _le(values):
+    """array in little-endian byte order for the log (no-op on little-endian hosts)."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _rssi(value):
+    """dBm as a signed byte, NO_RSSI when missing or out of range."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and -127 <= value <= 127:
+        return int(value)
+    return NO_RSSI
+
+
+def _iso(epoch):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(epoch))
+
+
+class _Client:
+    __slots__ = ("mac", "bits", "starts", "lengths", "aps", "rssi")
+
+    def __init__(self, mac, ring):
+        self.mac = mac
+        self.bits = bytearray((ring + 7) // 8)
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.aps = array("H")
+        self.rssi = array("b")
+
+
+class ClientPresenceStore:
+    """
+    Presence history backed by the log at `path`. The collector records a bucket per
+    cycle; readers (readonly=True) pick up appended records with refresh().
+    Query times are epoch seconds.
+    """
+
+    def __init__(self, path, bucket_minutes=10, retention_days=30, readonly=False):
+        self.path = path
+        self.bucket_minutes = bucket_minutes
+        self.bucket_sec = bucket_minutes * 60
+        self.window = max(int(retention_days * 1440 // bucket_minutes), 1)
+        self.expire_step = max(60 // bucket_minutes, 1)
+        self.ring = self.window + self.expire_step
+        self.readonly = readonly
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self.clients = []  # slot -> _Client or None
+        self.free = []
+        self.by_mac = {}
+        self.ap_ids = []
+        self.ap_index = {}
+        self.ap_members = []  # AP -> set of slots with a run on it
+        self.committed = None  # newest bucket folded into the runs
+        self.oldest = None  # no run starts before this bucket
+        self.open_bucket = None  # newest bucket, still replaceable
+        self.open = {}  # slot -> (AP, rssi)
+        # Current log file: its name tables and how much of it has been read
+        self.inode = inode
+        self.offset = 0
+        self.log_macs, self.log_mac_list = {}, []
+        self.log_aps, self.log_ap_list = {}, []
+        self.log_first = None
+        self.log_records = 0
+        self.log_buckets = 0
+
+    # -- memory ------------------------------------------------------------------
+
+    def _slot(self, mac):
+        slot = self.by_mac.get(mac)
+        if slot is None:
+            client = _Client(mac, self.ring)
+            if self.free:
+                slot = self.free.pop()
+                self.clients[slot] = client
+            else:
+                slot = len(self.clients)
+                self.clients.append(client)
+            self.by_mac[mac] = slot
+        return slot
+
+    def _ap(self, ap_id):
+        ap = self.ap_index.get(ap_id)
+        if ap is None:
+            ap = self.ap_index[ap_id] = len(self.ap_ids)
+            self.ap_ids.append(ap_id)
+            self.ap_members.append(set())
+        return ap
+
+    def _observe(self, bucket, entries):
+        """Make `entries` ({mac: (ap id, rssi)}) the content of `bucket`."""
+        if self.open_bucket is not None and bucket < self.open_bucket:
+            return  # older than what we have; the log is written in time order
+        if bucket != self.open_bucket:
+            if self.open_bucket is not None:
+                self._commit()
+            self.open_bucket = bucket
+        self.open = {self._slot(mac): (self._ap(ap_id), rssi) for mac, (ap_id, rssi) in entries.items()}
+
+    def _observe_log(self, bucket, ids, aps, rssi):
+        """_observe() for a bucket record of the log, with its ids still to translate."""
+        if self.open_bucket is not None and bucket < self.open_bucket:
+            return
+        if bucket != self.open_bucket:
+            if self.open_bucket is not None:
+                self._commit()
+            self.open_bucket = bucket
+        by_mac, slot_of, macs = self.by_mac, self._slot, self.log_mac_list
+        ap_of = [self._ap(ap_id) for ap_id in self.log_ap_list]
+        open_ = self.open = {}
+        for i, a, r in zip(ids, aps, rssi):
+            mac = macs[i]
+            slot = by_mac.get(mac)
+            open_[slot_of(mac) if slot is None else slot] = (ap_of[a], r)
+
+    def _commit(self):
+        """Fold the open bucket into the bitmaps and runs."""
+        bucket = self.open_bucket
+        if self.oldest is None:
+            self.oldest = bucket
+        elif self.oldest <= bucket - self.window + 1 - self.expire_step:
+            self._expire(bucket - self.window + 1)
+        pos = bucket % self.ring
+        byte, mask = pos >> 3, 1 << (pos & 7)
+        clients, members = self.clients, self.ap_members
+        for slot, (ap, rssi) in self.open.items():
+            client = clients[slot]
+            client.bits[byte] |= mask
+            starts = client.starts
+            if starts and client.aps[-1] == ap and starts[-1] + client.lengths[-1] == bucket:
+                client.lengths[-1] += 1
+            else:
+                starts.append(bucket)
+                client.lengths.append(1)
+                client.aps.append(ap)
+                members[ap].add(slot)
+            client.rssi.append(rssi)
+        self.committed = bucket
+        self.open_bucket = None
+        self.open = {}
+
+    def _expire(self, cutoff):
+        """Drop buckets before `cutoff`: clear their bits, trim runs, free empty clients."""
+        self.oldest = cutoff
+        for slot, client in enumerate(self.clients):
+            if client is None or not client.starts or client.starts[0] >= cutoff:
+                continue
+            while client.starts and client.starts[0] < cutoff:
+                start, length, ap = client.starts[0], client.lengths[0], client.aps[0]
+                drop = min(cutoff - start, length)
+                for bucket in range(start, start + drop):
+                    pos = bucket % self.ring
+                    client.bits[pos >> 3] &= ~(1 << (pos & 7)) & 0xFF
+                del client.rssi[:drop]
+                if drop < length:
+                    client.starts[0] += drop
+                    client.lengths[0] -= drop
+                    break
+                del client.starts[0], client.lengths[0], client.aps[0]
+                if ap not in client.aps:
+                    self.ap_members[ap].discard(slot)
+            if not client.starts and slot not in self.open:
+                del self.by_mac[client.mac]
+                self.clients[slot] = None
+                self.free.append(slot)
+
+    # -- log ---------------------------------------------------------------------
+
+    def _parse(self, data, base):
+        """Apply the complete records in `data` (read from offset `base`); returns bytes used."""
+        pos = 0
+        if base == 0:
+            if len(data) < _HEADER.size:
+                return 0
+            magic, fmt, bucket_minutes = _HEADER.unpack_from(data)
+            if magic != PRESENCE_MAGIC or fmt != PRESENCE_FORMAT or bucket_minutes != self.bucket_minutes:
+                raise ValueError(f"{self.path}: not a {self.bucket_minutes}-minute presence log")
+            pos = _HEADER.size
+        while pos < len(data):
+            kind = data[pos:pos + 1]
+            if kind in (b"M", b"A"):
+                if pos + _NAME.size > len(data):
+                    break
+                _, length = _NAME.unpack_from(data, pos)
+                end = pos + _NAME.size + length
+                if end > len(data):
+                    break
+                name = data[pos + _NAME.size:end].decode("utf-8")
+                if kind == b"M":
+                    self.log_macs[name] = len(self.log_mac_list)
+                    self.log_mac_list.append(name)
+                else:
+                    self.log_aps[name] = len(self.log_ap_list)
+                    self.log_ap_list.append(name)
+                pos = end
+            elif kind == b"B":
+                if pos + _BUCKET.size > len(data):
+                    break
+                _, bucket, count, length = _BUCKET.unpack_from(data, pos)
+                end = pos + _BUCKET.size + length
+                if end > len(data):
+                    break
+                raw = zlib.decompress(data[pos + _BUCKET.size:end])
+                ids, aps, rssi = array("I"), array("H"), array("b")
+                ids.frombytes(raw[:4 * count])
+                aps.frombytes(raw[4 * count:6 * count])
+                rssi.frombytes(raw[6 * count:7 * count])
+                if sys.byteorder == "big":
+                    ids.byteswap()
+                    aps.byteswap()
+                self._note_record(bucket)
+                self._observe_log(bucket, ids, aps, rssi)
+                pos = end
+            else:
+                raise ValueError(f"{self.path}: bad record at byte {base + pos}")
+        return pos
+
+    def _note_record(self, bucket):
+        if self.log_first is None:
+            self.log_first = bucket
+        if bucket != self.open_bucket:
+            self.log_buckets += 1
+        self.log_records += 1
+
+    def refresh(self):
+        """Read records appended since the last call (everything after a rewrite). Returns a version."""
+        with self.lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                if self.inode is not None:
+                    self._reset(None)
+                return (None, 0)
+            if st.st_ino != self.inode or st.st_size < self.offset:
+                self._reset(st.st_ino)
+            if st.st_size > self.offset:
+                with open(self.path, "rb") as f:
+                    f.seek(self.offset)
+                    data = f.read(st.st_size - self.offset)
+                self.offset += self._parse(data, self.offset)
+            return (self.inode, self.offset)
+
+    def load(self):
+        """Read the whole log (writer side); a torn last record is cut off."""
+        self.refresh()
+        if not self.readonly and os.path.exists(self.path) and os.path.getsize(self.path) > self.offset:
+            with open(self.path, "r+b") as f:
+                f.truncate(self.offset)
+        return self
+
+    def _name_records(self, names, table, table_list, kind):
+        out = []
+        for name in names:
+            if name not in table:
+                table[name] = len(table_list)
+                table_list.append(name)
+                raw = name.encode("utf-8")
+                out.append(_NAME.pack(kind, len(raw)) + raw)
+        return out
+
+    def _bucket_record(self, bucket, rows):
+        """rows: [(log client id, log AP id, rssi)] sorted by client id."""
+        ids = _le(array("I", (r[0] for r in rows)))
+        aps = _le(array("H", (r[1] for r in rows)))
+        rssi = array("b", (r[2] for r in rows))
+        body = zlib.compress(ids.tobytes() + aps.tobytes() + rssi.tobytes(), 6)
+        return _BUCKET.pack(b"B", bucket, len(rows), len(body)) + body
+
+    def record(self, ts, samples):
+        """
+        Store the clients seen at epoch `ts`: samples of (mac, ap id, rssi dBm or None).
+        Replaces anything recorded earlier for the same bucket. Returns
+        (bytes appended, bytes rewritten by a compaction).
+        """
+        bucket = int(ts) // self.bucket_sec
+        entries = {}
+        for mac, ap_id, rssi in samples:
+            if mac and ap_id:
+                entries[mac] = (ap_id, _rssi(rssi))
+        with self.lock:
+            if self.open_bucket is not None and bucket < self.open_bucket:
+                return 0, 0
+            parts = [] if self.offset else [_HEADER.pack(PRESENCE_MAGIC, PRESENCE_FORMAT, self.bucket_minutes)]
+            parts += self._name_records(entries, self.log_macs, self.log_mac_list, b"M")
+            parts += self._name_records(
+                {ap_id for ap_id, _ in entries.values()}, self.log_aps, self.log_ap_list, b"A"
+            )
+            rows = sorted((self.log_macs[mac], self.log_aps[ap_id], rssi) for mac, (ap_id, rssi) in entries.items())
+            parts.append(self._bucket_record(bucket, rows))
+            body = b"".join(parts)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(body)
+            if self.inode is None:
+                self.inode = os.stat(self.path).st_ino
+            self.offset += len(body)
+            self._note_record(bucket)
+            self._observe(bucket, entries)
+            rewritten = 0
+            if self._needs_compaction(bucket):
+                rewritten = self._rewrite()
+            return len(body), rewritten
+
+    def _needs_compaction(self, bucket):
+        slack = COMPACT_SLACK_DAYS * 1440 // self.bucket_minutes
+        expired = self.log_first is not None and bucket - self.log_first >= self.window + slack
+        superseded = self.log_records > 2 * self.log_buckets + slack
+        return expired or superseded
+
+    def _rewrite(self):
+        """Rewrite the log from memory: one record per bucket, only what is in the window."""
+        log_macs, log_mac_list = {}, []
+        parts = [_HEADER.pack(PRESENCE_MAGIC, PRESENCE_FORMAT, self.bucket_minutes)]
+        for client in self.clients:
+            if client is not None:
+                parts += self._name_records([client.mac], log_macs, log_mac_list, b"M")
+        parts += self._name_records(self.ap_ids, {}, [], b"A")
+        buckets = {}
+        for client in self.clients:
+            if client is None:
+                continue
+            client_id = log_macs[client.mac]
+            offset = 0
+            for start, length, ap in zip(client.starts, client.lengths, client.aps):
+                for i in range(length):
+                    buckets.setdefault(start + i, []).append((client_id, ap, client.rssi[offset + i]))
+                offset += length
+        if self.open_bucket is not None:
+            buckets[self.open_bucket] = [
+                (log_macs[self.clients[slot].mac], ap, rssi) for slot, (ap, rssi) in self.open.items()
+            ]
+        for bucket in sorted(buckets):
+            parts.append(self._bucket_record(bucket, sorted(buckets[bucket])))
+        body = b"".join(parts)
+        tmp = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, self.path)
+        self.inode = os.stat(self.path).st_ino
+        self.offset = len(body)
+        self.log_macs, self.log_mac_list = log_macs, log_mac_list
+        self.log_aps = {ap_id: i for i, ap_id in enumerate(self.ap_ids)}
+        self.log_ap_list = list(self.ap_ids)
+        self.log_first = min(buckets) if buckets else None
+        self.log_records = self.log_buckets = len(buckets)
+        return len(body)
+
+    # -- queries -----------------------------------------------------------------
+
+    def latest_ts(self):
+        with self.lock:
+            bucket = self.open_bucket if self.open_bucket is not None else self.committed
+            return None if bucket is None else bucket * self.bucket_sec
+
+    def version(self):
+        return self.refresh() if self.readonly else (self.inode, self.offset)
+
+    def _runs(self, slot, first, last, ap=None):
+        """(AP, first bucket, last bucket, rssi list) for the runs of a client in range."""
+        client = self.clients[slot]
+        runs = []
+        offset = 0
+        for start, length, run_ap in zip(client.starts, client.lengths, client.aps):
+            lo, hi = max(start, first), min(start + length - 1, last)
+            if lo <= hi and (ap is None or run_ap == ap):
+                runs.append([run_ap, lo, hi, list(client.rssi[offset + lo - start:offset + hi - start + 1])])
+            offset += length
+        if self.open_bucket is not None and first <= self.open_bucket <= last and slot in self.open:
+            open_ap, rssi = self.open[slot]
+            if ap is None or open_ap == ap:
+                if runs and runs[-1][0] == open_ap and runs[-1][2] == self.open_bucket - 1:
+                    runs[-1][2] = self.open_bucket
+                    runs[-1][3].append(rssi)
+                else:
+                    runs.append([open_ap, self.open_bucket, self.open_bucket, [rssi]])
+        return runs
+
+    def _presence(self, slot, first, last):
+        """Presence bits for buckets first..last as bytes (bit i = bucket first + i), from the ring bitmap."""
+        client = self.clients[slot]
+        ring = int.from_bytes(client.bits, "little")
+        count = last - first + 1
+        pos = first % self.ring
+        bits = ring >> pos
+        if pos + count > self.ring:
+            bits |= ring << (self.ring - pos)
+        bits &= (1 << count) - 1
+        if self.open_bucket is not None and slot in self.open and first <= self.open_bucket <= last:
+            bits |= 1 << (self.open_bucket - first)
+        return bits.to_bytes((count + 7) // 8, "little")
+
+    def _clip(self, start, end):
+        newest = self.open_bucket if self.open_bucket is not None else self.committed
+        if newest is None:
+            return None
+        first = max(int(start) // self.bucket_sec, newest - self.window + 1)
+        last = min(int(end) // self.bucket_sec, newest)
+        return (first, last) if first <= last else None
+
+    def _run_json(self, run):
+        ap, lo, hi, rssi = run
+        return {
+            "ap": self.ap_ids[ap],
+            "from": _iso(lo * self.bucket_sec),
+            "to": _iso((hi + 1) * self.bucket_sec),
+            "buckets": hi - lo + 1,
+            "rssi": [None if r == NO_RSSI else r for r in rssi],
+        }
+
+    def client(self, mac, start, end):
+        """
+        Where a client was between `start` and `end`: AP runs with per-bucket RSSI and
+        the presence bitmap of the range (hex, bit i = i-th bucket). None if unknown.
+        """
+        with self.lock:
+            slot = self.by_mac.get(mac)
+            span = self._clip(start, end)
+            if slot is None or span is None:
+                return None
+            first, last = span
+            runs = self._runs(slot, first, last)
+            return {
+                "mac": mac,
+                "bucket_minutes": self.bucket_minutes,
+                "first_bucket": _iso(first * self.bucket_sec),
+                "buckets": last - first + 1,
+                "present_buckets": sum(run[2] - run[1] + 1 for run in runs),
+                "presence": self._presence(slot, first, last).hex(),
+                "runs": [self._run_json(run) for run in runs],
+            }
+
+    def ap(self, ap_id, start, end):
+        """Clients seen on an AP between `start` and `end`, most recently seen first."""
+        with self.lock:
+            ap = self.ap_index.get(ap_id)
+            span = self._clip(start, end)
+            if ap is None or span is None:
+                return []
+            first, last = span
+            slots = set(self.ap_members[ap])
+            slots.update(slot for slot, (open_ap, _) in self.open.items() if open_ap == ap)
+            clients = []
+            for slot in slots:
+                runs = self._runs(slot, first, last, ap=ap)
+                if not runs:
+                    continue
+                samples = [r for run in runs for r in run[3] if r != NO_RSSI]
+                clients.append(
+                    {
+                        "mac": self.clients[slot].mac,
+                        "first_seen": _iso(runs[0][1] * self.bucket_sec),
+                        "last_seen": _iso((runs[-1][2] + 1) * self.bucket_sec),
+                        "buckets": sum(run[2] - run[1] + 1 for run in runs),
+                        "visits": len(runs),
+                        "rssi_avg": round(sum(samples) / len(samples), 1) if samples else None,
+                    }
+                )
+            clients.sort(key=lambda c: (c["last_seen"], c["mac"]), reverse=True)
+            return clients
+
+    def stats(self):
+        """Counts and the bytes held in the bitmaps and run/RSSI arrays."""
+        with self.lock:
+            live = [c for c in self.clients if c is not None]
+            array_bytes = sum(
+                len(c.bits) + c.starts.itemsize * len(c.starts) * 2 + len(c.aps) * 2 + len(c.rssi) for c in live
+            )
+            return {
+                "clients": len(live),
+                "aps": len(self.ap_ids),
+                "runs": sum(len(c.starts) for c in live),
+                "samples": sum(len(c.rssi) for c in live),
+                "array_bytes": array_bytes,
+                "log_bytes": self.offset,
+            }
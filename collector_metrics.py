@@ -0,0 +1,224 @@
+"""
+Per-cycle instrumentation for the collector (stdlib only).
+A CycleMetrics object collects HTTP calls, stage timings and file writes from any
+thread during one cycle; finish() turns them into a JSON-able record that is
+appended to a JSONL log and rendered as a Prometheus textfile (node_exporter
+textfile collector format).
+"""
+
+import calendar
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class CycleMetrics:
+    """Thread-safe accumulator for one collection cycle."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.http = []
+        self.stages = []
+        self.files = []
+        self.skipped = []
+        self.values = {}
+
+    def record_http(self, kind, path, status, size, seconds, attempt=0, error=None):
+        """One HTTP call. attempt > 0 means a retry / fallback path for the same kind."""
+        entry = {
+            "kind": kind,
+            "path": path,
+            "status": status,
+            "bytes": size,
+            "seconds": round(seconds, 6),
+            "attempt": attempt,
+        }
+        if error:
+            entry["error"] = error
+        with self.lock:
+            self.http.append(entry)
+
+    def record_file(self, path, size, seconds, files=None):
+        """A file write; `files` counts the files of a directory recorded as one entry."""
+        entry = {"path": path, "bytes": size, "seconds": round(seconds, 6)}
+        if files is not None:
+            entry["files"] = files
+        with self.lock:
+            self.files.append(entry)
+
+    def record_skip(self, path, size):
+        """A write avoided because the content was unchanged; size is what it would have cost."""
+        with self.lock:
+            self.skipped.append({"path": path, "bytes": size})
+
+    def write_totals(self):
+        """(bytes written, bytes skipped as unchanged) so far in this cycle."""
+        with self.lock:
+            return sum(f["bytes"] for f in self.files), sum(f["bytes"] for f in self.skipped)
+
+    def set(self, name, value):
+        """Free-form cycle values (device counts, cache hits, ...)."""
+        with self.lock:
+            self.values[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.stages.append({"name": name, "seconds": round(seconds, 6)})
+
+    def finish(self, ok=True):
+        """Close the cycle and return its record."""
+        with self.lock:
+            return {
+                "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+                "ok": ok,
+                "seconds": round(time.perf_counter() - self._t0, 6),
+                "stages": list(self.stages),
+                "http": list(self.http),
+                "files": list(self.files),
+                "skipped": list(self.skipped),
+                "values": dict(self.values),
+            }
+
+
+def record_epoch(record):
+    return calendar.timegm(time.strptime(record["ts"], "%Y-%m-%dT%H:%M:%SZ"))
+
+
+class WriteRate:
+    """
+    Bytes written and skipped per day, projected from the cycles of the last `window`
+    seconds. Seeded from earlier cycle records so a restart does not reset it.
+    """
+
+    def __init__(self, window=86400):
+        self.window = window
+        self.samples = deque()  # (epoch, written, skipped)
+
+    def add(self, epoch, written, skipped):
+        self.samples.append((epoch, written, skipped))
+        while self.samples and self.samples[0][0] < epoch - self.window:
+            self.samples.popleft()
+
+    def seed(self, records):
+        for record in records:
+            try:
+                epoch = record_epoch(record)
+            except (KeyError, ValueError):
+                continue
+            written = sum(f.get("bytes") or 0 for f in record.get("files", []))
+            skipped = sum(f.get("bytes") or 0 for f in record.get("skipped", []))
+            self.add(epoch, written, skipped)
+
+    def per_day(self):
+        """(written, skipped) bytes per day, or (None, None) until two cycles are known."""
+        if len(self.samples) < 2:
+            return None, None
+        first, last = self.samples[0][0], self.samples[-1][0]
+        # n samples cover n intervals of the average cycle length
+        span = (last - first) * len(self.samples) / (len(self.samples) - 1)
+        if span <= 0:
+            return None, None
+        scale = 86400 / span
+        written = sum(s[1] for s in self.samples)
+        skipped = sum(s[2] for s in self.samples)
+        return round(written * scale), round(skipped * scale)
+
+
+def append_jsonl(path, record, max_bytes=None):
+    """Append a record; once the log exceeds max_bytes it is rotated to <path>.1."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if max_bytes and os.path.exists(path) and os.path.getsize(path) > max_bytes:
+        os.replace(path, path + ".1")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _sample(name, value, labels=None):
+    if labels:
+        inner = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+        return f"{name}{{{inner}}} {value}"
+    return f"{name} {value}"
+
+
+def prometheus_text(record, prefix="network_collector"):
+    """Render a cycle record as Prometheus text exposition (gauges for the last cycle)."""
+    metrics = {}
+
+    def add(name, help_text, value, labels=None):
+        full = f"{prefix}_{name}"
+        if full not in metrics:
+            metrics[full] = [f"# HELP {full} {help_text}", f"# TYPE {full} gauge"]
+        metrics[full].append(_sample(full, value, labels))
+
+    started = record_epoch(record)
+    add("last_cycle_timestamp_seconds", "Start of the last cycle (unix time).", started)
+    add("last_cycle_success", "1 if the last cycle completed.", int(record["ok"]))
+    add("cycle_duration_seconds", "Wall time of the last cycle.", record["seconds"])
+
+    stage_totals = {}
+    for stage in record["stages"]:
+        stage_totals[stage["name"]] = stage_totals.get(stage["name"], 0.0) + stage["seconds"]
+    for name, seconds in stage_totals.items():
+        add("stage_duration_seconds", "Wall time per cycle stage.", round(seconds, 6), {"stage": name})
+
+    by_kind = {}
+    for call in record["http"]:
+        kind = by_kind.setdefault(
+            call["kind"], {"requests": 0, "retries": 0, "errors": 0, "bytes": 0, "seconds": 0.0, "status": None}
+        )
+        kind["requests"] += 1
+        kind["retries"] += 1 if call["attempt"] else 0
+        kind["errors"] += 1 if call.get("error") or (call["status"] or 0) >= 400 else 0
+        kind["bytes"] += call["bytes"] or 0
+        kind["seconds"] += call["seconds"]
+        kind["status"] = call["status"]
+    for name, kind in by_kind.items():
+        labels = {"kind": name}
+        add("http_requests", "HTTP requests made in the last cycle.", kind["requests"], labels)
+        add("http_retries", "Retries / fallback paths tried in the last cycle.", kind["retries"], labels)
+        add("http_errors", "Failed HTTP requests (exception or status >= 400).", kind["errors"], labels)
+        add("http_response_bytes", "Response body bytes received.", kind["bytes"], labels)
+        add("http_duration_seconds", "Total time spent in HTTP requests.", round(kind["seconds"], 6), labels)
+        add("http_last_status", "Status code of the last request (0 = no response).", kind["status"] or 0, labels)
+
+    file_totals = {}
+    for entry in record["files"]:
+        total = file_totals.setdefault(entry["path"], [0, 0.0, None])
+        total[0] += entry["bytes"]
+        total[1] += entry["seconds"]
+        if "files" in entry:
+            total[2] = (total[2] or 0) + entry["files"]
+    for path, (size, seconds, files) in file_totals.items():
+        add("file_write_bytes", "Bytes written per output file.", size, {"file": path})
+        add("file_write_seconds", "Time spent writing per output file.", round(seconds, 6), {"file": path})
+        if files is not None:
+            add("file_write_files", "Files written under an output directory.", files, {"file": path})
+
+    skipped_totals = {}
+    for entry in record.get("skipped", []):
+        skipped_totals[entry["path"]] = skipped_totals.get(entry["path"], 0) + entry["bytes"]
+    for path, size in skipped_totals.items():
+        add("file_skipped_bytes", "Bytes not written because the content was unchanged.", size, {"file": path})
+
+    for name, value in record["values"].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            add(name, f"Cycle value {name}.", value)
+
+    return "\n".join(line for lines in metrics.values() for line in lines) + "\n"
@@ -0,0 +1,713 @@
+"""
+On-demand history queries for the map (stdlib only, runs next to the web container).
+
+The timeline files cover three fixed windows. This server answers arbitrary ranges
+and bucket sizes straight from the snapshot history, downsampled server-side
+(latest frame per bucket, like the timeline files):
+
+    GET /history/frames?hours=48&bucket=30           frames, one columnar body like a timeline segment
+    GET /history/frames?start=2026-05-01T00:00:00Z&end=2026-05-02T00:00:00Z
+    GET /history/device?id=<id>[&source=uisp]&hours=168&bucket=60[&agg=last|avg|min|max]
+    GET /history/link?from=<id>&to=<id>[&type=wireless]&hours=24
+    GET /history/client?mac=<mac>&hours=720           AP runs, signal and presence bitmap of a client
+    GET /history/ap?id=<device id>&hours=720          clients seen on an AP (or switch)
+    GET /health
+
+start/end take ISO-8601 UTC or epoch seconds; end defaults to now, start to end - hours
+(default 24). bucket is in minutes and defaults to about DEFAULT_POINTS buckets.
+
+With HISTORY_BACKEND=jsonl the snapshot log is indexed by byte offset as it grows,
+so a query seeks to the keyframe before `start` instead of scanning the log; with
+HISTORY_BACKEND=sqlite the store's timestamp indexes are used. Encoded responses
+are kept in an LRU cache keyed by the bucket-aligned query and the history version,
+so repeated views cost nothing until a new frame arrives. The client and ap routes
+read the collector's client presence log (client_presence.py) at its own bucket size.
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import math
+import os
+import re
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import network_collector as nc
+from client_presence import ClientPresenceStore
+from history_store import SQLiteHistoryStore, iso_to_epoch
+from throughput import throughput_block
+
+HISTORY_API_PORT = int(os.getenv("HISTORY_API_PORT", "8002"))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "128"))
+# Idle read-only SQLite connections kept for reuse across request threads
+HISTORY_DB_CONNECTIONS = int(os.getenv("HISTORY_DB_CONNECTIONS", "4"))
+# Browsers load the map from the web container's port
+HISTORY_CORS_ORIGIN = os.getenv("HISTORY_CORS_ORIGIN", "*")
+DEFAULT_HOURS = 24
+DEFAULT_POINTS = 288
+BUCKET_CHOICES = (1, 5, 10, 15, 30, 60, 180, 360, 720, 1440)
+MAX_BUCKETS = 5000
+SERIES_AGGREGATES = ("last", "avg", "min", "max")
+PRESENCE_ROUTES = ("client", "ap")
+
+_TS_RE = re.compile(rb'"ts":\s*"([^"]*)"')
+_KIND_RE = re.compile(rb'"kind":\s*"(\w+)"')
+_UNTIL_RE = re.compile(rb'"until":\s*"([^"]*)"')
+
+
+class QueryError(ValueError):
+    """Bad request parameters (answered with 400)."""
+
+
+class NotFound(LookupError):
+    """Unknown route, or no samples of the requested device/link in range (answered with 404)."""
+
+
+class LRUCache:
+    """Small thread-safe LRU of encoded responses."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.items), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class SnapshotLogIndex:
+    """
+    Byte offset, timestamp and keyframe flag of every line of the JSONL snapshot log.
+    refresh() only reads what was appended since the last call (the log is rebuilt
+    from scratch if it was truncated or replaced), and records() seeks straight to
+    the keyframe needed to decode a range.
+
+    An "unchanged until" line is indexed at its first timestamp, with its last one in
+    `ends`. The collector rewrites it in place while the run grows, so a trailing one
+    is re-read whenever the file changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self.inode = inode
+        self.size = 0
+        self.mtime = None
+        self.ts = []
+        self.ends = []
+        self.offsets = []
+        self.keyframes = []
+        self.tail_open = False  # last line is an "unchanged until" record
+
+    def refresh(self):
+        """Index newly appended lines. Returns a version tuple for cache keys."""
+        with self.lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._reset(None)
+                return (None, 0, None)
+            changed = (st.st_size, st.st_mtime_ns) != (self.size, self.mtime)
+            if st.st_ino == self.inode and changed and self.tail_open:
+                self.size = self.offsets.pop()
+                for column in (self.ts, self.ends, self.keyframes):
+                    column.pop()
+                self.tail_open = False
+            if st.st_ino != self.inode or st.st_size < self.size:
+                self._reset(st.st_ino)
+            self.mtime = st.st_mtime_ns
+            if st.st_size > self.size:
+                with open(self.path, "rb") as f:
+                    f.seek(self.size)
+                    data = f.read(st.st_size - self.size)
+                pos = 0
+                while True:
+                    end = data.find(b"\n", pos)
+                    if end < 0:
+                        break  # partial last line: picked up on the next refresh
+                    self._index_line(data[pos:end], self.size + pos)
+                    pos = end + 1
+                self.size += pos
+            return (self.inode, self.size, self.mtime)
+
+    def _index_line(self, line, offset):
+        head = line[:200]
+        match = _TS_RE.search(head)
+        ts = iso_to_epoch(match.group(1).decode("ascii", "replace")) if match else None
+        if ts is None:
+            return
+        # The log is appended in time order; an out-of-order line would break bisect
+        if self.ends and ts < self.ends[-1]:
+            ts = self.ends[-1]
+        kind = _KIND_RE.search(head[:40])
+        kind = kind.group(1) if kind else b"key"
+        until = ts
+        if kind == b"same":
+            match = _UNTIL_RE.search(head)
+            until = max(iso_to_epoch(match.group(1).decode("ascii", "replace")) or ts, ts) if match else ts
+        self.ts.append(ts)
+        self.ends.append(until)
+        self.offsets.append(offset)
+        self.keyframes.append(kind == b"key")
+        self.tail_open = kind == b"same"
+
+    def latest_ts(self):
+        with self.lock:
+            return self.ends[-1] if self.ends else None
+
+    def _first_line(self, start):
+        """First line with frames at or after `start` (an unchanged run may begin before it)."""
+        first = bisect.bisect_left(self.ts, start)
+        if first > 0 and self.ends[first - 1] >= start:
+            first -= 1
+        return first
+
+    def _keyframe_before(self, line):
+        while line > 0 and not self.keyframes[line]:
+            line -= 1
+        return line
+
+    def _read_span(self, f, first, last):
+        """(ts, record) for index lines first..last inclusive (caller holds the lock)."""
+        begin = self.offsets[first]
+        stop = self.offsets[last + 1] if last + 1 < len(self.offsets) else self.size
+        f.seek(begin)
+        data = f.read(stop - begin)
+        records = []
+        lines = (line for line in data.split(b"\n") if line.strip())
+        for ts, line in zip(self.ts[first:last + 1], lines):
+            try:
+                records.append((ts, json.loads(line)))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+    def records(self, start, end):
+        """
+        (ts, record) pairs from the last keyframe at or before `start` through `end`,
+        with the epoch timestamps taken from the index.
+        """
+        with self.lock:
+            first = self._first_line(start)
+            last = bisect.bisect_right(self.ts, end) - 1
+            if first > last:
+                return []
+            with open(self.path, "rb") as f:
+                return self._read_span(f, self._keyframe_before(first), last)
+
+    def bucket_records(self, start, end, bucket_sec):
+        """
+        (ts, record, last_in_bucket) for the last line of every bucket in [start, end]
+        plus the lines needed to decode it (back to its keyframe). When keyframes are
+        sparser than buckets, lines between a bucket and the next keyframe are never
+        read or parsed; otherwise every bucket needs the lines before it anyway, and
+        the range is read once from the keyframe before `start`.
+        """
+        with self.lock:
+            first = self._first_line(start)
+            last = bisect.bisect_right(self.ts, end) - 1
+            if first > last:
+                return []
+            wanted = []
+            line = last
+            while line >= first:
+                wanted.append(line)
+                bucket_start = self.ts[line] // bucket_sec * bucket_sec
+                line = bisect.bisect_left(self.ts, bucket_start, first, line) - 1
+            wanted.reverse()
+            begin = self._keyframe_before(first)
+            if len(wanted) >= sum(self.keyframes[begin:last + 1]):
+                spans = [[begin, last]]
+            else:
+                spans = [[self._keyframe_before(n), n] for n in wanted]
+            wanted = set(wanted)
+            merged = []
+            for span in spans:
+                if merged and span[0] <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], span[1])
+                else:
+                    merged.append(span)
+            out = []
+            with open(self.path, "rb") as f:
+                for a, b in merged:
+                    for n, (ts, rec) in enumerate(self._read_span(f, a, b), start=a):
+                        out.append((ts, rec, n in wanted))
+            return out
+
+
+class JSONLHistory:
+    """Queries over the keyframe/delta snapshot log."""
+
+    def __init__(self, path=nc.SNAPSHOT_LOG):
+        self.index = SnapshotLogIndex(path)
+
+    def version(self):
+        return self.index.refresh()
+
+    def latest_ts(self):
+        return self.index.latest_ts()
+
+    def frames(self, start, end, bucket_minutes):
+        """
+        Latest frame per bucket in [start, end]. Records are applied to one running
+        state (decode_frames semantics) and a frame is only built for the last record
+        of each bucket; a keyframe resets the state, so skipped spans do not matter.
+        An "unchanged until" record stands for a frame at each of its timestamps.
+        """
+        bucket_sec = bucket_minutes * 60
+        latest = {}  # bucket -> (ts, frame)
+
+        def put(ts, iso):
+            if start <= ts <= end and ts >= latest.get(ts // bucket_sec, (ts,))[0]:
+                latest[ts // bucket_sec] = (
+                    ts, {"ts": iso, "devices": list(devices.values()), "links": list(links.values())}
+                )
+
+        devices = links = None
+        for ts, rec, last_in_bucket in self.index.bucket_records(start, end, bucket_sec):
+            kind = rec.get("kind", "key")
+            if kind == "key":
+                devices = {nc.device_frame_key(d): d for d in rec.get("devices", [])}
+                links = {nc.link_frame_key(l): l for l in rec.get("links", [])}
+            elif kind == "delta" and devices is not None:
+                for key in rec.get("removed_devices", []):
+                    devices.pop(key, None)
+                for dev in rec.get("devices", []):
+                    devices[nc.device_frame_key(dev)] = dev
+                for key in rec.get("removed_links", []):
+                    links.pop(key, None)
+                for link in rec.get("links", []):
+                    links[nc.link_frame_key(link)] = link
+            elif kind == "same" and devices is not None:
+                if last_in_bucket:
+                    for iso in nc.unchanged_timestamps(rec):
+                        put(iso_to_epoch(iso), iso)
+                continue
+            else:
+                continue
+            if last_in_bucket:
+                put(ts, rec.get("ts"))
+        return [latest[k][1] for k in sorted(latest)]
+
+    def _entity_rows(self, start, end, field, removed_field, key_fn, matches, metrics):
+        """
+        Follow the matching devices/links through keyframes and deltas without
+        materializing whole frames. `matches(key)` selects entities by frame key.
+        """
+        rows = []
+        current = None  # frame key -> latest item
+        for ts, rec in self.index.records(start, end):
+            kind = rec.get("kind", "key")
+            if kind == "same" and current is not None:
+                for iso in nc.unchanged_timestamps(rec):
+                    stamp = iso_to_epoch(iso)
+                    if start <= stamp <= end:
+                        rows.extend((stamp, *(item.get(m) for m in metrics)) for item in current.values())
+                continue
+            if kind == "key":
+                current = {}
+            elif kind != "delta" or current is None:
+                continue
+            for key in rec.get(removed_field, ()):
+                current.pop(key, None)
+            for item in rec.get(field, []):
+                key = key_fn(item)
+                if matches(key):
+                    current[key] = item
+            if not start <= ts <= end:
+                continue
+            for item in current.values():
+                rows.append((ts, *(item.get(m) for m in metrics)))
+        return rows
+
+    def device_rows(self, device_id, start, end, source=None):
+        if source:
+            wanted = nc.device_frame_key({"source": source, "id": device_id})
+            matches = wanted.__eq__
+        else:
+            matches = lambda key: key.partition(":")[2] == device_id  # noqa: E731
+        return self._entity_rows(
+            start, end, "devices", "removed_devices", nc.device_frame_key, matches,
+            nc.TIMELINE_DEVICE_METRICS,
+        )
+
+    def link_rows(self, from_id, to_id, start, end, link_type=None):
+        if link_type is not None:
+            wanted = nc.link_frame_key({"from": from_id, "to": to_id, "type": link_type})
+            matches = wanted.__eq__
+        else:
+            prefix = nc.link_frame_key({"from": from_id, "to": to_id})
+            matches = lambda key: key.startswith(prefix)  # noqa: E731
+        return self._entity_rows(
+            start, end, "links", "removed_links", nc.link_frame_key, matches, nc.TIMELINE_LINK_METRICS
+        )
+
+
+class SQLiteHistory:
+    """
+    Queries over the SQLite store. ThreadingHTTPServer starts a thread per request,
+    so read-only connections are borrowed from a small shared pool instead of being
+    opened per thread; at most HISTORY_DB_CONNECTIONS idle ones are kept open.
+    """
+
+    def __init__(self, path=nc.HISTORY_DB, pool_size=HISTORY_DB_CONNECTIONS):
+        self.path = path
+        self.pool_size = pool_size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def store(self):
+        with self.lock:
+            store = self.idle.pop() if self.idle else None
+        if store is None:
+            store = SQLiteHistoryStore(self.path, readonly=True)
+        try:
+            yield store
+        except BaseException:
+            store.close()  # may be mid-statement; do not hand it to the next query
+            raise
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(store)
+                return
+        store.close()
+
+    def version(self):
+        if not os.path.exists(self.path):
+            return (None, None)
+        with self.store() as store:
+            return store.version()
+
+    def latest_ts(self):
+        if not os.path.exists(self.path):
+            return None
+        with self.store() as store:
+            return store.latest_ts()
+
+    def frames(self, start, end, bucket_minutes):
+        with self.store() as store:
+            return store.frames_between(start, end, bucket_minutes)
+
+    def device_rows(self, device_id, start, end, source=None):
+        with self.store() as store:
+            return store.device_samples(device_id, start, end, source)
+
+    def link_rows(self, from_id, to_id, start, end, link_type=None):
+        with self.store() as store:
+            return store.link_samples(from_id, to_id, start, end, link_type)
+
+
+def epoch_to_iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def parse_time(value, name):
+    if value is None:
+        return None
+    if value.lstrip("-").isdigit():
+        return int(value)
+    ts = iso_to_epoch(value)
+    if ts is None:
+        raise QueryError(f"{name}: expected ISO-8601 or epoch seconds, got {value!r}")
+    return ts
+
+
+def default_bucket(span_seconds):
+    """Smallest standard bucket that keeps the range at or under DEFAULT_POINTS buckets."""
+    for minutes in BUCKET_CHOICES:
+        if span_seconds / (minutes * 60) <= DEFAULT_POINTS:
+            return minutes
+    return BUCKET_CHOICES[-1]
+
+
+def resolve_range(params, latest_ts):
+    """
+    (first_bucket, last_bucket, bucket_minutes) for the request. Buckets are aligned
+    to the epoch like bucket_snapshots; `end` is clamped to the newest frame so that
+    "the last N hours" maps to the same cache key until new data arrives.
+    """
+    try:
+        hours = float(params.get("hours", DEFAULT_HOURS))
+    except ValueError:
+        raise QueryError("hours: expected a number")
+    if not (math.isfinite(hours) and hours > 0):
+        raise QueryError("hours must be a positive number")
+    end = parse_time(params.get("end"), "end")
+    end = int(time.time()) if end is None else end
+    start = parse_time(params.get("start"), "start")
+    start = int(end - hours * 3600) if start is None else start
+    if start > end:
+        raise QueryError("start is after end")
+    if "bucket" in params:
+        try:
+            bucket_minutes = int(params["bucket"])
+        except ValueError:
+            raise QueryError("bucket: expected whole minutes")
+        if bucket_minutes < 1:
+            raise QueryError("bucket must be at least 1 minute")
+    else:
+        bucket_minutes = default_bucket(end - start)
+    bucket_sec = bucket_minutes * 60
+    if (end - start) // bucket_sec > MAX_BUCKETS:
+        raise QueryError(f"range needs more than {MAX_BUCKETS} buckets; use a larger bucket")
+    if latest_ts is not None:
+        end = min(end, latest_ts)
+    return start // bucket_sec, max(start, end) // bucket_sec, bucket_minutes
+
+
+def bucket_frames(frames, bucket_sec):
+    """Latest frame per bucket (bucket_snapshots semantics on epoch-second timestamps)."""
+    buckets = {}
+    for frame in frames:
+        ts = iso_to_epoch(frame.get("ts"))
+        if ts is None:
+            continue
+        key = ts // bucket_sec
+        existing = buckets.get(key)
+        if existing is None or frame.get("ts", "") >= existing.get("ts", ""):
+            buckets[key] = frame
+    return [buckets[k] for k in sorted(buckets)]
+
+
+def downsample_rows(rows, bucket_sec, metrics, agg):
+    """
+    Column series from (ts, *metrics) rows: one point per non-empty bucket, stamped
+    with the bucket start. "state" always takes the last value; numeric metrics are
+    aggregated with `agg`.
+    """
+    buckets = OrderedDict()
+    for row in rows:
+        buckets.setdefault(row[0] // bucket_sec, []).append(row)
+    series = {"ts": [], **{m: [] for m in metrics}}
+    for key, bucket_rows in buckets.items():
+        series["ts"].append(epoch_to_iso(key * bucket_sec))
+        for i, metric in enumerate(metrics, start=1):
+            if agg == "last" or metric == "state":
+                series[metric].append(bucket_rows[-1][i])
+                continue
+            values = [r[i] for r in bucket_rows if isinstance(r[i], (int, float))]
+            if not values:
+                series[metric].append(None)
+            elif agg == "avg":
+                series[metric].append(round(sum(values) / len(values), 3))
+            else:
+                series[metric].append(min(values) if agg == "min" else max(values))
+    return series
+
+
+class HistoryQueries:
+    """Query handlers shared by all server threads, with an LRU of encoded bodies."""
+
+    def __init__(self, backend, cache_size=HISTORY_CACHE_SIZE, presence=None):
+        self.backend = backend
+        self.presence = presence  # ClientPresenceStore (readonly) or None
+        self.cache = LRUCache(cache_size)
+
+    def query(self, route, params):
+        """Encoded JSON body for a route, from the cache when the history is unchanged."""
+        handler = {
+            "frames": self.frames,
+            "device": self.device,
+            "link": self.link,
+            "client": self.client,
+            "ap": self.ap,
+        }.get(route)
+        source = self.presence if route in PRESENCE_ROUTES else self.backend
+        if handler is None or source is None:
+            raise NotFound(f"unknown history route {route!r}")
+        if source is self.presence:
+            params = {**params, "bucket": str(self.presence.bucket_minutes)}
+        version = source.version()
+        first, last, bucket_minutes = resolve_range(params, source.latest_ts())
+        extra = tuple(sorted((k, v) for k, v in params.items() if k not in ("start", "end", "hours", "bucket")))
+        key = (route, first, last, bucket_minutes, extra, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        bucket_sec = bucket_minutes * 60
+        start, end = first * bucket_sec, (last + 1) * bucket_sec - 1
+        payload = handler(params, start, end, bucket_minutes)
+        payload.update({"range_start": epoch_to_iso(start), "range_end": epoch_to_iso(end)})
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.cache.put(key, body)
+        return body
+
+    def frames(self, params, start, end, bucket_minutes):
+        frames = bucket_frames(self.backend.frames(start, end, bucket_minutes), bucket_minutes * 60)
+        return {
+            "generated_at": nc.iso_utc_now(),
+            "range_hours": round((end + 1 - start) / 3600, 3),
+            "bucket_minutes": bucket_minutes,
+            **nc.timeline_body(frames, throughput_block(frames, top_n=nc.THROUGHPUT_TOP_N)),
+        }
+
+    @staticmethod
+    def _agg(params):
+        agg = params.get("agg", "last")
+        if agg not in SERIES_AGGREGATES:
+            raise QueryError(f"agg must be one of {', '.join(SERIES_AGGREGATES)}")
+        return agg
+
+    def device(self, params, start, end, bucket_minutes):
+        device_id = params.get("id")
+        if not device_id:
+            raise QueryError("id is required")
+        agg = self._agg(params)
+        rows = self.backend.device_rows(device_id, start, end, params.get("source"))
+        if not rows:
+            raise NotFound(f"no samples of device {device_id!r} in range")
+        return {
+            "id": device_id,
+            "source": params.get("source"),
+            "bucket_minutes": bucket_minutes,
+            "agg": agg,
+            "samples": len(rows),
+            "series": downsample_rows(rows, bucket_minutes * 60, nc.TIMELINE_DEVICE_METRICS, agg),
+        }
+
+    def link(self, params, start, end, bucket_minutes):
+        from_id, to_id = params.get("from"), params.get("to")
+        if not from_id or not to_id:
+            raise QueryError("from and to are required")
+        agg = self._agg(params)
+        rows = self.backend.link_rows(from_id, to_id, start, end, params.get("type"))
+        if not rows:
+            raise NotFound(f"no samples of link {from_id!r} -> {to_id!r} in range")
+        return {
+            "from": from_id,
+            "to": to_id,
+            "type": params.get("type"),
+            "bucket_minutes": bucket_minutes,
+            "agg": agg,
+            "samples": len(rows),
+            "series": downsample_rows(rows, bucket_minutes * 60, nc.TIMELINE_LINK_METRICS, agg),
+        }
+
+    def client(self, params, start, end, bucket_minutes):
+        mac = params.get("mac")
+        if not mac:
+            raise QueryError("mac is required")
+        found = self.presence.client(mac, start, end)
+        return found or {"mac": mac, "bucket_minutes": bucket_minutes, "present_buckets": 0, "runs": []}
+
+    def ap(self, params, start, end, bucket_minutes):
+        ap_id = params.get("id")
+        if not ap_id:
+            raise QueryError("id is required")
+        clients = self.presence.ap(ap_id, start, end)
+        return {"id": ap_id, "bucket_minutes": bucket_minutes, "count": len(clients), "clients": clients}
+
+
+def make_backend(name):
+    if name == "sqlite":
+        return SQLiteHistory(nc.HISTORY_DB)
+    return JSONLHistory(nc.SNAPSHOT_LOG)
+
+
+class HistoryHandler(BaseHTTPRequestHandler):
+    queries = None  # HistoryQueries, set by main()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+        if path == "/health":
+            body = json.dumps(
+                {"ok": True, "cache": self.queries.cache.stats(), "latest": self._latest()}
+            ).encode("utf-8")
+            return self.send_body(200, body)
+        if not path.startswith("/history/"):
+            return self.send_error_json(404, "not found")
+        try:
+            body = self.queries.query(path[len("/history/"):], params)
+        except NotFound as e:
+            return self.send_error_json(404, str(e))
+        except QueryError as e:
+            return self.send_error_json(400, str(e))
+        except Exception:
+            traceback.print_exc()
+            return self.send_error_json(500, "internal error")
+        return self.send_body(200, body)
+
+    def _latest(self):
+        ts = self.queries.backend.latest_ts()
+        return epoch_to_iso(ts) if ts is not None else None
+
+    def send_error_json(self, status, message):
+        self.send_body(status, json.dumps({"error": message}).encode("utf-8"))
+
+    def send_body(self, status, body):
+        encoding = None
+        if len(body) > 1024 and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            body = gzip.compress(body, compresslevel=6)
+            encoding = "gzip"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if HISTORY_CORS_ORIGIN:
+            self.send_header("Access-Control-Allow-Origin", HISTORY_CORS_ORIGIN)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve on-demand history queries for the map.")
+    parser.add_argument("--port", type=int, default=HISTORY_API_PORT)
+    parser.add_argument("--bind", default="0.0.0.0")
+    parser.add_argument("--backend", choices=("jsonl", "sqlite"), default=nc.HISTORY_BACKEND)
+    parser.add_argument("--cache-size", type=int, default=HISTORY_CACHE_SIZE, help="cached query results")
+    args = parser.parse_args(argv)
+
+    presence = None
+    if nc.CLIENT_PRESENCE:
+        presence = ClientPresenceStore(
+            nc.CLIENT_PRESENCE_LOG, nc.PRESENCE_BUCKET_MINUTES, nc.PRESENCE_RETENTION_DAYS, readonly=True
+        ).load()
+    HistoryHandler.queries = HistoryQueries(make_backend(args.backend), cache_size=args.cache_size, presence=presence)
+    server = ThreadingHTTPServer((args.bind, args.port), HistoryHandler)
+    print(f"[history] {args.backend} history on http://{args.bind}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+SQLite history backend for network snapshots (stdlib sqlite3 only).
+Stores every frame plus per-device/per-link rows indexed by timestamp, keeps
+10/60/180-minute rollups (latest frame per bucket) up to date as frames arrive,
+and prunes raw rows past the configured retention. Frame bodies are stored as
+zlib-compressed compact JSON, one frame per timestamp, and pruned pages are
+returned to the filesystem (incremental auto-vacuum).
+"""
+
+import json
+import sqlite3
+import zlib
+from datetime import datetime, timezone
+
+# bucket_minutes -> rollup table; matches the timeline ranges in network_collector
+ROLLUP_TABLES = {
+    10: "rollup_10m",
+    60: "rollup_60m",
+    180: "rollup_180m",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL UNIQUE,
+    ts_iso TEXT NOT NULL,
+    frame BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS device_samples (
+    frame_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    device_id TEXT,
+    source TEXT,
+    state,
+    clients INTEGER,
+    tx_bytes INTEGER,
+    rx_bytes INTEGER
+);
+CREATE INDEX IF NOT EXISTS device_samples_ts ON device_samples (ts);
+CREATE INDEX IF NOT EXISTS device_samples_device_ts ON device_samples (device_id, ts);
+
+CREATE TABLE IF NOT EXISTS link_samples (
+    frame_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    from_id TEXT,
+    to_id TEXT,
+    type TEXT,
+    state TEXT,
+    signal REAL
+);
+CREATE INDEX IF NOT EXISTS link_samples_ts ON link_samples (ts);
+CREATE INDEX IF NOT EXISTS link_samples_link_ts ON link_samples (from_id, to_id, ts);
+"""
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    bucket INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    ts_iso TEXT NOT NULL,
+    frame BLOB NOT NULL
+);
+"""
+
+FRAME_COMPRESSION_LEVEL = 6
+
+
+def encode_frame(frame):
+    return zlib.compress(
+        json.dumps(frame, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        FRAME_COMPRESSION_LEVEL,
+    )
+
+
+def decode_frame(body):
+    return json.loads(zlib.decompress(body))
+
+
+def iso_to_epoch(value):
+    """ISO-8601 timestamp (trailing Z allowed) -> integer epoch seconds, or None."""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+
+class SQLiteHistoryStore:
+    """
+    Frame history in a single SQLite file.
+
+    raw_retention_days: frames/device/link rows older than this are deleted.
+    rollup_retention_days: rollup rows older than this are deleted.
+    readonly: open for queries only (history_server.py), without creating the schema.
+    A read-only store may be handed between threads, one at a time.
+    """
+
+    def __init__(self, path, raw_retention_days=7, rollup_retention_days=400, readonly=False):
+        self.path = path
+        self.raw_retention_days = raw_retention_days
+        self.rollup_retention_days = rollup_retention_days
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.conn = sqlite3.connect(path)
+        # Only takes effect on a new file, before the first table is created
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        for table in ROLLUP_TABLES.values():
+            self.conn.executescript(ROLLUP_SCHEMA.format(table=table))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _insert(self, frame):
+        """Store a frame and its rows; None if it has no timestamp or that timestamp is stored."""
+        ts = iso_to_epoch(frame.get("ts"))
+        if ts is None:
+            return None
+        ts_iso = frame["ts"]
+        body = encode_frame(frame)
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO frames (ts, ts_iso, frame) VALUES (?, ?, ?)", (ts, ts_iso, body)
+        )
+        if not cur.rowcount:
+            return None
+        frame_id = cur.lastrowid
+        self.conn.executemany(
+            "INSERT INTO device_samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    frame_id,
+                    ts,
+                    dev.get("id"),
+                    dev.get("source"),
+                    dev.get("state"),
+                    dev.get("clients"),
+                    dev.get("tx_bytes"),
+                    dev.get("rx_bytes"),
+                )
+                for dev in frame.get("devices", [])
+            ],
+        )
+        self.conn.executemany(
+            "INSERT INTO link_samples VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    frame_id,
+                    ts,
+                    link.get("from"),
+                    link.get("to"),
+                    link.get("type"),
+                    link.get("state"),
+                    link.get("signal"),
+                )
+                for link in frame.get("links", [])
+            ],
+        )
+        # Rollups keep the latest frame per bucket (bucket_snapshots semantics)
+        for bucket_minutes, table in ROLLUP_TABLES.items():
+            self.conn.execute(
+                f"INSERT INTO {table} (bucket, ts, ts_iso, frame) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT (bucket) DO UPDATE SET "
+                f"ts = excluded.ts, ts_iso = excluded.ts_iso, frame = excluded.frame "
+                f"WHERE excluded.ts_iso >= {table}.ts_iso",
+                (ts // (bucket_minutes * 60), ts, ts_iso, body),
+            )
+        return ts
+
+    def append(self, frame, now=None):
+        """Store one frame, update rollups and apply retention."""
+        with self.conn:
+            self._insert(frame)
+            deleted = self.prune(now)
+        if deleted:
+            self.vacuum()
+
+    def append_many(self, frames, now=None):
+        """Bulk insert (used by the JSONL importer). Returns the number of frames stored."""
+        count = 0
+        with self.conn:
+            for frame in frames:
+                if self._insert(frame) is not None:
+                    count += 1
+            deleted = self.prune(now)
+        if deleted:
+            self.vacuum()
+        return count
+
+    def vacuum(self):
+        """Give pages freed by pruning back to the filesystem."""
+        # executescript steps the pragma to completion (execute frees a single page)
+        self.conn.executescript("PRAGMA incremental_vacuum;")
+
+    def prune(self, now=None):
+        """Apply retention; returns the number of rows deleted."""
+        now = int(now if now is not None else datetime.now(timezone.utc).timestamp())
+        raw_cutoff = now - int(self.raw_retention_days * 86400)
+        deleted = self.conn.execute("DELETE FROM frames WHERE ts < ?", (raw_cutoff,)).rowcount
+        deleted += self.conn.execute("DELETE FROM device_samples WHERE ts < ?", (raw_cutoff,)).rowcount
+        deleted += self.conn.execute("DELETE FROM link_samples WHERE ts < ?", (raw_cutoff,)).rowcount
+        rollup_cutoff = now - int(self.rollup_retention_days * 86400)
+        for table in ROLLUP_TABLES.values():
+            deleted += self.conn.execute(f"DELETE FROM {table} WHERE ts < ?", (rollup_cutoff,)).rowcount
+        return deleted
+
+    def rollup_frames(self, bucket_minutes, hours, now=None):
+        """Latest frame per bucket for the last `hours`, oldest first."""
+        table = ROLLUP_TABLES.get(bucket_minutes)
+        if table is None:
+            raise ValueError(f"no rollup for {bucket_minutes}-minute buckets")
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        cutoff = int(now - hours * 3600)
+        rows = self.conn.execute(
+            f"SELECT frame FROM {table} WHERE ts >= ? ORDER BY bucket", (cutoff,)
+        )
+        return [decode_frame(row[0]) for row in rows]
+
+    def version(self):
+        """Changes whenever frames are added or pruned; used to key query caches."""
+        return self.conn.execute("SELECT MIN(id), MAX(id) FROM frames").fetchone()
+
+    def latest_ts(self):
+        return self.conn.execute("SELECT MAX(ts) FROM frames").fetchone()[0]
+
+    def frames_between(self, start, end, bucket_minutes=None):
+        """
+        Frames with start <= ts <= end, oldest first. The part of the range older than
+        the raw retention comes from the coarsest rollup no coarser than bucket_minutes.
+        """
+        frames = []
+        raw_start = self.conn.execute("SELECT MIN(ts) FROM frames").fetchone()[0]
+        if raw_start is None or start < raw_start:
+            fitting = [b for b in ROLLUP_TABLES if bucket_minutes is None or b <= bucket_minutes]
+            table = ROLLUP_TABLES[max(fitting) if fitting else min(ROLLUP_TABLES)]
+            rollup_end = end if raw_start is None else min(end, raw_start - 1)
+            rows = self.conn.execute(
+                f"SELECT frame FROM {table} WHERE ts BETWEEN ? AND ? ORDER BY ts", (start, rollup_end)
+            )
+            frames.extend(decode_frame(row[0]) for row in rows)
+        rows = self.conn.execute(
+            "SELECT frame FROM frames WHERE ts BETWEEN ? AND ? ORDER BY ts", (start, end)
+        )
+        frames.extend(decode_frame(row[0]) for row in rows)
+        return frames
+
+    def device_samples(self, device_id, start, end, source=None):
+        """(ts, state, clients, tx_bytes, rx_bytes) rows of one device, via the (device_id, ts) index."""
+        sql = (
+            "SELECT ts, state, clients, tx_bytes, rx_bytes FROM device_samples "
+            "WHERE device_id = ? AND ts BETWEEN ? AND ?"
+        )
+        params = [device_id, start, end]
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        return self.conn.execute(sql + " ORDER BY ts", params).fetchall()
+
+    def link_samples(self, from_id, to_id, start, end, link_type=None):
+        """(ts, state, signal) rows of one link, via the (from_id, to_id, ts) index."""
+        sql = (
+            "SELECT ts, state, signal FROM link_samples "
+            "WHERE from_id = ? AND to_id = ? AND ts BETWEEN ? AND ?"
+        )
+        params = [from_id, to_id, start, end]
+        if link_type:
+            sql += " AND type = ?"
+            params.append(link_type)
+        return self.conn.execute(sql + " ORDER BY ts", params).fetchall()
+
+    def frame_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0]
@@ -8,11 +8,25 @@
 
   const STORAGE_KEY = 'bombay-mars-device-positions';
   const DATA_URL = 'network_data.json';
+  const MANIFEST_URL = 'network_data.manifest.json';
+  // Spatial tiles written by the collector (spatial_tiles.py); without them the map
+  // falls back to the full network_data.json
+  const TILE_INDEX_URL = 'tiles/index.json';
+  // Paths to the gateway and failure impact per device (topology.py); optional
+  const TOPOLOGY_URL = 'topology.json';
   const TIMELINE_URLS = {
     '24h': 'history/timeline_24h.json',
     '7d': 'history/timeline_7d.json',
     '30d': 'history/timeline_30d.json',
   };
+  // Optional history query service (history_server.py), e.g. 'http://<host>:8002'.
+  // When set, timelines are queried on demand instead of read from the files above
+  const HISTORY_API_URL = '';
+  const TIMELINE_QUERIES = {
+    '24h': 'hours=24&bucket=10',
+    '7d': 'hours=168&bucket=60',
+    '30d': 'hours=720&bucket=180',
+  };
 
   const PALETTE = {
     unifi_ap:     '#4ecdc4',  // teal  – UniFi access point
@@ -20,6 +34,7 @@
     unifi_gw:     '#a78bfa',  // purple – UniFi gateway / UDM
     uisp:         '#ff8c42',  // orange – all UISP devices
     offline:      '#4b5563',  // dark grey – any offline device
+    stale:        '#fbbf24',  // amber outline – last known data, source not answering
     link_wireless:'#34a853',  // green baseline (overridden by signal)
     link_wired:   '#5b9cf6',  // blue – wired UniFi
     link_uisp:    '#ff8c42',  // orange – UISP wireless
@@ -64,6 +79,7 @@
   let linkLayer;
   let clientLayer;
   let clientLinkLayer;
+  let clusterLayer;
   let streetLayer;
   let satelliteLayer;
   let droneLayer = null;
@@ -74,6 +90,15 @@
   let selectedFeature = null;
   let adminMode = false;
   let baseNetworkData = null;
+  let networkDataHash = null; // sha256 from the manifest of the loaded network_data.json
+  let tileIndex = null; // tiles/index.json in tiled mode, null when using network_data.json
+  let tileSets = {}; // zoom -> Set of 'x/y' tiles that exist in the current generation
+  const tileCache = new Map(); // 'z/x/y' -> GeoJSON features
+  const pendingTiles = new Map(); // 'z/x/y' -> in-flight fetch
+  const tileDeviceIds = new Set();
+  const tileLinkKeys = new Set();
+  let topology = null; // topology.json plus index: id -> position in nodes
+  let topologyHighlight = null; // { path: Set, pathLinks: Set, downstream: Set } for the selected device
   let timelineFrames = [];
   let timelinePlaying = false;
   let timelineTimer = null;
@@ -98,6 +123,89 @@
     return `${link.from}::${link.to}::${link.type || ''}`;
   }
 
+  // Columnar timelines: shared device/link tables plus metric arrays
+  // indexed [frame][entity]. Frames are materialized lazily the first time the
+  // slider lands on them, so the slider is usable as soon as the JSON is parsed.
+  function columnarEntities(entities, metrics, f) {
+    const names = Object.keys(metrics || {});
+    const rows = names.map((name) => metrics[name]?.[f] || []);
+    const out = [];
+    for (let i = 0; i < entities.length; i++) {
+      let present = false;
+      for (let m = 0; m < rows.length; m++) {
+        if (rows[m][i] != null) { present = true; break; }
+      }
+      if (!present) continue;
+      const item = Object.assign({}, entities[i]);
+      for (let m = 0; m < names.length; m++) item[names[m]] = rows[m][i] ?? null;
+      out.push(item);
+    }
+    return out;
+  }
+
+  function decodeColumnarFrames(timeline) {
+    const devices = timeline.devices || [];
+    const links = timeline.links || [];
+    return (timeline.ts || []).map((ts, f) => {
+      const frame = { ts };
+      let cachedDevices = null;
+      let cachedLinks = null;
+      Object.defineProperty(frame, 'devices', {
+        get: () => cachedDevices || (cachedDevices = columnarEntities(devices, timeline.device_metrics, f)),
+      });
+      Object.defineProperty(frame, 'links', {
+        get: () => cachedLinks || (cachedLinks = columnarEntities(links, timeline.link_metrics, f)),
+      });
+      return frame;
+    });
+  }
+
+  function decodeTimelineFrames(timeline) {
+    if (timeline?.encoding === 'columnar') return decodeColumnarFrames(timeline);
+    return timeline?.frames || [];
+  }
+
+  // A timeline file is an index of segment files (encoding: 'segments'), each a
+  // columnar body with its throughput block; the history service answers with one
+  // body. Frames before the index start belong to buckets that have left the window.
+  function fetchTimelineFrames(url) {
+    return fetch(url)
+      .then((r) => {
+        if (!r.ok) throw new Error(`HTTP ${r.status}`);
+        return r.json();
+      })
+      .then((timeline) => {
+        if (timeline?.encoding !== 'segments') {
+          const frames = decodeTimelineFrames(timeline);
+          attachThroughput(frames, timeline.throughput);
+          return frames;
+        }
+        const base = new URL(url, window.location.href);
+        const segments = (timeline.segments || []).map((name) => fetch(new URL(name, base))
+          .then((r) => (r.ok ? r.json() : null))
+          .catch(() => null));
+        return Promise.all(segments).then((bodies) => {
+          const start = Date.parse(timeline.start);
+          const frames = [];
+          for (const body of bodies) {
+            if (!body) continue; // expired since the index was read
+            const decoded = decodeTimelineFrames(body);
+            attachThroughput(decoded, body.throughput);
+            for (const frame of decoded) {
+              if (!(Date.parse(frame.ts) < start)) frames.push(frame);
+            }
+          }
+          // The first frame of the window has no earlier sample to take a rate from
+          const first = frames[0]?.throughput;
+          if (first) {
+            const none = first.devices.map(() => null);
+            frames[0].throughput = { ...first, tx: none, rx: none, totalTx: null, totalRx: null, top: [] };
+          }
+          return frames;
+        });
+      });
+  }
+
   function getDeviceCoords(dev, source) {
     const overrides = loadPositionOverrides();
     const override = overrides[dev.id];
@@ -146,7 +254,8 @@
   function getLinkEndpoints(link) {
     const fromDev = getDeviceById(link.from);
     const toDev = getDeviceById(link.to);
-    if (!fromDev || !toDev) return null;
+    // Tiled mode: an endpoint may be in a tile that is not loaded; tile links carry coords
+    if ((!fromDev || !toDev) && !link.coords) return null;
 
     const fromFeature = deviceFeatures.get(link.from);
     const toFeature = deviceFeatures.get(link.to);
@@ -158,15 +267,19 @@
     if (fromFeature) {
       const coord = ol.proj.toLonLat(fromFeature.getGeometry().getCoordinates());
       fromPos = { lon: coord[0], lat: coord[1] };
-    } else {
+    } else if (fromDev) {
       fromPos = resolveDevicePosition(fromDev, fromDev.source, centroid);
+    } else {
+      fromPos = { lon: link.coords[0][0], lat: link.coords[0][1] };
     }
 
     if (toFeature) {
       const coord = ol.proj.toLonLat(toFeature.getGeometry().getCoordinates());
       toPos = { lon: coord[0], lat: coord[1] };
-    } else {
+    } else if (toDev) {
       toPos = resolveDevicePosition(toDev, toDev.source, centroid);
+    } else {
+      toPos = { lon: link.coords[1][0], lat: link.coords[1][1] };
     }
 
     if (!fromPos || !toPos || isNaN(fromPos.lat) || isNaN(fromPos.lon) || isNaN(toPos.lat) || isNaN(toPos.lon)) {
@@ -201,15 +314,16 @@
       fill = PALETTE.unifi_ap;
     }
 
-    const strokeColor = selected ? '#ffffff' : (isOffline ? '#374151' : 'rgba(0,0,0,0.45)');
-    const strokeWidth = selected ? 2.5 : 1.5;
+    const strokeColor = selected ? '#ffffff' : (dev.stale ? PALETTE.stale : (isOffline ? '#374151' : 'rgba(0,0,0,0.45)'));
+    const strokeWidth = selected ? 2.5 : (dev.stale ? 2 : 1.5);
+    const lineDash = dev.stale ? [3, 2] : undefined;
 
     // Shape: circle=UniFi AP, square=Switch, triangle=UISP
     let imageStyle;
     if (type === 'usw') {
       imageStyle = new ol.style.RegularShape({
         fill: new ol.style.Fill({ color: fill }),
-        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth }),
+        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth, lineDash }),
         points: 4,
         radius: selected ? 10 : 8,
         angle: Math.PI / 4,
@@ -217,7 +331,7 @@
     } else if (source === 'uisp') {
       imageStyle = new ol.style.RegularShape({
         fill: new ol.style.Fill({ color: fill }),
-        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth }),
+        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth, lineDash }),
         points: 3,
         radius: selected ? 12 : 10,
         angle: 0,
@@ -226,7 +340,7 @@
       // Pentagon for gateway
       imageStyle = new ol.style.RegularShape({
         fill: new ol.style.Fill({ color: fill }),
-        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth }),
+        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth, lineDash }),
         points: 5,
         radius: selected ? 11 : 9,
         angle: -Math.PI / 2,
@@ -235,13 +349,27 @@
       // Circle for AP
       imageStyle = new ol.style.Circle({
         fill: new ol.style.Fill({ color: fill }),
-        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth }),
+        stroke: new ol.style.Stroke({ color: strokeColor, width: strokeWidth, lineDash }),
         radius: selected ? 9 : 7,
       });
     }
 
     const styles = [new ol.style.Style({ image: imageStyle })];
 
+    // Topology of the selected device: red ring = goes dark if it fails, white = path to gateway
+    if (!selected && topologyHighlight) {
+      const ringColor = topologyHighlight.downstream.has(dev.id) ? '#f87171'
+        : (topologyHighlight.path.has(dev.id) ? '#ffffff' : null);
+      if (ringColor) {
+        styles.unshift(new ol.style.Style({
+          image: new ol.style.Circle({
+            radius: 13,
+            stroke: new ol.style.Stroke({ color: ringColor + 'cc', width: 2.5 }),
+          }),
+        }));
+      }
+    }
+
     // Glow ring when selected
     if (selected) {
       styles.unshift(
@@ -305,9 +433,30 @@
     });
   }
 
+  // Aggregated devices at low zoom (tiled mode): size by count, colour by majority source
+  function createClusterStyle(feature) {
+    const c = feature.get('cluster');
+    if (!c) return null;
+    const radius = Math.min(28, 8 + Math.log2(c.count) * 3);
+    const fill = c.online === 0 ? PALETTE.offline : (c.uisp > c.unifi ? PALETTE.uisp : PALETTE.unifi_ap);
+    return new ol.style.Style({
+      image: new ol.style.Circle({
+        radius,
+        fill: new ol.style.Fill({ color: fill }),
+        stroke: new ol.style.Stroke({ color: c.offline > 0 ? '#f87171' : 'rgba(255,255,255,0.9)', width: 2 }),
+      }),
+      text: new ol.style.Text({
+        text: String(c.count),
+        font: 'bold 11px sans-serif',
+        fill: new ol.style.Fill({ color: '#fff' }),
+      }),
+    });
+  }
+
   function createLinkStyle(feature, selected) {
     const link = feature.get('link');
     const type = link.type || 'wireless';
+    selected = selected || Boolean(topologyHighlight?.pathLinks.has(topologyLinkKey(link.from, link.to)));
 
     let color, width, lineDash;
 
@@ -481,12 +630,30 @@
       maxZoom: 22, // Allow OpenLayers to upscale the tiles
     });
 
-    // Слой с дрон-фото (GeoTIFF из OpenDroneMap)
+    // Слой с дрон-фото (GeoTIFF из OpenDroneMap). COG (reduce_geotiff.py --cog) читается
+    // по HTTP Range: загружаются только видимые тайлы нужного уровня обзора
     const DRONE_GEOTIFF_URL = 'odm/odm_orthophoto_reduced.tif';
     const DRONE_EXTENT = [-115.7358263, 33.3457243, -115.7107067, 33.3647887];
+    // Статическая пирамида тайлов (reduce_geotiff.py --xyz odm/tiles) вместо GeoTIFF, например
+    // { url: 'odm/tiles/{z}/{x}/{y}.webp', minZoom: 13, maxZoom: 20 }
+    const DRONE_XYZ = null;
     
     try {
-      if (typeof ol.source.GeoTIFF !== 'undefined' && typeof ol.layer.WebGLTile !== 'undefined') {
+      if (DRONE_XYZ) {
+        droneLayer = new ol.layer.Tile({
+          source: new ol.source.XYZ({
+            url: DRONE_XYZ.url,
+            minZoom: DRONE_XYZ.minZoom,
+            maxZoom: DRONE_XYZ.maxZoom,
+            wrapX: false,
+          }),
+          extent: ol.proj.transformExtent(DRONE_EXTENT, 'EPSG:4326', 'EPSG:3857'),
+          opacity: 0.85,
+          visible: false,
+          zIndex: 1,
+        });
+        console.log('✓ Слой тайлов XYZ создан. Включите слой "Drone Photo" в меню.');
+      } else if (typeof ol.source.GeoTIFF !== 'undefined' && typeof ol.layer.WebGLTile !== 'undefined') {
         const droneSource = new ol.source.GeoTIFF({
           sources: [{ url: DRONE_GEOTIFF_URL, normalize: false }],
           wrapX: false,
@@ -557,9 +724,16 @@
       zIndex: 8,
     });
 
+    clusterLayer = new ol.layer.Vector({
+      source: new ol.source.Vector(),
+      style: createClusterStyle,
+      visible: false,
+      zIndex: 11,
+    });
+
     map = new ol.Map({
       target: 'map',
-      layers: [streetLayer, satelliteLayer, droneLayer, linkLayer, clientLinkLayer, clientLayer, deviceLayer].filter(l => l !== null),
+      layers: [streetLayer, satelliteLayer, droneLayer, linkLayer, clientLinkLayer, clientLayer, deviceLayer, clusterLayer].filter(l => l !== null),
       view: new ol.View({
         center: ol.proj.fromLonLat([-115.73, 33.35]),
         zoom: 14,
@@ -572,13 +746,23 @@
 
     map.on('click', (e) => {
       map.forEachFeatureAtPixel(e.pixel, (f) => {
+        if (f.get('cluster')) {
+          // Zoom into a cluster until its devices come from detail tiles
+          const view = map.getView();
+          view.animate({ center: f.getGeometry().getCoordinates(), zoom: view.getZoom() + 2, duration: 400 });
+          return true;
+        }
         selectFeature(f);
         return true;
-      }, { layerFilter: (l) => l === deviceLayer || l === linkLayer || l === clientLayer });
+      }, { layerFilter: (l) => l === deviceLayer || l === linkLayer || l === clientLayer || l === clusterLayer });
+    });
+
+    map.on('moveend', () => {
+      if (tileIndex) loadVisibleTiles();
     });
 
     map.on('pointermove', (e) => {
-      const hit = map.hasFeatureAtPixel(e.pixel, { layerFilter: (l) => l === deviceLayer || l === linkLayer || l === clientLayer });
+      const hit = map.hasFeatureAtPixel(e.pixel, { layerFilter: (l) => l === deviceLayer || l === linkLayer || l === clientLayer || l === clusterLayer });
       map.getTargetElement().style.cursor = hit ? 'pointer' : '';
     });
 
@@ -605,12 +789,14 @@
       filters.showUisp = e.target.checked;
       renderDevices();
       renderLinks();
+      if (tileIndex) loadVisibleTiles();
     });
 
     document.getElementById('layer-unifi').addEventListener('change', (e) => {
       filters.showUnifi = e.target.checked;
       renderDevices();
       renderLinks();
+      if (tileIndex) loadVisibleTiles();
     });
 
     document.getElementById('layer-wireless').addEventListener('change', (e) => {
@@ -684,13 +870,83 @@
     bindTimelineUi();
   }
 
+  function topologyLinkKey(a, b) {
+    return a < b ? `${a}|${b}` : `${b}|${a}`;
+  }
+
+  // Path to the gateway (parent chain) and downstream set (the `size - 1` nodes after
+  // the device) from topology.json; null when the device is not in it
+  function topologyInfo(id) {
+    const i = topology?.index.get(id);
+    if (i == null) return null;
+    const path = [];
+    for (let j = i; j >= 0; j = topology.parent[j]) path.push(topology.nodes[j]);
+    return {
+      hops: topology.hops[i],
+      path: topology.hops[i] >= 0 ? path : [],
+      downstream: topology.nodes.slice(i + 1, i + topology.size[i]),
+    };
+  }
+
+  function updateTopologyHighlight() {
+    const dev = selectedFeature?.get('device');
+    const info = dev ? topologyInfo(dev.id) : null;
+    topologyHighlight = null;
+    if (!info) return;
+    const pathLinks = new Set();
+    for (let k = 1; k < info.path.length; k++) pathLinks.add(topologyLinkKey(info.path[k - 1], info.path[k]));
+    topologyHighlight = { path: new Set(info.path), pathLinks, downstream: new Set(info.downstream) };
+  }
+
+  function loadTopology() {
+    return fetch(TOPOLOGY_URL, { cache: 'no-cache' })
+      .then((r) => (r.ok ? r.json() : null))
+      .then((data) => {
+        topology = data && Array.isArray(data.nodes) ? data : null;
+        if (topology) topology.index = new Map(topology.nodes.map((id, i) => [id, i]));
+        updateTopologyHighlight();
+        deviceLayer.changed();
+        linkLayer.changed();
+        if (selectedFeature) showInspector(selectedFeature);
+      })
+      .catch(() => { topology = null; });
+  }
+
   function selectFeature(feature) {
     selectedFeature = feature;
+    updateTopologyHighlight();
     deviceLayer.changed();
     linkLayer.changed();
     clientLayer.changed();
     showInspector(feature);
     highlightListItem(feature);
+    if (feature?.get('device')) loadDeviceClients(feature);
+  }
+
+  // Tiled mode: client lists live in per-device files, fetched on first selection
+  function loadDeviceClients(feature) {
+    const dev = feature.get('device');
+    if (!tileIndex || !dev.clients_file || Array.isArray(dev.client_list)) return;
+    const generation = tileIndex.generation;
+    fetch(`tiles/${generation}/clients/${dev.clients_file}`)
+      .then((r) => {
+        if (r.status === 404) refreshTileIndex(generation);
+        if (!r.ok) throw new Error(`HTTP ${r.status}`);
+        return r.json();
+      })
+      .then((clientList) => {
+        if (tileIndex?.generation !== generation) return;
+        dev.client_list = clientList;
+        for (const data of [networkData, baseNetworkData]) {
+          const stored = (data?.[dev.source] || []).find((d) => d.id === dev.id);
+          if (stored) stored.client_list = clientList;
+        }
+        if (!(dev.source === 'uisp' ? dev.state === 'disconnected' : dev.state === 0)) {
+          renderClients(dev.id, feature.getGeometry().getCoordinates());
+        }
+        if (selectedFeature === feature) showInspector(feature);
+      })
+      .catch((err) => console.warn('Client list not available:', err.message));
   }
 
   function highlightListItem(feature) {
@@ -808,6 +1064,11 @@
         </div>
       ` : (hasClientData && dev.clients > 0 ? `<div class="clients-section"><div class="clients-header">Clients (${dev.clients})</div><p class="clients-hint">Run script to load details</p></div>` : '');
 
+      const topo = topologyInfo(dev.id);
+      const topologyHtml = topo ? `
+          <dt>Hops to gateway</dt><dd>${topo.hops >= 0 ? topo.hops : 'unreachable'}</dd>
+          <dt>Downstream</dt><dd>${topo.downstream.length} device${topo.downstream.length === 1 ? '' : 's'}</dd>` : '';
+
       content.innerHTML = `
         ${thumbHtml}
         <dl>
@@ -815,11 +1076,14 @@
           <dt>Model</dt><dd>${escapeHtml(dev.model || '-')}</dd>
           <dt>Type</dt><dd>${dev.type || '-'}</dd>
           <dt>State</dt><dd class="${isOnline ? 'state-online' : 'state-offline'}">${stateLabel}</dd>
+          ${dev.stale ? `<dt>Data</dt><dd class="state-offline">stale since ${new Date(dev.stale).toLocaleString()}</dd>` : ''}
           ${dev.ip ? `<dt>IP</dt><dd>${escapeHtml(dev.ip)}</dd>` : ''}
           ${dev.version ? `<dt>Firmware</dt><dd>${escapeHtml(dev.version)}</dd>` : ''}
           ${dev.uptime != null ? `<dt>Uptime</dt><dd>${fmtUptime(dev.uptime)}</dd>` : ''}
           ${(dev.tx_bytes != null || dev.rx_bytes != null) ? `<dt>Traffic</dt><dd>↑${fmtBytes(dev.tx_bytes) || '?'} ↓${fmtBytes(dev.rx_bytes) || '?'}</dd>` : ''}
+          ${(dev.tx_rate != null || dev.rx_rate != null) ? `<dt>Throughput</dt><dd>↑${fmtRate(dev.tx_rate)} ↓${fmtRate(dev.rx_rate)}</dd>` : ''}
           ${dev.clients != null ? `<dt>Clients</dt><dd>${dev.clients}</dd>` : ''}
+          ${topologyHtml}
           <dt>Coordinates</dt><dd>${(dev.lat != null && dev.lon != null) ? `${dev.lat.toFixed(5)}, ${dev.lon.toFixed(5)}` : '-'}</dd>
         </dl>
         ${clientsHtml}
@@ -840,6 +1104,14 @@
     }
   }
 
+  function fmtRate(bps) {
+    if (bps == null) return '?';
+    if (bps >= 1e9) return (bps / 1e9).toFixed(2) + ' GB/s';
+    if (bps >= 1e6) return (bps / 1e6).toFixed(1) + ' MB/s';
+    if (bps >= 1e3) return (bps / 1e3).toFixed(1) + ' KB/s';
+    return bps + ' B/s';
+  }
+
   function escapeHtml(s) {
     const div = document.createElement('div');
     div.textContent = s;
@@ -1159,9 +1431,10 @@
     }
   }
 
-  function updateTimelineLabel(ts) {
+  function updateTimelineLabel(ts, throughput) {
     const label = document.getElementById('timeline-ts');
     if (!label) return;
+    label.title = '';
     if (!ts) {
       label.textContent = 'Live';
       return;
@@ -1174,6 +1447,27 @@
     const day = dt.toLocaleDateString(undefined, { weekday: 'short' });
     const hm = dt.toLocaleTimeString(undefined, { hour: 'numeric', minute: '2-digit' }).replace(' ', '').toLowerCase();
     label.textContent = `${day} ${hm}`;
+    if (throughput && (throughput.totalTx != null || throughput.totalRx != null)) {
+      label.textContent += ` · ↑${fmtRate(throughput.totalTx)} ↓${fmtRate(throughput.totalRx)}`;
+      label.title = 'Busiest devices:\n' + throughput.top
+        .map(([i, bps]) => `${throughput.devices[i]?.id} ${fmtRate(bps)}`)
+        .join('\n');
+    }
+  }
+
+  // Per-frame throughput (bytes/s) from the timeline's rate block (throughput.py)
+  function attachThroughput(frames, block) {
+    if (!block || !Array.isArray(block.devices)) return;
+    frames.forEach((frame, f) => {
+      frame.throughput = {
+        devices: block.devices,
+        tx: block.tx_rate?.[f] || [],
+        rx: block.rx_rate?.[f] || [],
+        totalTx: block.total_tx_rate?.[f] ?? null,
+        totalRx: block.total_rx_rate?.[f] ?? null,
+        top: block.top?.[f] || [],
+      };
+    });
   }
 
   function applyTimelineFrame(idx) {
@@ -1184,11 +1478,22 @@
     timelineFrameIdx = idx;
     const slider = document.getElementById('timeline-slider');
     if (slider) slider.value = String(idx);
-    updateTimelineLabel(frame.ts);
+    updateTimelineLabel(frame.ts, frame.throughput);
 
     // Start from latest topology/coords, then overlay state metrics from frame
     networkData = deepClone(baseNetworkData);
     const devMap = new Map((frame.devices || []).map((d) => [d.id, d]));
+    const rates = new Map();
+    if (frame.throughput) {
+      const tp = frame.throughput;
+      tp.devices.forEach((d, i) => rates.set(d.id, [tp.tx[i], tp.rx[i]]));
+    }
+    const applyRates = (dev) => {
+      const rate = rates.get(dev.id);
+      if (!rate) return;
+      dev.tx_rate = rate[0];
+      dev.rx_rate = rate[1];
+    };
     const frameLinkMap = new Map((frame.links || []).map((l) => [linkKey(l), l]));
 
     for (const dev of (networkData.unifi || [])) {
@@ -1198,6 +1503,7 @@
       if (item.clients != null) dev.clients = item.clients;
       if (item.tx_bytes != null) dev.tx_bytes = item.tx_bytes;
       if (item.rx_bytes != null) dev.rx_bytes = item.rx_bytes;
+      applyRates(dev);
     }
     for (const dev of (networkData.uisp || [])) {
       const item = devMap.get(dev.id);
@@ -1206,6 +1512,7 @@
       if (item.clients != null) dev.clients = item.clients;
       if (item.tx_bytes != null) dev.tx_bytes = item.tx_bytes;
       if (item.rx_bytes != null) dev.rx_bytes = item.rx_bytes;
+      applyRates(dev);
     }
     for (const link of (networkData.links || [])) {
       const item = frameLinkMap.get(linkKey(link));
@@ -1274,14 +1581,12 @@
   }
 
   function loadTimeline() {
-    const url = TIMELINE_URLS[timelineRange] || TIMELINE_URLS['24h'];
-    return fetch(url)
-      .then((r) => {
-        if (!r.ok) throw new Error(`HTTP ${r.status}`);
-        return r.json();
-      })
-      .then((timeline) => {
-        timelineFrames = timeline?.frames || [];
+    const url = HISTORY_API_URL
+      ? `${HISTORY_API_URL}/history/frames?${TIMELINE_QUERIES[timelineRange] || TIMELINE_QUERIES['24h']}`
+      : TIMELINE_URLS[timelineRange] || TIMELINE_URLS['24h'];
+    return fetchTimelineFrames(url)
+      .then((frames) => {
+        timelineFrames = frames;
         const slider = document.getElementById('timeline-slider');
         if (slider) {
           slider.max = String(Math.max(0, timelineFrames.length - 1));
@@ -1311,26 +1616,187 @@
       });
   }
 
+  function lonLatToTile(lon, lat, z) {
+    const n = 2 ** z;
+    const rad = Math.max(Math.min(lat, 85.05112878), -85.05112878) * Math.PI / 180;
+    return [
+      ((lon + 180) / 360) * n,
+      ((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2) * n,
+    ];
+  }
+
+  // Tiles of the current generation covering the viewport, at the view zoom clamped to
+  // the published range (zooms past detail_zoom reuse the detail tiles)
+  function visibleTileKeys() {
+    const view = map.getView();
+    const z = Math.min(tileIndex.detail_zoom, Math.max(tileIndex.min_zoom, Math.round(view.getZoom())));
+    const extent = ol.proj.transformExtent(view.calculateExtent(map.getSize()), 'EPSG:3857', 'EPSG:4326');
+    const [x0, y0] = lonLatToTile(extent[0], extent[3], z);
+    const [x1, y1] = lonLatToTile(extent[2], extent[1], z);
+    const available = tileSets[z] || new Set();
+    const keys = [];
+    for (let x = Math.floor(x0); x <= Math.floor(x1); x++) {
+      for (let y = Math.floor(y0); y <= Math.floor(y1); y++) {
+        if (available.has(`${x}/${y}`)) keys.push(`${z}/${x}/${y}`);
+      }
+    }
+    return { z, keys };
+  }
+
+  // Add devices/links of a detail tile to networkData (and the timeline base) once
+  function mergeTileFeatures(features) {
+    let added = 0;
+    for (const f of features) {
+      const props = f.properties || {};
+      if (f.geometry?.type === 'Point' && props.id != null && !props.cluster) {
+        if (tileDeviceIds.has(props.id)) continue;
+        tileDeviceIds.add(props.id);
+        const { source, ...dev } = props;
+        const list = source === 'uisp' ? 'uisp' : 'unifi';
+        networkData[list].push({ ...dev });
+        baseNetworkData[list].push({ ...dev });
+        added++;
+      } else if (f.geometry?.type === 'LineString') {
+        const link = { ...props, coords: f.geometry.coordinates };
+        const key = linkKey(link);
+        if (tileLinkKeys.has(key)) continue;
+        tileLinkKeys.add(key);
+        networkData.links.push(link);
+        baseNetworkData.links.push({ ...link });
+        added++;
+      }
+    }
+    return added;
+  }
+
+  function fetchTile(key, detail) {
+    if (tileCache.has(key)) return Promise.resolve({ features: tileCache.get(key), added: 0 });
+    if (!pendingTiles.has(key)) {
+      const generation = tileIndex.generation;
+      pendingTiles.set(key, fetch(`tiles/${generation}/${key}.json`)
+        .then((r) => {
+          if (r.status === 404) refreshTileIndex(generation);
+          if (!r.ok) throw new Error(`HTTP ${r.status}`);
+          return r.json();
+        })
+        .then((collection) => {
+          const features = collection.features || [];
+          if (tileIndex?.generation !== generation) return { features: [], added: 0 };
+          tileCache.set(key, features);
+          return { features, added: detail ? mergeTileFeatures(features) : 0 };
+        })
+        .catch((err) => {
+          console.warn(`Tile ${key} not available:`, err.message);
+          return { features: [], added: 0 };
+        })
+        .finally(() => pendingTiles.delete(key)));
+    }
+    return pendingTiles.get(key);
+  }
+
+  function renderClusters(tiles) {
+    const source = clusterLayer.getSource();
+    source.clear();
+    for (const { features } of tiles) {
+      for (const f of features) {
+        const c = f.properties || {};
+        if (!c.cluster) continue;
+        const count = (filters.showUnifi ? c.unifi : 0) + (filters.showUisp ? c.uisp : 0);
+        if (count === 0) continue;
+        const feature = new ol.Feature({ geometry: new ol.geom.Point(ol.proj.fromLonLat(f.geometry.coordinates)) });
+        feature.set('cluster', { ...c, count });
+        source.addFeature(feature);
+      }
+    }
+  }
+
+  function loadVisibleTiles() {
+    if (!tileIndex || !map) return Promise.resolve();
+    const { z, keys } = visibleTileKeys();
+    const clustered = z < tileIndex.detail_zoom;
+    clusterLayer.setVisible(clustered);
+    [deviceLayer, linkLayer, clientLayer, clientLinkLayer].forEach((l) => l.setVisible(!clustered));
+    const generation = tileIndex.generation;
+    return Promise.all(keys.map((key) => fetchTile(key, !clustered))).then((tiles) => {
+      if (tileIndex?.generation !== generation) return;
+      if (clustered) {
+        renderClusters(tiles);
+      } else if (tiles.some((t) => t.added > 0)) {
+        renderDevices();
+        renderLinks();
+      }
+    });
+  }
+
+  function fetchTileIndex() {
+    return fetch(TILE_INDEX_URL, { cache: 'no-cache' })
+      .then((r) => (r.ok ? r.json() : null))
+      .then((index) => (index && index.generation && index.tiles ? index : null))
+      .catch(() => null);
+  }
+
+  // A 404 means the collector has removed this generation: re-read the index once
+  // (shared by every failing request) and switch to the new generation in place
+  let pendingTileIndex = null;
+  function refreshTileIndex(staleGeneration) {
+    if (tileIndex?.generation !== staleGeneration) return pendingTileIndex || Promise.resolve();
+    if (!pendingTileIndex) {
+      pendingTileIndex = fetchTileIndex()
+        .then((index) => {
+          if (index && tileIndex?.generation === staleGeneration && index.generation !== staleGeneration) {
+            return loadTiled(index, { keepView: true });
+          }
+        })
+        .finally(() => { pendingTileIndex = null; });
+    }
+    return pendingTileIndex;
+  }
+
+  // Switch to (or refresh) tiled mode: start empty and let the viewport pull tiles
+  function loadTiled(index, { keepView = false } = {}) {
+    if (tileIndex && networkData && index.generation === tileIndex.generation) return loadTimeline();
+    const selectedId = keepView ? selectedFeature?.get('device')?.id : undefined;
+    tileIndex = index;
+    tileSets = {};
+    for (const [z, keys] of Object.entries(index.tiles)) tileSets[z] = new Set(keys);
+    tileCache.clear();
+    pendingTiles.clear();
+    tileDeviceIds.clear();
+    tileLinkKeys.clear();
+    networkData = { unifi: [], uisp: [], links: [], map_metadata: index.map_metadata || {} };
+    networkDataHash = null;
+    baseNetworkData = deepClone(networkData);
+    stopTimelinePlayback();
+    renderDevices();
+    renderLinks();
+    if (!keepView) fitMapToData();
+    selectFeature(null);
+    return loadVisibleTiles().then(() => {
+      const feature = selectedId !== undefined && deviceFeatures.get(selectedId);
+      if (feature) selectFeature(feature);
+      return loadTimeline();
+    });
+  }
+
+  // Content hash of network_data.json from the collector's manifest (null if unavailable)
+  function fetchDataHash() {
+    return fetch(MANIFEST_URL, { cache: 'no-cache' })
+      .then((r) => (r.ok ? r.json() : null))
+      .then((manifest) => {
+        const entry = manifest && manifest.files && manifest.files[DATA_URL];
+        return entry ? entry.sha256 : null;
+      })
+      .catch(() => null);
+  }
+
   function loadData() {
     const btn = document.getElementById('refresh-btn');
     btn.disabled = true;
     btn.textContent = 'Loading…';
 
-    fetch(DATA_URL)
-      .then((r) => {
-        if (!r.ok) throw new Error(`HTTP ${r.status}`);
-        return r.json();
-      })
-      .then((data) => {
-        networkData = data;
-        baseNetworkData = deepClone(data);
-        stopTimelinePlayback();
-        renderDevices();
-        renderLinks();
-        fitMapToData();
-        selectFeature(null);
-        return loadTimeline();
-      })
+    loadTopology();
+    fetchTileIndex()
+      .then((index) => (index ? loadTiled(index) : loadFullData()))
       .catch((err) => {
         console.error('Failed to load network data:', err);
         alert('Could not load network_data.json. Run the collector first or check the file path.');
@@ -1341,6 +1807,35 @@
       });
   }
 
+  function loadFullData() {
+    if (tileIndex) networkDataHash = null; // networkData holds tiles, not this file
+    tileIndex = null;
+    clusterLayer.setVisible(false);
+    [deviceLayer, linkLayer, clientLayer, clientLinkLayer].forEach((l) => l.setVisible(true));
+    return fetchDataHash()
+      .then((hash) => {
+        // Unchanged since the last load: keep the current view, only refresh history
+        if (hash && hash === networkDataHash && networkData) return loadTimeline();
+        const url = hash ? `${DATA_URL}?v=${hash.slice(0, 16)}` : DATA_URL;
+        return fetch(url)
+          .then((r) => {
+            if (!r.ok) throw new Error(`HTTP ${r.status}`);
+            return r.json();
+          })
+          .then((data) => {
+            networkData = data;
+            networkDataHash = hash;
+            baseNetworkData = deepClone(data);
+            stopTimelinePlayback();
+            renderDevices();
+            renderLinks();
+            fitMapToData();
+            selectFeature(null);
+            return loadTimeline();
+          });
+      });
+  }
+
   function run() {
     initMap();
     loadData();
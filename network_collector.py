@@ -4,16 +4,50 @@ Aggregates device and link data from UniFi Network and UISP (Ubiquiti) APIs.
 Outputs JSON and TSV for the interactive map visualization.
 """
 
+import argparse
+import codecs
+import cProfile
+import gzip
 import json
+import hashlib
 import os
+import pickle
+import pstats
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
 import urllib3
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from client_presence import ClientPresenceStore
+from collector_metrics import CycleMetrics, WriteRate, append_jsonl, prometheus_text
+from spatial_tiles import TILES_DIR, write_tiles
+from throughput import THROUGHPUT_TOP_N, ThroughputSeries, throughput_block
+from topology import TopologyGraph
+
+try:
+    import brotli
+except ImportError:  # optional: .br siblings are skipped without it
+    brotli = None
+
+try:
+    import numpy as np
+except ImportError:  # optional: median_select falls back to a sort
+    np = None
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 load_dotenv()
 
+NETWORK_DATA = "network_data.json"
+# Content hashes of the published files; the map polls this instead of the full payload
+NETWORK_DATA_MANIFEST = "network_data.manifest.json"
+# Paths to the gateway and failure impact per device, for map highlighting (topology.py)
+TOPOLOGY_FILE = "topology.json"
 UNIFI_POSITION_LOOKUP = "unifi_position_lookup.json"
 UISP_POSITION_LOOKUP = "uisp_position_lookup.json"
 HISTORY_DIR = "history"
@@ -21,12 +55,111 @@ SNAPSHOT_LOG = os.path.join(HISTORY_DIR, "network_snapshots.jsonl")
 TIMELINE_24H = os.path.join(HISTORY_DIR, "timeline_24h.json")
 TIMELINE_7D = os.path.join(HISTORY_DIR, "timeline_7d.json")
 TIMELINE_30D = os.path.join(HISTORY_DIR, "timeline_30d.json")
+# "jsonl" (append-only snapshot log) or "sqlite" (history_store.py with rollups + retention)
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "jsonl").lower()
+HISTORY_DB = os.path.join(HISTORY_DIR, "network_history.sqlite")
+HISTORY_RAW_RETENTION_DAYS = float(os.getenv("HISTORY_RAW_RETENTION_DAYS", "7"))
+HISTORY_ROLLUP_RETENTION_DAYS = float(os.getenv("HISTORY_ROLLUP_RETENTION_DAYS", "400"))
+# Delta encoding: a full keyframe every N frames, only changed devices/links in between
+SNAPSHOT_KEYFRAME_INTERVAL = int(os.getenv("SNAPSHOT_KEYFRAME_INTERVAL", "12"))
+# Identical frames in a row share one "unchanged" record of at most this many frames
+SNAPSHOT_SAME_RUN_MAX = int(os.getenv("SNAPSHOT_SAME_RUN_MAX", "720"))
+# Set to 0 when the map reads history from history_server.py instead of the timeline files
+TIMELINE_FILES = os.getenv("TIMELINE_FILES", "1").lower() not in ("0", "false", "no")
+# Change detection: an output whose content differs only in these fields (and
+# "generated_at") is not rewritten, for at most CHANGE_MAX_SKIP_SECONDS in a row
+CHANGE_IGNORE_FIELDS = tuple(
+    f.strip() for f in os.getenv("CHANGE_IGNORE_FIELDS", "uptime").split(",") if f.strip()
+)
+CHANGE_MAX_SKIP_SECONDS = float(os.getenv("CHANGE_MAX_SKIP_SECONDS", "3600"))
+# Extra gateway ids for the topology, comma-separated, when no device type marks them
+TOPOLOGY_GATEWAYS = tuple(g.strip() for g in os.getenv("TOPOLOGY_GATEWAYS", "").split(",") if g.strip())
+# Per-client presence (AP + signal per bucket) for the 30-day client history (client_presence.py)
+CLIENT_PRESENCE = os.getenv("CLIENT_PRESENCE", "1").lower() not in ("0", "false", "no")
+CLIENT_PRESENCE_LOG = os.path.join(HISTORY_DIR, "client_presence.bin")
+PRESENCE_BUCKET_MINUTES = int(os.getenv("PRESENCE_BUCKET_MINUTES", "10"))
+PRESENCE_RETENTION_DAYS = float(os.getenv("PRESENCE_RETENTION_DAYS", "30"))
+# (path, range_hours, bucket_minutes) for every timeline the map can load
+TIMELINE_RANGES = (
+    (TIMELINE_24H, 24, 10),
+    (TIMELINE_7D, 24 * 7, 60),
+    (TIMELINE_30D, 24 * 30, 180),
+)
+# Buckets per timeline segment file (history/timeline_7d/<n>.json); a cycle only
+# re-encodes the segments whose buckets changed. Fewer, larger segments compress better
+# (each repeats its device/link tables); 24h needs 8-hour segments to beat one file under br
+TIMELINE_SEGMENT_BUCKETS = {
+    TIMELINE_24H: 48,
+    TIMELINE_7D: 24,
+    TIMELINE_30D: 24,
+}
+# Quality 11 (the brotli default) is too slow to run every cycle on multi-MB payloads
+BROTLI_QUALITY = 9
+TIMELINE_DEVICE_METRICS = ("state", "clients", "tx_bytes", "rx_bytes")
+TIMELINE_LINK_METRICS = ("state", "signal")
+
+# Keep-alive connections per controller session; covers every endpoint fetched concurrently
+HTTP_POOL_SIZE = 4
+# Remembered working endpoint paths and smoothed latencies, per controller/site
+ENDPOINT_CACHE = os.path.join(HISTORY_DIR, "endpoint_cache.json")
+HTTP_TIMEOUT = 15
+HTTP_MIN_TIMEOUT = 3
+# Last good payload of every fetch source, so a source that is down when the collector
+# starts still shows its earlier data (marked stale); saved at most every N seconds
+LAST_GOOD_CACHE = os.path.join(HISTORY_DIR, "last_good.pickle")
+LAST_GOOD_SAVE_SECONDS = float(os.getenv("LAST_GOOD_SAVE_SECONDS", "300"))
+# Parsed responses for slow-changing UISP endpoints, reused until their TTL expires
+RESPONSE_CACHE_DIR = os.path.join(HISTORY_DIR, "response_cache")
+UISP_CACHE_TTLS = {
+    "sites": float(os.getenv("UISP_SITES_TTL_SECONDS", "1800")),
+    "datalinks": float(os.getenv("UISP_DATALINKS_TTL_SECONDS", "600")),
+}
+# Read size for streamed response bodies (large UniFi client lists)
+STREAM_CHUNK_SIZE = 64 * 1024
+# Adaptive timeout = factor x smoothed latency, clamped to [HTTP_MIN_TIMEOUT, HTTP_TIMEOUT]
+HTTP_TIMEOUT_LATENCY_FACTOR = 5
+# Bound on the fetch stage of a cycle: requests are cut off when it passes, and sources
+# without an answer by then fall back to their last good payload (devices marked stale).
+# 0 turns the deadline off
+CYCLE_DEADLINE_SECONDS = float(os.getenv("CYCLE_DEADLINE_SECONDS", "20"))
+# Circuit breaker per endpoint: after BREAKER_FAILURES failures in a row it is skipped
+# for BREAKER_BASE_SECONDS, doubling with every further failure up to BREAKER_MAX_SECONDS
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_BASE_SECONDS = float(os.getenv("BREAKER_BASE_SECONDS", "30"))
+BREAKER_MAX_SECONDS = float(os.getenv("BREAKER_MAX_SECONDS", "900"))
+FETCH_KEYS = ("unifi_devices", "unifi_clients", "uisp_devices", "uisp_sites", "uisp_links")
+# Controllers/sites to collect from (see controllers.example.json); without this file
+# the single UNIFI_* / UISP_* environment setup is used and IDs are not namespaced
+CONTROLLERS_FILE = os.getenv("CONTROLLERS_FILE", "controllers.json")
+# Upper bound on concurrent endpoint fetches across all controllers
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "16"))
+# Tiered polling in daemon mode: data class -> (FETCH_KEYS it covers, seconds between
+# fetches). The daemon ticks at the fastest tier; between "topology" fetches the last
+# formatted payload is reused and only its fast-changing fields are patched.
+TIERED_POLLING = os.getenv("TIERED_POLLING", "0").lower() not in ("0", "false", "no")
+POLL_TIERS = {
+    "stats": (("unifi_devices", "uisp_devices"), float(os.getenv("POLL_STATS_SECONDS", "30"))),
+    "clients": (("unifi_clients",), float(os.getenv("POLL_CLIENTS_SECONDS", "120"))),
+    "topology": (("uisp_sites", "uisp_links"), float(os.getenv("POLL_TOPOLOGY_SECONDS", "1800"))),
+}
+# Per-cycle metrics: JSONL log (rotated to .1 past the size limit) and a Prometheus
+# textfile, e.g. point METRICS_TEXTFILE into node_exporter's --collector.textfile.directory
+METRICS_LOG = os.getenv("METRICS_LOG", os.path.join(HISTORY_DIR, "collector_metrics.jsonl"))
+METRICS_LOG_MAX_BYTES = 5 * 1024 * 1024
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", os.path.join(HISTORY_DIR, "collector_metrics.prom"))
+
+# Replaced at the start of every run_cycle; collectors record into whichever is current
+_cycle_metrics = CycleMetrics()
 
 
 def iso_utc_now():
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
+def iso_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
 def parse_iso_utc(value):
     if not value:
         return None
@@ -37,7 +170,10 @@ def parse_iso_utc(value):
 
 
 def build_snapshot(data):
-    """Build compact snapshot frame for timeline playback."""
+    """
+    Build compact snapshot frame for timeline playback. Stale devices keep their last
+    known state but no byte counters, so no throughput rate is derived from old values.
+    """
     frame = {
         "ts": iso_utc_now(),
         "devices": [],
@@ -50,8 +186,8 @@ def build_snapshot(data):
                 "source": "unifi",
                 "state": dev.get("state"),
                 "clients": dev.get("clients", 0),
-                "tx_bytes": dev.get("tx_bytes"),
-                "rx_bytes": dev.get("rx_bytes"),
+                "tx_bytes": None if dev.get("stale") else dev.get("tx_bytes"),
+                "rx_bytes": None if dev.get("stale") else dev.get("rx_bytes"),
             }
         )
     for dev in data.get("uisp", []):
@@ -61,8 +197,8 @@ def build_snapshot(data):
                 "source": "uisp",
                 "state": dev.get("state"),
                 "clients": dev.get("clients", 0),
-                "tx_bytes": dev.get("tx_bytes"),
-                "rx_bytes": dev.get("rx_bytes"),
+                "tx_bytes": None if dev.get("stale") else dev.get("tx_bytes"),
+                "rx_bytes": None if dev.get("stale") else dev.get("rx_bytes"),
             }
         )
     for link in data.get("links", []):
@@ -78,31 +214,517 @@ def build_snapshot(data):
     return frame
 
 
+def _key_part(value):
+    return "" if value is None else str(value)
+
+
+def device_frame_key(dev):
+    """Identity of a device inside a frame (delta records, columnar tables)."""
+    return f"{_key_part(dev.get('source'))}:{_key_part(dev.get('id'))}"
+
+
+def link_frame_key(link):
+    """Identity of a link inside a frame (delta records, columnar tables)."""
+    return f"{_key_part(link.get('from'))}::{_key_part(link.get('to'))}::{link.get('type') or ''}"
+
+
+def encode_frame(frame, prev=None):
+    """
+    Encode a frame relative to the previous one. Without `prev` a keyframe is produced;
+    otherwise a delta holding only changed/added devices and links plus removed keys.
+    """
+    if prev is None:
+        return {"kind": "key", **frame}
+    delta = {"kind": "delta", "ts": frame.get("ts")}
+    for field, key_fn, removed_field in (
+        ("devices", device_frame_key, "removed_devices"),
+        ("links", link_frame_key, "removed_links"),
+    ):
+        before = {key_fn(item): item for item in prev.get(field, [])}
+        current = {key_fn(item): item for item in frame.get(field, [])}
+        changed = [item for key, item in current.items() if before.get(key) != item]
+        removed = [key for key in before if key not in current]
+        if changed:
+            delta[field] = changed
+        if removed:
+            delta[removed_field] = removed
+    return delta
+
+
+def encode_frames(frames, keyframe_interval):
+    """Delta-encode a frame sequence with a keyframe every `keyframe_interval` frames."""
+    encoded = []
+    prev = None
+    for i, frame in enumerate(frames):
+        keyframe = prev is None or i % keyframe_interval == 0
+        encoded.append(encode_frame(frame, None if keyframe else prev))
+        prev = frame
+    return encoded
+
+
+def frames_equal(a, b):
+    """Same devices and links, whatever the timestamps."""
+    return a.get("devices") == b.get("devices") and a.get("links") == b.get("links")
+
+
+def unchanged_timestamps(rec):
+    """
+    Timestamps of the frames folded into an "unchanged until" record
+    ({"kind": "same", "ts": first, "until": last, "count": n, "steps_us": [...]}),
+    rebuilt from the microseconds between consecutive frames. A record whose steps
+    do not add up stands for its first and last frame only.
+    """
+    first, last = rec.get("ts"), rec.get("until")
+    steps = rec.get("steps_us")
+    start = parse_iso_utc(first)
+    if not steps or start is None or last == first:
+        return [first]
+    try:
+        elapsed = [0]
+        for step in steps:
+            elapsed.append(elapsed[-1] + int(step))
+    except (TypeError, ValueError):
+        return [first, last]
+    if start + timedelta(microseconds=elapsed[-1]) != parse_iso_utc(last):
+        return [first, last]
+    middle = [(start + timedelta(microseconds=us)).isoformat().replace("+00:00", "Z") for us in elapsed[1:-1]]
+    return [first] + middle + [last]
+
+
+def decode_frames(records):
+    """
+    Yield full frames from keyframe/delta records. Records without "kind" (legacy
+    snapshot lines) are keyframes; deltas before the first keyframe are skipped.
+    An "unchanged until" record repeats the previous frame at each of its timestamps.
+    """
+    devices = links = None
+    for rec in records:
+        kind = rec.get("kind", "key")
+        if kind == "key":
+            devices = {device_frame_key(d): d for d in rec.get("devices", [])}
+            links = {link_frame_key(l): l for l in rec.get("links", [])}
+        elif kind == "delta" and devices is not None:
+            devices = dict(devices)
+            links = dict(links)
+            for key in rec.get("removed_devices", []):
+                devices.pop(key, None)
+            for dev in rec.get("devices", []):
+                devices[device_frame_key(dev)] = dev
+            for key in rec.get("removed_links", []):
+                links.pop(key, None)
+            for link in rec.get("links", []):
+                links[link_frame_key(link)] = link
+        elif kind == "same" and devices is not None:
+            for ts in unchanged_timestamps(rec):
+                yield {"ts": ts, "devices": list(devices.values()), "links": list(links.values())}
+            continue
+        else:
+            continue
+        yield {"ts": rec.get("ts"), "devices": list(devices.values()), "links": list(links.values())}
+
+
+def encode_columnar(frames):
+    """
+    Columnar timeline body: device/link index tables shared by all frames, then one
+    array per metric indexed [frame][entity]. An entity absent from a frame has null
+    in every metric; decodeTimelineFrames in map.js reverses this.
+    """
+    device_index, devices = {}, []
+    link_index, links = {}, []
+    for frame in frames:
+        for dev in frame.get("devices", []):
+            key = device_frame_key(dev)
+            if key not in device_index:
+                device_index[key] = len(devices)
+                devices.append({"id": dev.get("id"), "source": dev.get("source")})
+        for link in frame.get("links", []):
+            key = link_frame_key(link)
+            if key not in link_index:
+                link_index[key] = len(links)
+                links.append({"from": link.get("from"), "to": link.get("to"), "type": link.get("type")})
+
+    device_metrics = {m: [] for m in TIMELINE_DEVICE_METRICS}
+    link_metrics = {m: [] for m in TIMELINE_LINK_METRICS}
+    for frame in frames:
+        rows = {m: [None] * len(devices) for m in TIMELINE_DEVICE_METRICS}
+        for dev in frame.get("devices", []):
+            i = device_index[device_frame_key(dev)]
+            for m in TIMELINE_DEVICE_METRICS:
+                rows[m][i] = dev.get(m)
+        for m in TIMELINE_DEVICE_METRICS:
+            device_metrics[m].append(rows[m])
+        rows = {m: [None] * len(links) for m in TIMELINE_LINK_METRICS}
+        for link in frame.get("links", []):
+            i = link_index[link_frame_key(link)]
+            for m in TIMELINE_LINK_METRICS:
+                rows[m][i] = link.get(m)
+        for m in TIMELINE_LINK_METRICS:
+            link_metrics[m].append(rows[m])
+
+    return {
+        "ts": [frame.get("ts") for frame in frames],
+        "devices": devices,
+        "links": links,
+        "device_metrics": device_metrics,
+        "link_metrics": link_metrics,
+    }
+
+
+def decode_columnar(payload):
+    """Full frames from a columnar timeline body (entities with all-null metrics are omitted)."""
+    frames = []
+    devices = payload.get("devices") or []
+    links = payload.get("links") or []
+    device_metrics = payload.get("device_metrics") or {}
+    link_metrics = payload.get("link_metrics") or {}
+    for f, ts in enumerate(payload.get("ts") or []):
+        frame = {"ts": ts, "devices": [], "links": []}
+        for entities, metrics, out in (
+            (devices, device_metrics, frame["devices"]),
+            (links, link_metrics, frame["links"]),
+        ):
+            names = list(metrics)
+            for entity, values in zip(entities, zip(*(metrics[m][f] for m in names))):
+                if any(v is not None for v in values):
+                    item = dict(entity)
+                    item.update(zip(names, values))
+                    out.append(item)
+        frames.append(frame)
+    return frames
+
+
+def decode_timeline_frames(payload):
+    """Full frames from a timeline body: columnar, or a plain list of frames (older files)."""
+    if payload.get("encoding") == "columnar":
+        return decode_columnar(payload)
+    return payload.get("frames") or []
+
+
+def timeline_body(frames, throughput):
+    """Columnar timeline body for `frames` with their throughput block."""
+    body = {"encoding": "columnar"}
+    body.update(encode_columnar(frames))
+    body["throughput"] = throughput
+    return body
+
+
+def timeline_segment_dir(path):
+    """Directory of a timeline's segment files: history/timeline_7d.json -> history/timeline_7d."""
+    return os.path.splitext(path)[0]
+
+
+def load_timeline(path):
+    """
+    (index, {segment key: frames}) for a timeline file and the segment files it lists,
+    with frames older than the index "start" dropped; a single-file timeline comes back
+    as one None segment. (None, None) when a file is missing or unreadable.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("encoding") != "segments":
+            return payload, {None: decode_timeline_frames(payload)}
+        start = payload.get("start") or ""
+        segments = {}
+        for name in payload.get("segments") or []:
+            with open(os.path.join(os.path.dirname(path), name), encoding="utf-8") as f:
+                frames = decode_timeline_frames(json.load(f))
+            key = int(os.path.splitext(os.path.basename(name))[0])
+            segments[key] = [frame for frame in frames if (frame.get("ts") or "") >= start]
+        return payload, segments
+    except (OSError, ValueError, AttributeError):
+        return None, None
+
+
+def replace_file(path, body):
+    """Write bytes to a temp file next to `path` and rename it into place (not recorded)."""
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def write_atomic(path, body):
+    """replace_file, recorded in the cycle metrics."""
+    start = time.perf_counter()
+    replace_file(path, body)
+    _cycle_metrics.record_file(path, len(body), time.perf_counter() - start)
+
+
+def write_tile_tree(data):
+    """
+    write_tiles with one aggregate metrics entry for TILES_DIR (files, bytes, seconds):
+    tile paths contain the generation, so per-file entries would be new series every cycle.
+    """
+    written = [0, 0]
+
+    def write(path, body):
+        replace_file(path, body)
+        written[0] += 1
+        written[1] += len(body)
+
+    start = time.perf_counter()
+    tiles = write_tiles(data, write=write)
+    _cycle_metrics.record_file(TILES_DIR, written[1], time.perf_counter() - start, files=written[0])
+    return tiles
+
+
+def write_precompressed(path, body):
+    """
+    Write .gz (and .br when brotli is installed) siblings for a static file body.
+    Call after `path` itself is in place: the web server only serves siblings at
+    least as new as the file. Returns {suffix: compressed size}.
+    """
+    sizes = {}
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    write_atomic(path + ".gz", gz)
+    sizes[".gz"] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(body, quality=BROTLI_QUALITY)
+        write_atomic(path + ".br", br)
+        sizes[".br"] = len(br)
+    return sizes
+
+
+_VOLATILE_RE = re.compile(
+    rb'"('
+    + b"|".join(re.escape(f.encode("utf-8")) for f in ("generated_at",) + CHANGE_IGNORE_FIELDS)
+    + rb')":(?:"(?:[^"\\]|\\.)*"|[-+0-9.eE]+|null|true|false)'
+)
+
+# path -> {"digest", "at", "sha256", "bytes", "siblings"} for the body last written there
+_written_content = {}
+
+
+def content_digest(body):
+    """sha256 of a JSON body with the CHANGE_IGNORE_FIELDS and generated_at values blanked."""
+    return hashlib.sha256(_VOLATILE_RE.sub(rb'"\1":_', body)).hexdigest()
+
+
+def _seed_written_content(path):
+    """Digest of what is already on disk, so the first cycle after a restart can skip too."""
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+        at = os.path.getmtime(path)
+    except OSError:
+        return None
+    siblings = {}
+    for suffix in (".gz", ".br"):
+        try:
+            if os.path.getmtime(path + suffix) >= at:
+                siblings[suffix] = os.path.getsize(path + suffix)
+        except OSError:
+            pass
+    _written_content[path] = {
+        "digest": content_digest(body),
+        "at": at,
+        "sha256": hashlib.sha256(body).hexdigest(),
+        "bytes": len(body),
+        "siblings": siblings,
+    }
+    return _written_content[path]
+
+
+def write_if_changed(path, body, siblings=False):
+    """
+    write_atomic (plus write_precompressed when `siblings`) unless `path` already holds
+    the same content per content_digest and was written less than
+    CHANGE_MAX_SKIP_SECONDS ago. Skips are recorded in the cycle metrics with the
+    size they would have cost. Returns True when written.
+    """
+    digest = content_digest(body)
+    last = _written_content.get(path) or _seed_written_content(path)
+    now = time.time()
+    if (
+        last
+        and last["digest"] == digest
+        and now - last["at"] < CHANGE_MAX_SKIP_SECONDS
+        and (not siblings or ".gz" in last["siblings"])
+    ):
+        _cycle_metrics.record_skip(path, len(body))
+        for suffix, size in last["siblings"].items():
+            _cycle_metrics.record_skip(path + suffix, size)
+        return False
+    write_atomic(path, body)
+    _written_content[path] = {
+        "digest": digest,
+        "at": now,
+        "sha256": hashlib.sha256(body).hexdigest(),
+        "bytes": len(body),
+        "siblings": write_precompressed(path, body) if siblings else {},
+    }
+    return True
+
+
+def publish_json(path, payload, manifest_path=None):
+    """
+    Serialize `payload` once as compact JSON, swap it in atomically, refresh the
+    precompressed siblings and (optionally) a manifest with the content hash.
+    Nothing is written when the content is unchanged (see write_if_changed).
+    Returns the manifest entry, with "skipped": True when nothing was written.
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    written = write_if_changed(path, body, siblings=True)
+    current = _written_content[path]
+    entry = {
+        "sha256": current["sha256"],
+        "bytes": current["bytes"],
+        "gzip_bytes": current["siblings"].get(".gz"),
+        "br_bytes": current["siblings"].get(".br"),
+    }
+    if not written:
+        return {**entry, "skipped": True}
+    if manifest_path:
+        manifest = {"generated_at": iso_utc_now(), "files": {os.path.basename(path): entry}}
+        write_atomic(manifest_path, json.dumps(manifest, separators=(",", ":")).encode("utf-8"))
+    return entry
+
+
+def _read_log_tail(path, max_lines):
+    """Parse up to the last `max_lines` records of a JSONL file without reading all of it."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > 0 and data.count(b"\n") <= max_lines:
+                step = min(64 * 1024, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    lines = data.split(b"\n")
+    if pos > 0:
+        lines = lines[1:]  # first line is partial
+    records = []
+    for line in lines[-(max_lines + 1):]:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return records
+
+
+# Last frame written, deltas since its keyframe and the open "unchanged until" record
+# (with its byte offset) if the log ends in one; recovered from the log tail on first append
+_snapshot_log_state = None
+
+
+def _recover_snapshot_log_state():
+    records = _read_log_tail(SNAPSHOT_LOG, SNAPSHOT_KEYFRAME_INTERVAL * 2)
+    key_idx = None
+    for i, rec in enumerate(records):
+        if rec.get("kind", "key") == "key":
+            key_idx = i
+    if key_idx is None:
+        return {"prev": None, "since_key": 0, "same": None, "same_offset": None}
+    frames = list(decode_frames(records[key_idx:]))
+    state = {
+        "prev": frames[-1],
+        "since_key": sum(1 for rec in records[key_idx + 1:] if rec.get("kind") == "delta"),
+        "same": None,
+        "same_offset": None,
+    }
+    last = records[-1]
+    if last.get("kind") == "same" and isinstance(last.get("steps_us"), list):
+        # Keep extending the run only if the last line is exactly what we would have written
+        line = (json.dumps(last, ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            size = os.path.getsize(SNAPSHOT_LOG)
+            with open(SNAPSHOT_LOG, "rb") as f:
+                f.seek(max(size - len(line), 0))
+                if f.read() == line:
+                    state["same"], state["same_offset"] = last, size - len(line)
+        except OSError:
+            pass
+    return state
+
+
+def _write_unchanged_record(state, ts):
+    """
+    Start or extend the "unchanged until" record at the end of the snapshot log, in
+    place. The record keeps the step to every frame it folds in, so a gap in the
+    cycles (an outage) stays a gap when the run is expanded again.
+    """
+    same = state["same"]
+    last, current = parse_iso_utc(same["until"]) if same else None, parse_iso_utc(ts)
+    if same is None or same["count"] >= SNAPSHOT_SAME_RUN_MAX or last is None or current is None:
+        # A full run is not rewritten any further: the next frame starts a new one
+        state["same_offset"] = None
+        same = {"kind": "same", "ts": ts, "until": ts, "count": 1, "steps_us": []}
+    else:
+        step = (current - last) // timedelta(microseconds=1)
+        same = {**same, "until": ts, "count": same["count"] + 1, "steps_us": same["steps_us"] + [step]}
+    line = (json.dumps(same, ensure_ascii=False) + "\n").encode("utf-8")
+    start = time.perf_counter()
+    with open(SNAPSHOT_LOG, "r+b" if os.path.exists(SNAPSHOT_LOG) else "wb") as f:
+        end = f.seek(0, os.SEEK_END)
+        offset = state["same_offset"]
+        if offset is None or offset > end:
+            offset = end
+        f.seek(offset)
+        f.write(line)
+        f.truncate()
+    _cycle_metrics.record_file(SNAPSHOT_LOG, len(line), time.perf_counter() - start)
+    state["same"], state["same_offset"] = same, offset
+
+
 def append_snapshot(frame):
+    """
+    Append a frame to the snapshot log as a keyframe or a delta against the last frame.
+    A run of identical frames is kept as one "unchanged until" record, rewritten in
+    place as the run grows.
+    """
+    global _snapshot_log_state
     os.makedirs(HISTORY_DIR, exist_ok=True)
+    if _snapshot_log_state is None:
+        _snapshot_log_state = _recover_snapshot_log_state()
+    state = _snapshot_log_state
+    if state["prev"] is not None and frames_equal(frame, state["prev"]):
+        _write_unchanged_record(state, frame.get("ts"))
+        state["prev"] = frame
+        return
+    state["same"] = state["same_offset"] = None
+    keyframe = state["prev"] is None or state["since_key"] + 1 >= SNAPSHOT_KEYFRAME_INTERVAL
+    record = encode_frame(frame, None if keyframe else state["prev"])
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    start = time.perf_counter()
     with open(SNAPSHOT_LOG, "a", encoding="utf-8") as f:
-        f.write(json.dumps(frame, ensure_ascii=False) + "\n")
+        f.write(line)
+    _cycle_metrics.record_file(SNAPSHOT_LOG, len(line.encode("utf-8")), time.perf_counter() - start)
+    state["prev"] = frame
+    state["since_key"] = 0 if keyframe else state["since_key"] + 1
 
 
-def load_recent_snapshots(hours=24):
-    if not os.path.exists(SNAPSHOT_LOG):
-        return []
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
-    snapshots = []
-    with open(SNAPSHOT_LOG, encoding="utf-8") as f:
+def iter_snapshot_log(path=SNAPSHOT_LOG):
+    """Yield frames from a snapshot log in file order, skipping unreadable lines."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
             try:
-                item = json.loads(line)
+                yield json.loads(line)
             except json.JSONDecodeError:
                 continue
-            ts = parse_iso_utc(item.get("ts"))
-            if ts is None:
-                continue
-            if ts >= cutoff:
-                snapshots.append(item)
+
+
+def load_recent_snapshots(hours=24):
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+    snapshots = []
+    for item in decode_frames(iter_snapshot_log()):
+        ts = parse_iso_utc(item.get("ts"))
+        if ts is None:
+            continue
+        if ts >= cutoff:
+            snapshots.append(item)
     snapshots.sort(key=lambda x: x.get("ts", ""))
     return snapshots
 
@@ -124,19 +746,255 @@ def bucket_snapshots(snapshots, bucket_minutes):
     return [bucketed[k] for k in sorted(bucketed.keys())]
 
 
+def history_timeline_frames(hours, bucket_minutes):
+    """Latest frame per bucket over the last `hours`, from the configured history backend."""
+    if HISTORY_BACKEND == "sqlite":
+        return get_history_store().rollup_frames(bucket_minutes, hours)
+    return bucket_snapshots(load_recent_snapshots(hours=hours), bucket_minutes=bucket_minutes)
+
+
+def write_timeline_payload(path, hours, bucket_minutes, frames):
+    """
+    Write bucketed frames as a timeline for the map: the segment files plus the index
+    at `path` (see TimelineBuilder). Unchanged segment files are not rewritten.
+    Returns the frame count.
+    """
+    builder = TimelineBuilder(path, hours, bucket_minutes)
+    builder.reset(frames)
+    return builder.write()
+
+
 def write_timeline(path, hours, bucket_minutes):
-    snapshots = load_recent_snapshots(hours=hours)
-    frames = bucket_snapshots(snapshots, bucket_minutes=bucket_minutes)
-    os.makedirs(HISTORY_DIR, exist_ok=True)
-    payload = {
-        "generated_at": iso_utc_now(),
-        "range_hours": hours,
-        "bucket_minutes": bucket_minutes,
-        "frames": frames,
-    }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
-    return len(frames)
+    return write_timeline_payload(path, hours, bucket_minutes, history_timeline_frames(hours, bucket_minutes))
+
+
+class TimelineBuilder:
+    """
+    Incrementally maintained timeline for one range, with bucket_snapshots semantics:
+    the latest frame per bucket, limited to the last `hours`. State is seeded once
+    from the existing timeline files (bounded by the window), so each new frame costs
+    the same no matter how large the history has grown.
+
+    On disk a timeline is an index (`path`) listing one columnar segment file per
+    TIMELINE_SEGMENT_BUCKETS[path] buckets, each with its own throughput block. A write only
+    encodes and compresses the segments that gained or replaced a bucket, normally
+    just the newest one. Segments that only lost expired buckets are left as they are
+    (readers drop frames before the index "start"); those past the window are deleted.
+    """
+
+    def __init__(self, path, hours, bucket_minutes):
+        self.path = path
+        self.hours = hours
+        self.bucket_minutes = bucket_minutes
+        self.segment_dir = timeline_segment_dir(path)
+        self.segment_buckets = TIMELINE_SEGMENT_BUCKETS.get(path, 24)
+        self.buckets = None  # bucket_key -> frame
+        self.written = {}  # segment key -> {bucket_key: frame} as last written
+        self.throughput = ThroughputSeries(top_n=THROUGHPUT_TOP_N)
+
+    def _bucket_key(self, frame):
+        ts = parse_iso_utc(frame.get("ts"))
+        if ts is None:
+            return None
+        return int(ts.timestamp()) // (self.bucket_minutes * 60)
+
+    def _put(self, frame):
+        key = self._bucket_key(frame)
+        if key is None:
+            return
+        existing = self.buckets.get(key)
+        if existing is None or frame.get("ts", "") >= existing.get("ts", ""):
+            if existing is not None and frames_equal(existing, frame):
+                return  # keep the earlier timestamp so an unchanged timeline is not rewritten
+            self.buckets[key] = frame
+
+    def load(self):
+        """Seed from the timeline files; rebuild from the history if they are missing or stale."""
+        payload, segments = load_timeline(self.path)
+        if (
+            payload is None
+            or payload.get("range_hours") != self.hours
+            or payload.get("bucket_minutes") != self.bucket_minutes
+        ):
+            segments = {None: history_timeline_frames(self.hours, self.bucket_minutes)}
+        self.reset(frame for frames in segments.values() for frame in frames)
+        # Segment files already on disk are not rewritten until one of their buckets changes
+        self.written = {}
+        for segment, frames in segments.items():
+            if segment is not None:
+                keys = [self._bucket_key(frame) for frame in frames]
+                self.written[segment] = {key: self.buckets.get(key) for key in keys}
+
+    def reset(self, frames):
+        """Replace the buckets with bucketed `frames`."""
+        self.buckets = {}
+        for frame in frames:
+            self._put(frame)
+
+    def prune(self):
+        """Drop buckets whose latest frame is older than the window."""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.hours)
+        for key in sorted(self.buckets):
+            ts = parse_iso_utc(self.buckets[key].get("ts"))
+            if ts is not None and ts >= cutoff:
+                break
+            del self.buckets[key]
+
+    def push(self, frame):
+        """Fold a new frame into the newest bucket and expire old ones."""
+        if self.buckets is None:
+            self.load()
+        self._put(frame)
+        self.prune()
+
+    def frames(self):
+        if self.buckets is None:
+            self.load()
+        return [self.buckets[k] for k in sorted(self.buckets)]
+
+    def _segment_path(self, segment):
+        return os.path.join(self.segment_dir, f"{segment}.json")
+
+    def write(self):
+        """Write the changed segments, drop the expired ones and refresh the index. Returns the frame count."""
+        if self.buckets is None:
+            self.load()
+        keys = sorted(self.buckets)
+        self.throughput.update([(key, self.buckets[key]) for key in keys])
+        segments = {}
+        for key in keys:
+            segments.setdefault(key // self.segment_buckets, []).append(key)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        for segment, segment_keys in segments.items():
+            written = self.written.get(segment)
+            if written is not None and all(written.get(key) is self.buckets[key] for key in segment_keys):
+                continue
+            frames = [self.buckets[key] for key in segment_keys]
+            body = timeline_body(frames, self.throughput.block(segment_keys))
+            write_if_changed(
+                self._segment_path(segment),
+                json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                siblings=True,
+            )
+            self.written[segment] = dict(zip(segment_keys, frames))
+        self._remove_expired(segments)
+
+        name = os.path.basename(self.segment_dir)
+        index = {
+            "generated_at": iso_utc_now(),
+            "range_hours": self.hours,
+            "bucket_minutes": self.bucket_minutes,
+            "encoding": "segments",
+            "start": self.buckets[keys[0]].get("ts") if keys else None,
+            "frames": len(keys),
+            "segments": [f"{name}/{segment}.json" for segment in sorted(segments)],
+        }
+        write_if_changed(self.path, json.dumps(index, separators=(",", ":")).encode("utf-8"), siblings=True)
+        return len(keys)
+
+    def _remove_expired(self, segments):
+        """Delete segment files (and siblings) the new index no longer lists."""
+        for segment in [s for s in self.written if s not in segments]:
+            del self.written[segment]
+        try:
+            names = os.listdir(self.segment_dir)
+        except OSError:
+            return
+        for name in names:
+            stem = name.split(".", 1)[0]
+            if stem.lstrip("-").isdigit() and int(stem) not in segments and not name.endswith(".tmp"):
+                path = os.path.join(self.segment_dir, name)
+                _written_content.pop(path, None)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+# Kept across cycles in daemon mode; lazily seeded from disk on first use
+_timeline_builders = []
+
+
+def update_timelines(frame):
+    """Push a new snapshot frame into every timeline range. Returns {path: frame count}."""
+    if not _timeline_builders:
+        _timeline_builders.extend(TimelineBuilder(*spec) for spec in TIMELINE_RANGES)
+    counts = {}
+    for builder in _timeline_builders:
+        with _cycle_metrics.stage(f"timeline:{os.path.basename(builder.path)}"):
+            builder.push(frame)
+            counts[builder.path] = builder.write()
+    return counts
+
+
+_history_store = None
+
+
+def get_history_store():
+    """Open the SQLite history store once per process (HISTORY_BACKEND=sqlite)."""
+    global _history_store
+    if _history_store is None:
+        from history_store import SQLiteHistoryStore
+
+        os.makedirs(HISTORY_DIR, exist_ok=True)
+        _history_store = SQLiteHistoryStore(
+            HISTORY_DB,
+            raw_retention_days=HISTORY_RAW_RETENTION_DAYS,
+            rollup_retention_days=HISTORY_ROLLUP_RETENTION_DAYS,
+        )
+    return _history_store
+
+
+def record_history(frame):
+    """Store a snapshot frame in the configured backend and refresh the timeline files."""
+    if HISTORY_BACKEND == "sqlite":
+        store = get_history_store()
+        with _cycle_metrics.stage("history:sqlite"):
+            store.append(frame)
+    else:
+        with _cycle_metrics.stage("history:snapshot_log"):
+            append_snapshot(frame)
+    if not TIMELINE_FILES:
+        return {}
+    return update_timelines(frame)
+
+
+_presence_store = None
+
+
+def get_presence_store():
+    """Load the client presence log once per process."""
+    global _presence_store
+    if _presence_store is None:
+        _presence_store = ClientPresenceStore(
+            CLIENT_PRESENCE_LOG, PRESENCE_BUCKET_MINUTES, PRESENCE_RETENTION_DAYS
+        ).load()
+    return _presence_store
+
+
+def record_client_presence(data):
+    """Record which device every UniFi client is attached to, with its signal. Returns counts."""
+    store = get_presence_store()
+    samples = [
+        (client.get("mac"), dev["id"], client.get("signal"))
+        for dev in data.get("unifi", [])
+        for client in dev.get("client_list", ())
+    ]
+    start = time.perf_counter()
+    appended, rewritten = store.record(time.time(), samples)
+    _cycle_metrics.record_file(CLIENT_PRESENCE_LOG, appended + rewritten, time.perf_counter() - start)
+    stats = store.stats()
+    return {"clients": len(samples), "tracked": stats["clients"], "log_bytes": stats["log_bytes"]}
+
+
+def import_history(log_path=SNAPSHOT_LOG):
+    """One-shot import of an existing JSONL snapshot log into the SQLite store."""
+    store = get_history_store()
+    count = store.append_many(decode_frames(iter_snapshot_log(log_path)))
+    for path, hours, bucket_minutes in TIMELINE_RANGES:
+        write_timeline_payload(path, hours, bucket_minutes, store.rollup_frames(bucket_minutes, hours))
+    print(f"[collector] imported {count} new frames from {log_path} into {HISTORY_DB} (already stored ones skipped)")
+    return count
 
 
 def write_timeline_24h():
@@ -151,162 +1009,1045 @@ def write_timeline_30d():
     return write_timeline(TIMELINE_30D, hours=24 * 30, bucket_minutes=180)
 
 
-def load_unifi_position_lookup():
-    """Load manually measured UniFi device positions. Returns dict of mac -> {lat, lon}."""
-    if not os.path.exists(UNIFI_POSITION_LOOKUP):
+# path -> (mtime, parsed lookup); lets the daemon skip re-reading unchanged files
+_lookup_cache = {}
+
+
+def _load_position_lookup(path):
+    """Read a position lookup JSON, reusing the parsed copy while the file mtime is unchanged."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        _lookup_cache.pop(path, None)
         return {}
+    cached = _lookup_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
     try:
-        with open(UNIFI_POSITION_LOOKUP, encoding="utf-8") as f:
+        with open(path, encoding="utf-8") as f:
             data = json.load(f)
-        return {k: v for k, v in data.items() if not k.startswith("_") and isinstance(v, dict)}
+        lookup = {k: v for k, v in data.items() if not k.startswith("_") and isinstance(v, dict)}
     except (json.JSONDecodeError, OSError):
-        return {}
+        lookup = {}
+    _lookup_cache[path] = (mtime, lookup)
+    return lookup
+
+
+def load_unifi_position_lookup():
+    """Load manually measured UniFi device positions. Returns dict of mac -> {lat, lon}."""
+    return _load_position_lookup(UNIFI_POSITION_LOOKUP)
 
 
 def load_uisp_position_lookup():
     """Load manually adjusted UISP device positions (from map drag). Returns dict of device_id -> {lat, lon}."""
-    if not os.path.exists(UISP_POSITION_LOOKUP):
-        return {}
+    return _load_position_lookup(UISP_POSITION_LOOKUP)
+
+
+def make_session(headers, pool_size=HTTP_POOL_SIZE):
+    """Session with a pooled keep-alive adapter, safe to share across fetch threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(headers)
+    return session
+
+
+class SourceUnavailable(Exception):
+    """
+    An endpoint gave no usable answer this cycle. `fallback` is an older payload the
+    endpoint still has (e.g. a response cache entry fetched at `fetched_at`), or None.
+    """
+
+    def __init__(self, message, fallback=None, fetched_at=None):
+        super().__init__(message)
+        self.fallback = fallback
+        self.fetched_at = fetched_at
+
+
+class CircuitOpen(SourceUnavailable):
+    """The endpoint's circuit breaker is open; it was not asked this cycle."""
+
+
+# The fetch the current worker thread runs for: its deadline (time.monotonic())
+# and the CycleMetrics of the cycle that started it
+_fetch_task = threading.local()
+
+
+def fetch_metrics():
+    """
+    Metrics of the cycle the current fetch belongs to. A fetch still running after
+    its cycle's deadline records there, not into the cycle that has started since.
+    """
+    metrics = getattr(_fetch_task, "metrics", None)
+    return _cycle_metrics if metrics is None else metrics
+
+
+def request_timeout(timeout):
+    """`timeout` cut to what is left of the current fetch deadline; raises past it."""
+    deadline = getattr(_fetch_task, "deadline", None)
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise SourceUnavailable("cycle deadline passed")
+    return min(timeout, left)
+
+
+class EndpointCache:
+    """
+    Endpoint memory persisted to disk: the fallback path that answered last time,
+    an exponentially smoothed latency used to size that endpoint's timeout, and the
+    circuit breaker state (failures in a row, retry_at while open).
+    Keys are "<base_url>|<site>|<kind>" so each controller and site is tracked separately.
+    Fetch threads only update the entries; the file is written once per cycle.
+    """
+
+    def __init__(self, path=ENDPOINT_CACHE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.saved = None  # body last read or written, so an unchanged cache is not rewritten
+        self.dirty = False
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.saved = f.read()
+            data = json.loads(self.saved)
+            return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key):
+        with self.lock:
+            return dict(self.entries.get(key) or {})
+
+    def timeout_for(self, key):
+        latency = self.get(key).get("latency")
+        if latency is None:
+            return HTTP_TIMEOUT
+        return min(HTTP_TIMEOUT, max(HTTP_MIN_TIMEOUT, latency * HTTP_TIMEOUT_LATENCY_FACTOR))
+
+    def check(self, key):
+        """Raise CircuitOpen while the endpoint's breaker is open."""
+        retry_at = self.get(key).get("retry_at")
+        if retry_at is not None and time.time() < retry_at:
+            raise CircuitOpen(f"circuit open for {round(retry_at - time.time())}s more")
+
+    def _observe(self, entry, latency):
+        prev = entry.get("latency")
+        entry["latency"] = round(latency if prev is None else 0.7 * prev + 0.3 * latency, 3)
+
+    def record_success(self, key, path, latency):
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            if entry.get("path") != path:
+                entry.pop("latency", None)
+            entry["path"] = path
+            entry["failures"] = 0
+            entry.pop("retry_at", None)
+            self._observe(entry, latency)
+            self.dirty = True
+
+    def record_failure(self, key, latency):
+        """
+        A slow failure raises the smoothed latency, so the next timeout is longer.
+        From BREAKER_FAILURES failures in a row the breaker opens, with a backoff that
+        doubles per further failure (a failed retry after the backoff counts too).
+        """
+        with self.lock:
+            entry = self.entries.setdefault(key, {})
+            failures = entry["failures"] = entry.get("failures", 0) + 1
+            self._observe(entry, latency)
+            if failures >= BREAKER_FAILURES:
+                backoff = min(BREAKER_MAX_SECONDS, BREAKER_BASE_SECONDS * 2 ** (failures - BREAKER_FAILURES))
+                entry["retry_at"] = round(time.time() + backoff, 3)
+            self.dirty = True
+
+    def save(self):
+        """Write the entries if they changed; run_cycle calls this once per cycle."""
+        with self.lock:
+            if not self.dirty:
+                return
+            body = json.dumps(self.entries, indent=2, sort_keys=True)
+            self.dirty = False
+        if body == self.saved:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(body)
+            os.replace(tmp, self.path)
+            self.saved = body
+        except OSError as e:
+            self.dirty = True
+            print(f"[collector] could not save endpoint cache: {e}")
+
+
+_endpoint_cache = None
+
+
+def get_endpoint_cache():
+    global _endpoint_cache
+    if _endpoint_cache is None:
+        _endpoint_cache = EndpointCache()
+    return _endpoint_cache
+
+
+class ResponseCache:
+    """
+    Parsed-object cache for slow-changing endpoints. Entries hold the decoded payload
+    plus ETag/Last-Modified validators and are pickled to disk, so a fresh hit or a
+    304 revalidation never touches JSON decoding. Counters are per cycle.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    def count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def _file(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+    def get(self, key):
+        """Cached entry {fetched_at, etag, last_modified, data} or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            return entry
+        try:
+            with open(self._file(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        with self.lock:
+            self.entries[key] = entry
+        return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._file(key)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[collector] could not save response cache: {e}")
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+def project_client(c):
+    """
+    Compact client_map entry for a raw UniFi client: (device_mac, entry).
+    Wi-Fi clients use ap_mac; wired clients (on switches) use sw_mac.
+    device_mac is None for clients attached to neither.
+    """
+    device_mac = c.get("ap_mac") or c.get("sw_mac")
+    if not device_mac:
+        return None, None
+    return device_mac, {
+        "mac": c.get("mac"),
+        "name": c.get("name") or c.get("hostname") or c.get("oui") or c.get("mac"),
+        "ip": c.get("ip"),
+        "rssi": c.get("rssi"),
+        "signal": c.get("signal"),
+        "tx_bytes": c.get("tx_bytes"),
+        "rx_bytes": c.get("rx_bytes"),
+        "uptime": c.get("uptime"),
+        "os": c.get("os_name") or c.get("dev_cat"),
+        "radio": c.get("radio_proto"),
+        "channel": c.get("channel"),
+    }
+
+
+def group_clients(clients):
+    """Project raw clients one at a time into device_mac -> [compact client dicts]."""
+    client_map = {}
+    for c in clients:
+        device_mac, entry = project_client(c)
+        if device_mac:
+            client_map.setdefault(device_mac, []).append(entry)
+    return client_map
+
+
+def iter_json_items(chunks, key="data"):
+    """
+    Yield the elements of a JSON array while reading `chunks` (bytes), keeping only
+    the unparsed tail and the current element in memory. The array is either the
+    whole document or the value of `key` in a top-level object (UniFi's
+    {"meta": ..., "data": [...]}); other top-level values are skipped.
+    Raises ValueError on malformed or truncated input.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more():
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buf += text_decoder.decode(b"", final=True)
+            return True
+        if pos > STREAM_CHUNK_SIZE:
+            buf = buf[pos:]
+            pos = 0
+        buf += text_decoder.decode(chunk)
+        return True
+
+    def peek():
+        """Next non-whitespace character (advancing pos past whitespace), or '' at EOF."""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ""
+
+    def value():
+        """Decode one complete JSON value at pos, reading more input as needed."""
+        nonlocal pos
+        if peek() == "":
+            raise ValueError("truncated JSON")
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not more():
+                    raise ValueError("truncated or invalid JSON")
+                continue
+            if not eof and type(obj) in (int, float) and not buf[end:].strip("0123456789+-.eE"):
+                more()  # no delimiter buffered yet: the number may continue in the next chunk
+                continue
+            pos = end
+            return obj
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"expected {char!r} in JSON stream")
+        pos += 1
+
+    def array_items():
+        nonlocal pos
+        expect("[")
+        if peek() == "]":
+            pos += 1
+            return
+        while True:
+            yield value()
+            sep = peek()
+            pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise ValueError("expected ',' or ']' in JSON array")
+
+    first = peek()
+    if first == "[":
+        yield from array_items()
+        return
+    expect("{")
+    if peek() == "}":
+        return
+    while True:
+        name = value()
+        expect(":")
+        if name == key and peek() == "[":
+            yield from array_items()
+        else:
+            value()
+        sep = peek()
+        pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError("expected ',' or '}' in JSON object")
+
+
+def deadline_chunks(response, chunk_size):
+    """
+    response.iter_content(chunk_size), with the socket read timeout cut to what is left
+    of the fetch deadline before every further chunk: the request timeout bounds each
+    read, not the whole body, so a body that keeps trickling in could outlive the
+    deadline. Past it, raises ReadTimeout like a read that timed out.
+    """
+    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+    for chunk in response.iter_content(chunk_size):
+        yield chunk
+        if sock is None:
+            continue
+        try:
+            sock.settimeout(request_timeout(sock.gettimeout() or HTTP_TIMEOUT))
+        except SourceUnavailable as e:
+            raise requests.exceptions.ReadTimeout(str(e), response=response) from e
+
+
+def stream_clients(response):
+    """Group a streamed stat/sta response body without materializing the raw list."""
+    return group_clients(iter_json_items(deadline_chunks(response, STREAM_CHUNK_SIZE)))
+
+
+def unwrap_data(res_json):
+    """UniFi answers either a bare list or {"meta": ..., "data": [...]}."""
+    if isinstance(res_json, list):
+        return res_json
+    return res_json.get("data", [])
+
+
+def response_size(response):
+    """Body bytes received for a consumed response (as sent, before decompression)."""
     try:
-        with open(UISP_POSITION_LOOKUP, encoding="utf-8") as f:
-            data = json.load(f)
-        return {k: v for k, v in data.items() if not k.startswith("_") and isinstance(v, dict)}
-    except (json.JSONDecodeError, OSError):
-        return {}
+        return response.raw.tell()
+    except (AttributeError, OSError, ValueError):
+        return len(response.content or b"")
+
+
+def namespaced(namespace, value):
+    """"<namespace>/<value>" for merged multi-controller output; unchanged without a namespace."""
+    return f"{namespace}/{value}" if namespace and value else value
+
+
+def raw_id(dev_id):
+    """Device ID without its source namespace (position lookups may use either form)."""
+    return dev_id.rpartition("/")[2] if isinstance(dev_id, str) else dev_id
+
+
+def lookup_position(lookup, dev_id):
+    return lookup.get(dev_id) or lookup.get(raw_id(dev_id))
+
+
+def metric_kind(namespace, kind):
+    return f"{namespace}:{kind}" if namespace else kind
+
+
+def _namespace_ident(ident, namespace, *fields):
+    if not isinstance(ident, dict):
+        return ident
+    return {**ident, **{f: namespaced(namespace, ident.get(f)) for f in fields if ident.get(f)}}
+
+
+def _namespace_link_end(end, namespace):
+    if not isinstance(end, dict):
+        return end
+    end = dict(end)
+    for part in ("device", "site"):
+        if isinstance(end.get(part), dict):
+            end[part] = {
+                **end[part],
+                "identification": _namespace_ident(end[part].get("identification"), namespace, "id"),
+            }
+    return end
+
+
+def namespace_payload(key, data, namespace):
+    """
+    Copy of one fetched payload (FETCH_KEYS entry) with device/site IDs prefixed by
+    the source namespace. Copies, not in-place edits: cached UISP responses are reused.
+    """
+    if not namespace:
+        return data
+    if key == "unifi_clients":
+        if isinstance(data, dict):
+            return {namespaced(namespace, mac): entries for mac, entries in data.items()}
+        return [
+            {**c, **{f: namespaced(namespace, c.get(f)) for f in ("ap_mac", "sw_mac") if c.get(f)}}
+            for c in data
+        ]
+    if not isinstance(data, list):
+        return data
+    if key == "unifi_devices":
+        out = []
+        for dev in data:
+            dev = {**dev, "mac": namespaced(namespace, dev.get("mac"))}
+            if dev.get("uplink_mac"):
+                dev["uplink_mac"] = namespaced(namespace, dev["uplink_mac"])
+            if isinstance(dev.get("uplink"), dict) and dev["uplink"].get("uplink_mac"):
+                dev["uplink"] = {**dev["uplink"], "uplink_mac": namespaced(namespace, dev["uplink"]["uplink_mac"])}
+            out.append(dev)
+        return out
+    if key == "uisp_devices":
+        return [
+            {**dev, "identification": _namespace_ident(dev.get("identification"), namespace, "id", "siteId")}
+            for dev in data
+        ]
+    if key == "uisp_sites":
+        return [{**site, "id": namespaced(namespace, site.get("id"))} for site in data]
+    if key == "uisp_links":
+        out = []
+        for link in data:
+            link = {
+                **link,
+                "from": _namespace_link_end(link.get("from"), namespace),
+                "to": _namespace_link_end(link.get("to"), namespace),
+            }
+            for f in ("deviceIdA", "deviceIdB", "siteIdA", "siteIdB"):
+                if link.get(f):
+                    link[f] = namespaced(namespace, link[f])
+            out.append(link)
+        return out
+    return data
 
 
 class UniFiCollector:
-    """Collects devices from UniFi Network Controller API."""
+    """
+    Collects devices from UniFi Network Controller API.
+    namespace: prefix for device IDs when several controllers/sites are merged.
+    session: shared by the collectors of several sites on the same controller.
+    """
 
-    def __init__(self, base_url, api_key, site="default"):
+    def __init__(self, base_url, api_key, site="default", endpoints=None, namespace=None, session=None):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.site = site
-        self.session = requests.Session()
-        self.session.headers.update(
+        self.namespace = namespace
+        self.endpoints = endpoints or get_endpoint_cache()
+        self.session = session or self.open_session(api_key)
+
+    @staticmethod
+    def open_session(api_key, pool_size=HTTP_POOL_SIZE):
+        return make_session(
             {
-                "x-api-key": self.api_key,
+                "x-api-key": api_key,
                 "Accept": "application/json",
                 "User-Agent": "Mozilla/5.0",
-            }
+            },
+            pool_size=pool_size,
         )
 
-    def get_devices(self):
-        paths = [
-            f"/proxy/network/integration/v1/sites/{self.site}/devices",
-            f"/proxy/network/api/s/{self.site}/stat/device",
-            f"/api/s/{self.site}/stat/device",
-        ]
-        for path in paths:
+    def jobs(self):
+        """FETCH_KEYS entry -> fetch function, run concurrently by fetch_all."""
+        return {"unifi_devices": self.get_devices, "unifi_clients": self.get_clients}
+
+    def _fetch_first(self, kind, paths, parse=None):
+        """
+        Return data from the first path that answers. The path that worked last time is
+        tried first with an adaptive timeout; the others are probed only if it fails.
+        With `parse`, the body is streamed and parse(response) builds the result.
+        Raises SourceUnavailable when no path answers (or the breaker is open).
+        """
+        key = f"{self.base_url}|{self.site}|{kind}"
+        self.endpoints.check(key)
+        known = self.endpoints.get(key).get("path")
+        if known in paths:
+            paths = [known] + [p for p in paths if p != known]
+        first_start = time.monotonic()
+        for attempt, path in enumerate(paths):
             url = f"{self.base_url}{path}"
+            timeout = request_timeout(self.endpoints.timeout_for(key) if path == known else HTTP_TIMEOUT)
+            start = time.monotonic()
             try:
-                response = self.session.get(url, verify=False, timeout=15)
-                if response.status_code == 200:
-                    try:
-                        res_json = response.json()
-                        if isinstance(res_json, list):
-                            return res_json
-                        return res_json.get("data", [])
-                    except (ValueError, TypeError):
-                        continue
-            except requests.RequestException:
+                with self.session.get(
+                    url, verify=False, timeout=timeout, stream=parse is not None
+                ) as response:
+                    elapsed = time.monotonic() - start
+                    data = None
+                    if response.status_code == 200:
+                        try:
+                            data = parse(response) if parse else unwrap_data(response.json())
+                        except (ValueError, TypeError, AttributeError):
+                            data = None
+                    fetch_metrics().record_http(
+                        metric_kind(self.namespace, f"unifi_{kind}"), path, response.status_code,
+                        response_size(response), time.monotonic() - start, attempt,
+                    )
+            except requests.RequestException as e:
+                fetch_metrics().record_http(
+                    metric_kind(self.namespace, f"unifi_{kind}"), path, None, 0,
+                    time.monotonic() - start, attempt, error=type(e).__name__,
+                )
+                if path == known:
+                    self.endpoints.record_failure(key, time.monotonic() - start)
                 continue
-        return []
+            if data is not None:
+                self.endpoints.record_success(key, path, elapsed)
+                return data
+            if path == known:
+                self.endpoints.record_failure(key, elapsed)
+        if known not in paths:  # counted once per cycle for the breaker
+            self.endpoints.record_failure(key, time.monotonic() - first_start)
+        raise SourceUnavailable(f"no answer from {len(paths)} path(s)")
+
+    def get_devices(self):
+        return self._fetch_first(
+            "devices",
+            [
+                f"/proxy/network/integration/v1/sites/{self.site}/devices",
+                f"/proxy/network/api/s/{self.site}/stat/device",
+                f"/api/s/{self.site}/stat/device",
+            ],
+        )
 
     def get_clients(self):
-        """Fetch connected clients from UniFi controller."""
-        paths = [
-            f"/proxy/network/api/s/{self.site}/stat/sta",
-            f"/api/s/{self.site}/stat/sta",
-        ]
-        for path in paths:
-            url = f"{self.base_url}{path}"
-            try:
-                response = self.session.get(url, verify=False, timeout=15)
-                if response.status_code == 200:
-                    try:
-                        res_json = response.json()
-                        if isinstance(res_json, list):
-                            return res_json
-                        return res_json.get("data", [])
-                    except (ValueError, TypeError):
-                        continue
-            except requests.RequestException:
-                continue
-        return []
+        """
+        Fetch connected clients from UniFi controller, streamed and grouped as
+        device_mac -> [compact client dicts] (see project_client).
+        """
+        return self._fetch_first(
+            "clients",
+            [
+                f"/proxy/network/api/s/{self.site}/stat/sta",
+                f"/api/s/{self.site}/stat/sta",
+            ],
+            parse=stream_clients,
+        )
 
 
 class UISPCollector:
     """Collects devices, sites, and data-links from UISP API."""
 
-    def __init__(self, base_url, api_key):
+    def __init__(self, base_url, api_key, endpoints=None, response_cache=None, namespace=None):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
-        self.session = requests.Session()
-        self.session.headers.update(
+        self.namespace = namespace
+        self.endpoints = endpoints or get_endpoint_cache()
+        self.response_cache = response_cache or get_response_cache()
+        self.session = make_session(
             {"x-auth-token": self.api_key, "Accept": "application/json"}
         )
 
-    def get_devices(self):
-        url = f"{self.base_url}/nms/api/v2.1/devices"
+    def jobs(self):
+        """FETCH_KEYS entry -> fetch function, run concurrently by fetch_all."""
+        return {
+            "uisp_devices": self.get_devices,
+            "uisp_sites": self.get_sites,
+            "uisp_links": self.get_datalinks,
+        }
+
+    def _request(self, kind, path, headers=None):
+        """
+        GET with the endpoint's adaptive timeout; returns the response. Raises
+        SourceUnavailable on connection errors / timeouts or while the breaker is open.
+        """
+        key = f"{self.base_url}|{kind}"
+        self.endpoints.check(key)
+        timeout = request_timeout(self.endpoints.timeout_for(key))
+        start = time.monotonic()
         try:
-            response = self.session.get(url, verify=False, timeout=15)
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+            response = self.session.get(
+                f"{self.base_url}{path}",
+                headers=headers,
+                verify=False,
+                timeout=timeout,
+            )
+        except requests.RequestException as e:
+            elapsed = time.monotonic() - start
+            fetch_metrics().record_http(
+                metric_kind(self.namespace, f"uisp_{kind}"), path, None, 0, elapsed,
+                error=type(e).__name__,
+            )
+            self.endpoints.record_failure(key, elapsed)
+            raise SourceUnavailable(type(e).__name__) from e
+        elapsed = time.monotonic() - start
+        fetch_metrics().record_http(
+            metric_kind(self.namespace, f"uisp_{kind}"), path, response.status_code,
+            response_size(response), elapsed,
+        )
+        if response.status_code in (200, 304):
+            self.endpoints.record_success(key, path, elapsed)
+        else:
+            self.endpoints.record_failure(key, elapsed)
+        return response
 
-    def get_sites(self):
-        url = f"{self.base_url}/nms/api/v2.1/sites"
+    def _get(self, kind, path):
+        response = self._request(kind, path)
+        if response.status_code != 200:
+            raise SourceUnavailable(f"HTTP {response.status_code}")
         try:
-            response = self.session.get(url, verify=False, timeout=15)
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+            return response.json()
+        except ValueError:
+            raise SourceUnavailable("invalid JSON")
+
+    def _get_cached(self, kind, path):
+        """
+        Serve from the response cache while the entry is younger than its TTL; after
+        that revalidate with If-None-Match / If-Modified-Since and reuse it on 304.
+        When the endpoint fails, the SourceUnavailable carries the cached entry as fallback.
+        """
+        key = f"{self.base_url}{path}"
+        cache = self.response_cache
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None and now - entry["fetched_at"] < UISP_CACHE_TTLS[kind]:
+            cache.count("hits")
+            return entry["data"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self._request(kind, path, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                cache.count("revalidated")
+                cache.put(key, {**entry, "fetched_at": now})
+                return entry["data"]
+            if response.status_code != 200:
+                raise SourceUnavailable(f"HTTP {response.status_code}")
+            try:
+                data = response.json()
+            except ValueError:
+                raise SourceUnavailable("invalid JSON")
+        except SourceUnavailable as e:
+            if entry is None:
+                raise
+            raise type(e)(str(e), fallback=entry["data"], fetched_at=entry["fetched_at"]) from e
+        cache.count("misses")
+        cache.put(
+            key,
+            {
+                "fetched_at": now,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "data": data,
+            },
+        )
+        return data
+
+    def get_devices(self):
+        return self._get("devices", "/nms/api/v2.1/devices")
+
+    def get_sites(self):
+        return self._get_cached("sites", "/nms/api/v2.1/sites")
 
     def get_datalinks(self):
-        url = f"{self.base_url}/nms/api/v2.1/data-links?siteLinksOnly=true"
+        return self._get_cached("datalinks", "/nms/api/v2.1/data-links?siteLinksOnly=true")
+
+
+def fetch_all(collectors, keys=None, deadline=None):
+    """
+    Fetch every endpoint of every collector through one bounded worker pool, so a
+    cycle takes about as long as the slowest controller. Payloads are namespaced per
+    collector and merged into a dict keyed by FETCH_KEYS; UniFi clients stay grouped
+    by device MAC. With `keys`, only those FETCH_KEYS entries are fetched (the others
+    come back empty).
+
+    With `deadline` (time.monotonic()), requests are cut off when it passes and the
+    pool is not waited on past it. A source that fails or misses the deadline is
+    replaced by its last good payload and marked stale (see stale_sources).
+    """
+    jobs = [
+        (col, key, fn)
+        for col in collectors
+        if col is not None
+        for key, fn in col.jobs().items()
+        if keys is None or key in keys
+    ]
+    results = {key: [] for key in FETCH_KEYS}
+    results["unifi_clients"] = {}
+    if not jobs:
+        return results
+
+    global _last_good_changed
+    load_last_good()
+    metrics = _cycle_metrics
+
+    def timed(label, fn):
+        _fetch_task.deadline, _fetch_task.metrics = deadline, metrics
         try:
-            response = self.session.get(url, verify=False, timeout=15)
-            if response.status_code == 200:
-                return response.json()
-        except requests.RequestException:
-            pass
-        return []
+            with metrics.stage(f"fetch:{label}"):
+                return fn()
+        finally:
+            _fetch_task.deadline = _fetch_task.metrics = None
+
+    pool = ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(jobs)))
+    try:
+        futures = [
+            (col, key, pool.submit(timed, metric_kind(col.namespace, key), fn))
+            for col, key, fn in jobs
+        ]
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        wait([future for _, _, future in futures], timeout=remaining)
+    finally:
+        # Stragglers finish on their own (their timeouts end at the deadline)
+        pool.shutdown(wait=deadline is None, cancel_futures=True)
+
+    fetched_at = iso_utc_now()
+    for col, key, future in futures:
+        source = metric_kind(col.namespace, key)
+        if not future.done() or future.cancelled():
+            data = use_last_good(source, key, "missed the cycle deadline")
+        elif future.exception() is not None:
+            exc = future.exception()
+            fallback = getattr(exc, "fallback", None)
+            data = use_last_good(
+                source,
+                key,
+                str(exc) or type(exc).__name__,
+                None if fallback is None else namespace_payload(key, fallback, col.namespace),
+                getattr(exc, "fetched_at", None),
+                isinstance(exc, CircuitOpen),
+            )
+        else:
+            data = namespace_payload(key, future.result(), col.namespace)
+            _last_good[source] = {"key": key, "data": data, "fetched_at": fetched_at, "stale": False}
+            _last_good_changed = True
+        if data is None:
+            continue
+        if key == "unifi_clients":
+            if not isinstance(data, dict):
+                data = group_clients(data)
+            for mac, entries in data.items():
+                results[key].setdefault(mac, []).extend(entries)
+        elif isinstance(data, list):
+            results[key].extend(data)
+    return results
+
+
+# Per fetch source (metric_kind of namespace and FETCH_KEYS entry): the last payload
+# it answered with, when, and whether this cycle fell back to it
+_last_good = {}
+_last_good_loaded = False
+_last_good_changed = False  # fresh payloads since the last save
+_last_good_saved_at = None  # time.monotonic() of the last save
+
+
+def load_last_good():
+    """Seed _last_good from LAST_GOOD_CACHE once per process; live entries win."""
+    global _last_good_loaded
+    if _last_good_loaded:
+        return
+    _last_good_loaded = True
+    try:
+        with open(LAST_GOOD_CACHE, "rb") as f:
+            saved = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return
+    if isinstance(saved, dict):
+        for source, entry in saved.items():
+            _last_good.setdefault(source, {**entry, "stale": False})
+
+
+def save_last_good():
+    """
+    Write the last good payloads to LAST_GOOD_CACHE when a source answered since the
+    last save, at most every LAST_GOOD_SAVE_SECONDS; run_cycle calls this once per cycle.
+    """
+    global _last_good_changed, _last_good_saved_at
+    now = time.monotonic()
+    if not _last_good_changed or (
+        _last_good_saved_at is not None and now - _last_good_saved_at < LAST_GOOD_SAVE_SECONDS
+    ):
+        return
+    saved = {
+        source: {"key": entry["key"], "data": entry["data"], "fetched_at": entry["fetched_at"]}
+        for source, entry in _last_good.items()
+        if entry["data"] is not None
+    }
+    try:
+        os.makedirs(os.path.dirname(LAST_GOOD_CACHE) or ".", exist_ok=True)
+        write_atomic(LAST_GOOD_CACHE, pickle.dumps(saved, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"[collector] could not save last good payloads: {e}")
+        return
+    _last_good_changed, _last_good_saved_at = False, now
+
+
+def use_last_good(source, key, reason, fallback=None, fetched_at=None, circuit_open=False):
+    """
+    Payload to use for a source that gave no answer this cycle: the last good one from
+    this process, else `fallback` (e.g. the response cache entry a SourceUnavailable
+    carries, fetched at epoch `fetched_at`), else None (the source is missing).
+    """
+    entry = _last_good.get(source)
+    if entry is None or entry["data"] is None:
+        entry = _last_good[source] = {
+            "key": key,
+            "data": fallback,
+            "fetched_at": iso_utc(fetched_at) if fallback is not None and fetched_at else None,
+        }
+    entry.update(stale=True, error=reason, circuit_open=circuit_open)
+    since = f"last good from {entry['fetched_at']}" if entry["data"] is not None else "no earlier data"
+    print(f"[collector] {source} {'skipped' if circuit_open else 'failed'}: {reason} ({since})")
+    return entry["data"]
+
+
+def stale_sources():
+    """Sources that fell back this cycle: source -> {key, fetched_at, error, circuit_open, missing}."""
+    return {
+        source: {
+            "key": entry["key"],
+            "fetched_at": entry["fetched_at"],
+            "error": entry.get("error"),
+            "circuit_open": entry.get("circuit_open", False),
+            "missing": entry["data"] is None,
+        }
+        for source, entry in _last_good.items()
+        if entry.get("stale")
+    }
+
+
+def mark_stale(data, stale):
+    """
+    Set "stale": <fetched_at of the data shown> on devices whose source fell back this
+    cycle and clear it on the others; list the stale sources in data["stale_sources"].
+    """
+    since = {}
+    for source, info in stale.items():
+        entry = _last_good[source]
+        if info["key"] == "unifi_devices" and entry["data"]:
+            since.update((dev.get("mac"), info["fetched_at"]) for dev in entry["data"])
+        elif info["key"] == "uisp_devices" and entry["data"]:
+            since.update(
+                ((dev.get("identification") or {}).get("id"), info["fetched_at"]) for dev in entry["data"]
+            )
+    for dev in (*data["unifi"], *data["uisp"]):
+        if dev["id"] in since:
+            dev["stale"] = since[dev["id"]]
+        else:
+            dev.pop("stale", None)
+    if stale:
+        data["stale_sources"] = stale
+    else:
+        data.pop("stale_sources", None)
+    return len(since)
+
+
+def load_controllers_config(path=None):
+    """Parsed controllers file (default CONTROLLERS_FILE), or None when it does not exist."""
+    path = path or CONTROLLERS_FILE
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _controller_name(entry):
+    return entry.get("name") or urllib3.util.parse_url(entry.get("url") or "").host
+
+
+def _controller_key(entry):
+    """API key inline ("key") or, preferably, from the environment variable named by "key_env"."""
+    return entry.get("key") or (os.getenv(entry["key_env"]) if entry.get("key_env") else None)
+
+
+def build_collectors():
+    """
+    Create collectors for every configured controller (and UniFi site). With a
+    CONTROLLERS_FILE, device IDs are namespaced "<name>/<site>/<id>" (UniFi) or
+    "<name>/<id>" (UISP); otherwise one UniFi and one UISP controller come from the
+    environment with raw IDs. A controller without URL/key is skipped.
+    """
+    config = load_controllers_config()
+    if config is None:
+        return build_env_collectors()
+
+    collectors = []
+    for entry in config.get("unifi", []):
+        name, url, key = _controller_name(entry), entry.get("url"), _controller_key(entry)
+        if not (name and url and key):
+            print(f"[collector] skipping UniFi controller without name/url/key: {entry.get('name') or url}")
+            continue
+        sites = entry.get("sites") or ["default"]
+        # one connection pool per controller, shared by its sites
+        session = UniFiCollector.open_session(key, pool_size=HTTP_POOL_SIZE * len(sites))
+        for site in sites:
+            collectors.append(
+                UniFiCollector(url, key, site=site, namespace=f"{name}/{site}", session=session)
+            )
+    for entry in config.get("uisp", []):
+        name, url, key = _controller_name(entry), entry.get("url"), _controller_key(entry)
+        if not (name and url and key):
+            print(f"[collector] skipping UISP controller without name/url/key: {entry.get('name') or url}")
+            continue
+        collectors.append(UISPCollector(url, key, namespace=name))
+
+    namespaces = [col.namespace for col in collectors]
+    for ns in sorted({n for n in namespaces if namespaces.count(n) > 1}):
+        print(f"[collector] duplicate controller name {ns!r}: device IDs may collide")
+    return collectors
+
+
+def build_env_collectors():
+    """Single UniFi/UISP controller from UNIFI_* / UISP_* environment variables."""
+    UNIFI_URL = os.getenv("UNIFI_URL")
+    UNIFI_KEY = os.getenv("UNIFI_KEY")
+    UNIFI_SITE = os.getenv("UNIFI_SITE", "default")
+    UISP_URL = os.getenv("UISP_URL")
+    UISP_KEY = os.getenv("UISP_KEY")
+
+    collectors = []
+    if UNIFI_URL and UNIFI_KEY:
+        collectors.append(UniFiCollector(UNIFI_URL, UNIFI_KEY, site=UNIFI_SITE))
+    if UISP_URL and UISP_KEY:
+        collectors.append(UISPCollector(UISP_URL, UISP_KEY))
+    return collectors
+
+
+def datalink_end(link, side):
+    """ID at one end ("from" / "to") of a UISP data-link: its device, else its site."""
+    end = link.get(side) or {}
+    suffix = "A" if side == "from" else "B"
+    return (
+        ((end.get("device") or {}).get("identification") or {}).get("id")
+        or ((end.get("site") or {}).get("identification") or {}).get("id")
+        or link.get(f"deviceId{suffix}")
+        or link.get(f"siteId{suffix}")
+    )
+
+
+def median_select(values):
+    """
+    values[len // 2] of the sorted values (the upper median for an even count), by
+    linear-time selection (NumPy's introselect) instead of a full sort when available.
+    """
+    k = len(values) // 2
+    if np is not None:
+        return float(np.partition(np.array(values, dtype=float), k)[k])
+    return sorted(values)[k]
 
 
 def format_network_data(unifi_devs, uisp_devs, uisp_sites, uisp_links, unifi_clients=None):
     """
     Combine UniFi and UISP data into a unified structure for the map.
     UniFi device coordinates: manual lookup > API x/y > centroid of UISP devices.
+    UISP devices more than 0.03 deg from the median position are left out. Devices
+    are emitted with their final coordinates as they are indexed by ID, and links
+    are kept only when both ends are devices on the map (or, for UISP data-links,
+    UISP sites).
     """
     combined = {"unifi": [], "uisp": [], "links": [], "map_metadata": {}}
     position_lookup = load_unifi_position_lookup()
     uisp_position_lookup = load_uisp_position_lookup()
 
     # Build client lookup: device_mac -> [list of client dicts]
-    # Wi-Fi clients use ap_mac; wired clients (on switches) use sw_mac
-    client_map = {}
-    for c in (unifi_clients or []):
-        device_mac = c.get("ap_mac") or c.get("sw_mac")
-        if not device_mac:
-            continue
-        client_map.setdefault(device_mac, []).append({
-            "mac": c.get("mac"),
-            "name": c.get("name") or c.get("hostname") or c.get("oui") or c.get("mac"),
-            "ip": c.get("ip"),
-            "rssi": c.get("rssi"),
-            "signal": c.get("signal"),
-            "tx_bytes": c.get("tx_bytes"),
-            "rx_bytes": c.get("rx_bytes"),
-            "uptime": c.get("uptime"),
-            "os": c.get("os_name") or c.get("dev_cat"),
-            "radio": c.get("radio_proto"),
-            "channel": c.get("channel"),
-        })
+    # UniFiCollector.get_clients already streams clients into this shape;
+    # a raw client list is grouped here
+    if isinstance(unifi_clients, dict):
+        client_map = unifi_clients
+    else:
+        client_map = group_clients(unifi_clients or [])
 
     # Build site coords lookup
     site_map = {}
@@ -320,141 +2061,133 @@ def format_network_data(unifi_devs, uisp_devs, uisp_sites, uisp_links, unifi_cli
                     "lon": loc.get("longitude"),
                 }
 
-    # UniFi devices — only include devices listed in unifi_position_lookup.json
-    if isinstance(unifi_devs, list):
-        for dev in unifi_devs:
-            mac = dev.get("mac")
-            if mac not in position_lookup:
-                continue
-            uplink_mac = dev.get("uplink_mac") or dev.get("uplink", {}).get("uplink_mac")
-            combined["unifi"].append(
-                {
-                    "id": mac,
-                    "name": dev.get("name", mac),
-                    "type": dev.get("type"),
-                    "model": dev.get("model"),
-                    "state": dev.get("state", 1),
-                    "clients": dev.get("num_sta", 0),
-                    "client_list": client_map.get(mac, []),
-                    "x": dev.get("x"),
-                    "y": dev.get("y"),
-                    "ip": dev.get("ip"),
-                    "version": dev.get("version"),
-                    "uptime": dev.get("uptime"),
-                    "tx_bytes": dev.get("tx_bytes"),
-                    "rx_bytes": dev.get("rx_bytes"),
-                }
-            )
-            if uplink_mac:
-                combined["links"].append(
-                    {"from": uplink_mac, "to": mac, "type": "wired_unifi"}
-                )
+    # IDs of the devices on the map, for resolving link endpoints; UISP data-links
+    # may also end at a site (site-level links), known from the sites or the devices
+    device_ids = set()
+    site_ids = set(site_map)
 
     # UISP devices with coordinates
-    lats, lons = [], []
-    temp_uisp = []
+    located = []
     if isinstance(uisp_devs, list):
         for dev in uisp_devs:
             id_info = dev.get("identification") or {}
+            site_ids.add(id_info.get("siteId"))
             attr = dev.get("attributes") or {}
             loc = dev.get("location") or {}
-            s_id = id_info.get("siteId")
-            d_id = id_info.get("id")
-            site_coords = site_map.get(s_id, {})
-            lat = (
-                attr.get("latitude")
-                or loc.get("latitude")
-                or site_coords.get("lat")
-            )
-            lon = (
-                attr.get("longitude")
-                or loc.get("longitude")
-                or site_coords.get("lon")
-            )
+            lat = attr.get("latitude") or loc.get("latitude")
+            lon = attr.get("longitude") or loc.get("longitude")
+            if not (lat and lon):  # fall back to the site's coordinates
+                site_coords = site_map.get(id_info.get("siteId"), {})
+                lat = lat or site_coords.get("lat")
+                lon = lon or site_coords.get("lon")
             if lat and lon:
                 lat, lon = float(lat), float(lon)
                 if abs(lat) > 0.1:
-                    temp_uisp.append((lat, lon, d_id, dev))
-
-    if temp_uisp:
-        all_lats = sorted([x[0] for x in temp_uisp])
-        all_lons = sorted([x[1] for x in temp_uisp])
-        med_lat = all_lats[len(all_lats) // 2]
-        med_lon = all_lons[len(all_lons) // 2]
-        for lat, lon, d_id, dev in temp_uisp:
-            if abs(lat - med_lat) < 0.03 and abs(lon - med_lon) < 0.03:
-                lats.append(lat)
-                lons.append(lon)
-                id_info = dev.get("identification") or {}
-                combined["uisp"].append(
-                    {
-                        "id": d_id,
-                        "name": id_info.get("name"),
-                        "model": id_info.get("model"),
-                        "type": id_info.get("type"),
-                        "state": dev.get("overview", {}).get("status"),
-                        "clients": dev.get("overview", {}).get("stationsCount", 0),
-                        "lat": lat,
-                        "lon": lon,
-                    }
-                )
+                    located.append((lat, lon, id_info, dev))
 
-    # Apply manual UISP position overrides (from map drag & export)
-    for dev in combined["uisp"]:
-        override = uisp_position_lookup.get(dev["id"])
-        if override and override.get("lat") is not None and override.get("lon") is not None:
-            dev["lat"] = float(override["lat"])
-            dev["lon"] = float(override["lon"])
+    # Keep the ones near the median position; manual overrides (from map drag &
+    # export) move a device but its API position still counts for the bounds
+    lats, lons = [], []
+    if located:
+        med_lat = median_select([x[0] for x in located])
+        med_lon = median_select([x[1] for x in located])
+        for lat, lon, id_info, dev in located:
+            if not (abs(lat - med_lat) < 0.03 and abs(lon - med_lon) < 0.03):
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            d_id = id_info.get("id")
+            overview = dev.get("overview", {})
+            record = {
+                "id": d_id,
+                "name": id_info.get("name"),
+                "model": id_info.get("model"),
+                "type": id_info.get("type"),
+                "state": overview.get("status"),
+                "clients": overview.get("stationsCount", 0),
+                "lat": lat,
+                "lon": lon,
+            }
+            override = lookup_position(uisp_position_lookup, d_id)
+            if override and override.get("lat") is not None and override.get("lon") is not None:
+                record["lat"] = float(override["lat"])
+                record["lon"] = float(override["lon"])
+            combined["uisp"].append(record)
+            device_ids.add(d_id)
 
-    # Assign coordinates to UniFi devices: manual lookup > API x/y > centroid
+    # UniFi devices — only include devices listed in unifi_position_lookup.json.
+    # Coordinates: manual lookup > API x/y > centroid
     centroid_lat = sum(lats) / len(lats) if lats else None
     centroid_lon = sum(lons) / len(lons) if lons else None
-    for dev in combined["unifi"]:
-        manual = position_lookup.get(dev["id"])
-        if manual and manual.get("lat") is not None and manual.get("lon") is not None:
-            dev["lat"] = float(manual["lat"])
-            dev["lon"] = float(manual["lon"])
-        elif dev.get("x") is not None and dev.get("y") is not None:
-            dev["lat"] = float(dev["y"])
-            dev["lon"] = float(dev["x"])
-        elif centroid_lat and centroid_lon:
-            dev["lat"] = centroid_lat
-            dev["lon"] = centroid_lon
-
-    # UISP links
+    uplinks = []
+    if isinstance(unifi_devs, list):
+        for dev in unifi_devs:
+            get = dev.get
+            mac = get("mac")
+            manual = lookup_position(position_lookup, mac)
+            if manual is None:
+                continue
+            uplink_mac = get("uplink_mac") or get("uplink", {}).get("uplink_mac")
+            record = {
+                "id": mac,
+                "name": get("name", mac),
+                "type": get("type"),
+                "model": get("model"),
+                "state": get("state", 1),
+                "clients": get("num_sta", 0),
+                "client_list": client_map.get(mac, []),
+                "x": get("x"),
+                "y": get("y"),
+                "ip": get("ip"),
+                "version": get("version"),
+                "uptime": get("uptime"),
+                "tx_bytes": get("tx_bytes"),
+                "rx_bytes": get("rx_bytes"),
+            }
+            if manual and manual.get("lat") is not None and manual.get("lon") is not None:
+                record["lat"] = float(manual["lat"])
+                record["lon"] = float(manual["lon"])
+            elif record["x"] is not None and record["y"] is not None:
+                record["lat"] = float(record["y"])
+                record["lon"] = float(record["x"])
+            elif centroid_lat and centroid_lon:
+                record["lat"] = centroid_lat
+                record["lon"] = centroid_lon
+            combined["unifi"].append(record)
+            device_ids.add(mac)
+            if uplink_mac:
+                uplinks.append((uplink_mac, mac))
+
+    # Wired UniFi uplinks (an uplink may come later in the device list)
+    for uplink_mac, mac in uplinks:
+        if uplink_mac in device_ids:
+            combined["links"].append({"from": uplink_mac, "to": mac, "type": "wired_unifi"})
+
+    # UISP links: ends are resolved lazily, so a link is dropped as soon as one end is
+    # neither a device on the map nor a UISP site. The link's own signal wins over the
+    # from-device's overview signal
     if isinstance(uisp_links, list):
+        emit = combined["links"].append
+        link_ends = device_ids | site_ids
+        link_ends.discard(None)
         for link in uisp_links:
-            from_data = link.get("from") or {}
-            to_data = link.get("to") or {}
-            from_dev_ident = (from_data.get("device") or {}).get("identification") or {}
-            from_site_ident = (from_data.get("site") or {}).get("identification") or {}
-            to_dev_ident = (to_data.get("device") or {}).get("identification") or {}
-            to_site_ident = (to_data.get("site") or {}).get("identification") or {}
-            side_a = (
-                from_dev_ident.get("id")
-                or from_site_ident.get("id")
-                or link.get("deviceIdA")
-                or link.get("siteIdA")
-            )
-            side_b = (
-                to_dev_ident.get("id")
-                or to_site_ident.get("id")
-                or link.get("deviceIdB")
-                or link.get("siteIdB")
+            side_a = datalink_end(link, "from")
+            if not side_a or side_a not in link_ends:
+                continue
+            side_b = datalink_end(link, "to")
+            if not side_b or side_b not in link_ends:
+                continue
+            get = link.get
+            emit(
+                {
+                    "from": side_a,
+                    "to": side_b,
+                    "type": get("type", "wireless"),
+                    "state": get("state", "active"),
+                    "signal": get("signal")
+                    or (((get("from") or {}).get("device") or {}).get("overview", {}).get("signal")),
+                }
             )
-            if side_a and side_b:
-                signal = link.get("signal") or (from_data.get("device") or {}).get(
-                    "overview", {}
-                ).get("signal")
-                combined["links"].append(
-                    {
-                        "from": side_a,
-                        "to": side_b,
-                        "type": link.get("type", "wireless"),
-                        "state": link.get("state", "active"),
-                        "signal": signal,
-                    }
-                )
 
     # Map metadata (bounding box for initial view)
     if lats and lons:
@@ -472,48 +2205,429 @@ def format_network_data(unifi_devs, uisp_devs, uisp_sites, uisp_links, unifi_cli
     return combined
 
 
-def main():
-    UNIFI_URL = os.getenv("UNIFI_URL")
-    UNIFI_KEY = os.getenv("UNIFI_KEY")
-    UNIFI_SITE = os.getenv("UNIFI_SITE", "default")
-    UISP_URL = os.getenv("UISP_URL")
-    UISP_KEY = os.getenv("UISP_KEY")
+def patch_network_data(data, unifi_devs=None, uisp_devs=None, unifi_clients=None, uisp_links=None):
+    """
+    Patch the fast-changing fields of a format_network_data() payload in place from
+    the payloads fetched on a fast tick (None = not fetched): device state, client
+    counts, UniFi client lists, uptime and counters, and the signal of UISP links
+    that have none of their own in `uisp_links` (the data-links the payload was
+    formatted from), which format_network_data takes from the from-device's overview.
+    UISP devices added or removed wait for the next full format, which also brings
+    their data-links. Returns False when the UniFi devices
+    on the map or their uplinks changed: `data` may then be partly patched and the
+    caller formats from scratch.
+    """
+    if isinstance(unifi_devs, list):
+        # format_network_data emits mapped devices in fetch order, so they must line up
+        # one to one with the fresh list, and its uplink links (to devices on the map)
+        # must be exactly the (uplink, device) pairs of the fresh list
+        position_lookup = load_unifi_position_lookup()
+        mapped = [dev for dev in unifi_devs if lookup_position(position_lookup, dev.get("mac")) is not None]
+        if len(mapped) != len(data["unifi"]):
+            return False
+        on_map = {dev["id"] for dev in data["unifi"]}
+        on_map.update(dev["id"] for dev in data["uisp"])
+        wired = {(link["from"], link["to"]) for link in data["links"] if link.get("type") == "wired_unifi"}
+        uplinked = 0
+        for dev, target in zip(mapped, data["unifi"]):
+            get = dev.get
+            mac = get("mac")
+            if mac != target["id"]:
+                return False
+            uplink_mac = get("uplink_mac") or (get("uplink") or {}).get("uplink_mac")
+            if uplink_mac and uplink_mac in on_map:
+                if (uplink_mac, mac) not in wired:
+                    return False
+                uplinked += 1
+            target["name"] = get("name", mac)
+            target["state"] = get("state", 1)
+            target["clients"] = get("num_sta", 0)
+            target["ip"] = get("ip")
+            target["version"] = get("version")
+            target["uptime"] = get("uptime")
+            target["tx_bytes"] = get("tx_bytes")
+            target["rx_bytes"] = get("rx_bytes")
+        if uplinked != len(wired):
+            return False
 
-    unifi_devices = []
-    unifi_clients = []
-    if UNIFI_URL and UNIFI_KEY:
-        unifi_col = UniFiCollector(UNIFI_URL, UNIFI_KEY, site=UNIFI_SITE)
-        unifi_devices = unifi_col.get_devices()
-        unifi_clients = unifi_col.get_clients()
+    if isinstance(uisp_devs, list):
+        fresh = {}
+        for dev in uisp_devs:
+            fresh[(dev.get("identification") or {}).get("id")] = dev.get("overview") or {}
+        for dev in data["uisp"]:
+            overview = fresh.get(dev["id"])
+            if overview is not None:
+                dev["state"] = overview.get("status")
+                dev["clients"] = overview.get("stationsCount", 0)
+        if isinstance(uisp_links, list):
+            own_signal = {
+                (datalink_end(link, "from"), datalink_end(link, "to")) for link in uisp_links if link.get("signal")
+            }
+            for link in data["links"]:
+                if "signal" in link and (link["from"], link["to"]) not in own_signal:
+                    overview = fresh.get(link["from"])
+                    if overview is not None:
+                        link["signal"] = overview.get("signal")
 
-    uisp_devices, uisp_sites, uisp_links = [], [], []
-    if UISP_URL and UISP_KEY:
-        coll = UISPCollector(UISP_URL, UISP_KEY)
-        uisp_devices = coll.get_devices()
-        uisp_sites = coll.get_sites()
-        uisp_links = coll.get_datalinks()
+    if unifi_clients is not None:
+        client_map = unifi_clients if isinstance(unifi_clients, dict) else group_clients(unifi_clients)
+        for dev in data["unifi"]:
+            dev["client_list"] = client_map.get(dev["id"], [])
+    return True
 
-    data = format_network_data(
-        unifi_devices, uisp_devices, uisp_sites, uisp_links, unifi_clients
-    )
 
-    with open("network_data.json", "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def write_cycle_metrics(record):
+    """Append the cycle record to METRICS_LOG and refresh the Prometheus textfile."""
+    try:
+        append_jsonl(METRICS_LOG, record, max_bytes=METRICS_LOG_MAX_BYTES)
+        if METRICS_TEXTFILE:
+            os.makedirs(os.path.dirname(METRICS_TEXTFILE) or ".", exist_ok=True)
+            write_atomic(METRICS_TEXTFILE, prometheus_text(record).encode("utf-8"))
+    except OSError as e:
+        print(f"[collector] could not write metrics: {e}")
+
+
+_topology = None
+
+
+def get_topology():
+    """Topology graph kept across cycles so link changes are applied incrementally."""
+    global _topology
+    if _topology is None:
+        _topology = TopologyGraph(extra_gateways=TOPOLOGY_GATEWAYS)
+    return _topology
+
+
+def write_topology(data):
+    """Update the topology graph and write TOPOLOGY_FILE if it changed. Returns update stats."""
+    topology = get_topology()
+    stats = topology.update(data)
+    payload = {"generated_at": iso_utc_now(), **topology.to_payload()}
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    write_if_changed(TOPOLOGY_FILE, body, siblings=True)
+    stats["gateways"] = len(payload["gateways"])
+    return stats
+
+
+# Rolling write volume per day; seeded from METRICS_LOG on first use
+_write_rate = None
+WRITE_RATE_SEED_CYCLES = 3000
+# Tile summary of the last generation written by this process, reused while the data is unchanged
+_last_tiles = None
+
 
-    snapshot = build_snapshot(data)
-    append_snapshot(snapshot)
-    timeline_24h_frames = write_timeline_24h()
-    timeline_7d_frames = write_timeline_7d()
-    timeline_30d_frames = write_timeline_30d()
+def get_write_rate():
+    global _write_rate
+    if _write_rate is None:
+        _write_rate = WriteRate()
+        _write_rate.seed(_read_log_tail(METRICS_LOG, WRITE_RATE_SEED_CYCLES))
+    return _write_rate
+
+
+class PollSchedule:
+    """
+    Tiered polling for the daemon: which POLL_TIERS are due on a tick, the latest
+    payload of every FETCH_KEYS entry, and the last formatted data that fast ticks patch.
+    """
+
+    def __init__(self, tiers=None):
+        self.tiers = tiers or POLL_TIERS
+        self.tick = min(every for _, every in self.tiers.values())
+        self.last = {}  # tier -> monotonic time of its last fetch
+        self.fetched = {key: [] for key in FETCH_KEYS}
+        self.fetched["unifi_clients"] = {}
+        self.data = None
+
+    def due(self, now):
+        """Tiers to fetch at `now`; half a tick of slack so clock jitter does not skip one."""
+        return [
+            name
+            for name, (_, every) in self.tiers.items()
+            if name not in self.last or now - self.last[name] >= every - self.tick / 2
+        ]
+
+    def keys(self, tiers):
+        return [key for name in tiers for key in self.tiers[name][0]]
+
+    def collect(self, fetched, tiers, now):
+        """
+        Take this tick's payloads. Returns (data, patched): the previous data patched in
+        place when only fast tiers were fetched and the devices still match, otherwise
+        a fresh format_network_data() of the latest payloads.
+        """
+        for name in tiers:
+            self.last[name] = now
+        for key in self.keys(tiers):
+            self.fetched[key] = fetched[key]
+        if self.data is not None and "topology" not in tiers:
+            if patch_network_data(
+                self.data,
+                unifi_devs=fetched["unifi_devices"] if "stats" in tiers else None,
+                uisp_devs=fetched["uisp_devices"] if "stats" in tiers else None,
+                unifi_clients=fetched["unifi_clients"] if "clients" in tiers else None,
+                uisp_links=self.fetched["uisp_links"],
+            ):
+                return self.data, True
+        self.data = format_network_data(
+            self.fetched["unifi_devices"],
+            self.fetched["uisp_devices"],
+            self.fetched["uisp_sites"],
+            self.fetched["uisp_links"],
+            self.fetched["unifi_clients"],
+        )
+        return self.data, False
+
+
+def run_cycle(collectors, schedule=None):
+    """
+    Run one collection cycle: fetch, format, write outputs and history. With a
+    PollSchedule only the due tiers are fetched (see PollSchedule.collect). The fetch
+    stage ends by CYCLE_DEADLINE_SECONDS; sources that miss it show their last good
+    data, marked stale. No history frame is recorded while a source has no data at all.
+    """
+    global _cycle_metrics, _last_tiles
+    metrics = _cycle_metrics = CycleMetrics()
+    ok = False
+    try:
+        response_cache = get_response_cache()
+        response_cache.reset_stats()
+        now = time.monotonic()
+        tiers = schedule.due(now) if schedule else list(POLL_TIERS)
+        with metrics.stage("fetch"):
+            fetched = fetch_all(
+                collectors,
+                keys=schedule.keys(tiers) if schedule else None,
+                deadline=now + CYCLE_DEADLINE_SECONDS if CYCLE_DEADLINE_SECONDS > 0 else None,
+            )
+        stale = stale_sources()
+        missing = sorted(source for source, info in stale.items() if info["missing"])
+
+        with metrics.stage("format"):
+            if schedule:
+                data, patched = schedule.collect(fetched, tiers, now)
+            else:
+                patched = False
+                data = format_network_data(
+                    fetched["unifi_devices"],
+                    fetched["uisp_devices"],
+                    fetched["uisp_sites"],
+                    fetched["uisp_links"],
+                    fetched["unifi_clients"],
+                )
+            stale_devices = mark_stale(data, stale)
+        metrics.set("poll_tiers", tiers)
+        metrics.set("format_patched", int(patched))
+        metrics.set("stale_sources", len(stale))
+        metrics.set("stale_devices", stale_devices)
+        metrics.set("missing_sources", len(missing))
+        metrics.set("circuit_open_sources", sum(info["circuit_open"] for info in stale.values()))
+
+        with metrics.stage("publish"):
+            published = publish_json(NETWORK_DATA, data, NETWORK_DATA_MANIFEST)
+        if published.get("skipped") and _last_tiles is not None:
+            tiles = {**_last_tiles, "skipped": True}
+            metrics.record_skip(TILES_DIR, tiles["bytes"])
+        else:
+            with metrics.stage("tiles"):
+                tiles = _last_tiles = write_tile_tree(data)
+        with metrics.stage("topology"):
+            topology = write_topology(data)
+
+        presence = None
+        if missing:
+            # A frame without these devices would read as an outage in the timelines
+            timeline_counts = dict.fromkeys((TIMELINE_24H, TIMELINE_7D, TIMELINE_30D), "skipped")
+        else:
+            with metrics.stage("snapshot"):
+                snapshot = build_snapshot(data)
+            with metrics.stage("history"):
+                timeline_counts = record_history(snapshot)
+                fresh_clients = not any(info["key"] == "unifi_clients" for info in stale.values())
+                # Client lists only change when polled
+                if CLIENT_PRESENCE and "clients" in tiers and fresh_clients:
+                    with metrics.stage("history:client_presence"):
+                        presence = record_client_presence(data)
+        timeline_24h_frames = timeline_counts.get(TIMELINE_24H, "off")
+        timeline_7d_frames = timeline_counts.get(TIMELINE_7D, "off")
+        timeline_30d_frames = timeline_counts.get(TIMELINE_30D, "off")
+
+        metrics.set("unifi_devices", len(data["unifi"]))
+        metrics.set("uisp_devices", len(data["uisp"]))
+        metrics.set("links", len(data["links"]))
+        metrics.set("topology_nodes", topology["nodes"])
+        metrics.set("topology_recomputed_nodes", topology["recomputed_nodes"])
+        if presence:
+            metrics.set("presence_clients_tracked", presence["tracked"])
+        for name, value in response_cache.stats.items():
+            metrics.set(f"uisp_cache_{name}", value)
+        ok = True
+    finally:
+        get_endpoint_cache().save()
+        save_last_good()
+        written, skipped = metrics.write_totals()
+        write_rate = get_write_rate()
+        write_rate.add(time.time(), written, skipped)
+        written_per_day, skipped_per_day = write_rate.per_day()
+        metrics.set("write_bytes", written)
+        metrics.set("write_bytes_skipped", skipped)
+        metrics.set("write_bytes_per_day", written_per_day)
+        metrics.set("write_bytes_skipped_per_day", skipped_per_day)
+        record = metrics.finish(ok)
+        write_cycle_metrics(record)
+
+    per_day = (
+        f"{written_per_day / 1e6:.1f} MB/day written, {skipped_per_day / 1e6:.1f} MB/day skipped"
+        if written_per_day is not None
+        else "per-day rate after the next cycle"
+    )
+    sources_line = (
+        f"Sources: {len(stale)} stale ({stale_devices} devices from last good data), "
+        f"{sum(info['circuit_open'] for info in stale.values())} circuit open"
+        + (f"; no data from {', '.join(missing)}, history not recorded" if missing else "")
+        + "\n"
+        if stale
+        else ""
+    )
+    presence_line = (
+        f"Client presence: {presence['clients']} clients now, {presence['tracked']} tracked over "
+        f"{PRESENCE_RETENTION_DAYS:g}d, log {presence['log_bytes']} bytes\n"
+        if presence
+        else ""
+    )
 
     print(
         f"\n--- Results ---\n"
         f"UniFi: {len(data['unifi'])} | UISP: {len(data['uisp'])} | "
         f"Links: {len(data['links'])}\n"
+        f"Polled: {', '.join(tiers)} ({'fast fields patched' if patched else 'full format'})\n"
+        f"{sources_line}"
+        f"{NETWORK_DATA}: {published['bytes']} bytes "
+        f"(gzip {published['gzip_bytes']}, br {published['br_bytes']})"
+        f"{' unchanged, not rewritten' if published.get('skipped') else ''}\n"
+        f"Tiles: {tiles['tiles']} tiles, {tiles['clients']} client files, "
+        f"{tiles['bytes']} bytes (generation {tiles['generation']})"
+        f"{' unchanged' if tiles.get('skipped') else ''}\n"
+        f"Topology: {topology['nodes']} nodes, {topology['gateways']} gateways, "
+        f"{topology['components']} components, {topology['recomputed_nodes']} nodes recomputed\n"
+        f"{presence_line}"
         f"Timeline frames — 24h: {timeline_24h_frames}, "
-        f"7d: {timeline_7d_frames}, 30d: {timeline_30d_frames}"
+        f"7d: {timeline_7d_frames}, 30d: {timeline_30d_frames}\n"
+        f"UISP cache — hits: {response_cache.stats['hits']}, "
+        f"304: {response_cache.stats['revalidated']}, "
+        f"misses: {response_cache.stats['misses']}\n"
+        f"Writes: {written} bytes, {skipped} bytes skipped as unchanged ({per_day})\n"
+        f"Cycle: {record['seconds']:.2f}s ("
+        + ", ".join(f"{st['name']} {st['seconds']:.2f}s" for st in record["stages"] if ":" not in st["name"])
+        + ")"
     )
 
 
+def run_daemon(interval, tiered=False):
+    """
+    Keep sessions open and run cycles on a fixed clock (start + k * interval),
+    so cycle duration does not accumulate as drift. Exits cleanly on SIGTERM/SIGINT.
+    With `tiered`, the clock ticks at the fastest POLL_TIERS cadence instead and each
+    tick fetches only the tiers that are due.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, _frame):
+        print(f"[collector] received signal {signum}, stopping after current cycle")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    collectors = build_collectors()
+    schedule = None
+    if tiered:
+        schedule = PollSchedule()
+        interval = schedule.tick
+        cadences = ", ".join(f"{name} {every:g}s" for name, (_, every) in schedule.tiers.items())
+        print(f"[collector] tiered polling: {cadences}")
+    print(f"[collector] daemon started, interval: {interval}s, controllers/sites: {len(collectors)}")
+    next_run = time.monotonic()
+    while not stop.is_set():
+        print(f"[collector] run at {iso_utc_now()}")
+        try:
+            run_cycle(collectors, schedule)
+        except Exception as e:
+            print(f"[collector] cycle failed: {e}")
+        next_run += interval
+        now = time.monotonic()
+        if next_run <= now:
+            missed = int((now - next_run) // interval) + 1
+            print(f"[collector] cycle overran, skipping {missed} slot(s)")
+            next_run += missed * interval
+        stop.wait(next_run - now)
+
+    for col in collectors:
+        col.session.close()
+    print("[collector] daemon stopped")
+
+
+def run(args, parser):
+    """Dispatch the parsed command line (import, daemon or a single cycle)."""
+    if args.import_history:
+        import_history(args.import_history)
+        return
+
+    if args.daemon:
+        if args.interval <= 0:
+            parser.error("--interval must be positive")
+        run_daemon(args.interval, tiered=args.tiered)
+        return
+
+    run_cycle(build_collectors())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect UniFi/UISP network data for the map.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep running and collect every --interval seconds",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=float(os.getenv("COLLECT_INTERVAL_SECONDS", "300")),
+        help="seconds between cycles in daemon mode (default: $COLLECT_INTERVAL_SECONDS or 300)",
+    )
+    parser.add_argument(
+        "--tiered",
+        action=argparse.BooleanOptionalAction,
+        default=TIERED_POLLING,
+        help="daemon mode: poll stats, clients and topology at their own POLL_*_SECONDS cadences "
+        "instead of everything every --interval (default: $TIERED_POLLING or off)",
+    )
+    parser.add_argument(
+        "--import-history",
+        nargs="?",
+        const=SNAPSHOT_LOG,
+        metavar="JSONL",
+        help=f"import a snapshot log into {HISTORY_DB} and exit (default: {SNAPSHOT_LOG})",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PSTATS",
+        help="run under cProfile, save stats to PSTATS and print the top functions",
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            run(args, parser)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+            print(f"[collector] profile saved to {args.profile}")
+        return
+    run(args, parser)
+
+
 if __name__ == "__main__":
     main()
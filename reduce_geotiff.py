@@ -1,103 +1,515 @@
 """
+Уменьшение GeoTIFF (ортофото из OpenDroneMap) с сохранением геопривязки.
 
+Режимы:
+- блочный (по умолчанию): выход обрабатывается блоками 256×256, выровненными по
+  тайлам выходного файла, в пуле процессов — память ограничена, есть прогресс;
+- однопроходный (--single-pass): каждый канал читается целиком, как раньше;
+- --cog: результат сохраняется как Cloud Optimized GeoTIFF с внутренними обзорами,
+  браузер догружает по HTTP Range только нужные тайлы и уровни;
+- --xyz DIR: вместо уменьшения — статическая пирамида тайлов XYZ (PNG/WebP).
 
 Использование:
     python reduce_geotiff.py
+    python reduce_geotiff.py --input odm/odm_orthophoto.tif --scale 0.3 --workers 4
+    python reduce_geotiff.py --single-pass
+    python reduce_geotiff.py --verify odm/odm_orthophoto_reduced_single.tif
+    python reduce_geotiff.py --cog --scale 1.0
+    python reduce_geotiff.py --xyz odm/tiles --xyz-format webp
 """
 
+import argparse
+import json
+import math
+import os
+import shutil
 import sys
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 
 try:
     import rasterio
+    import rasterio.shutil
     from rasterio.enums import Resampling
+    from rasterio.errors import NotGeoreferencedWarning
+    from rasterio.transform import from_bounds
+    from rasterio.vrt import WarpedVRT
+    from rasterio.warp import transform_bounds
+    from rasterio.windows import Window
 except ImportError:
     print("❌ Установите rasterio: pip install rasterio")
     sys.exit(1)
 
-def reduce_geotiff(input_path, output_path, scale_factor=0.3):
+from spatial_tiles import lonlat_to_tile
+
+# Размер блока выходного файла (blockxsize / blockysize) и единица работы пула
+BLOCK_SIZE = 256
+# Кэш GDAL на процесс, МБ: вместе с числом процессов задаёт потолок памяти
+WORKER_CACHE_MB = 256
+# Сколько блоков на процесс может одновременно находиться в работе
+BLOCKS_IN_FLIGHT_PER_WORKER = 2
+# Сжатие COG (как у обычного результата) и ресемплинг обзоров
+COG_OPTIONS = {
+    'COMPRESS': 'JPEG',
+    'QUALITY': 85,
+    'BLOCKSIZE': BLOCK_SIZE,
+    'OVERVIEW_RESAMPLING': 'AVERAGE',
+}
+# Пирамида XYZ: размер тайла, параметры драйверов GDAL
+XYZ_TILE_SIZE = 256
+XYZ_FORMATS = {
+    'webp': ('WEBP', {'QUALITY': 85}),
+    'png': ('PNG', {'ZLEVEL': 6}),
+}
+# Половина длины экватора в EPSG:3857, м
+MERCATOR_HALF = 20037508.342789244
+
+
+def output_size(src, scale_factor):
+    return int(src.width * scale_factor), int(src.height * scale_factor)
+
+
+def output_profile(src, new_width, new_height, compress='jpeg'):
+    """
+    Профиль выходного файла: новая геопривязка, JPEG, тайлы BLOCK_SIZE×BLOCK_SIZE.
+    compress='deflate' — без потерь, для промежуточного файла COG: JPEG при сборке
+    COG тогда применяется один раз, а не поверх уже сжатых с потерями блоков.
+    """
+    # Новые параметры трансформации (геопривязка сохраняется!)
+    transform = src.transform * src.transform.scale(
+        (src.width / new_width),
+        (src.height / new_height)
+    )
+    profile = src.profile.copy()
+    profile.update({
+        'width': new_width,
+        'height': new_height,
+        'transform': transform,
+        'compress': 'jpeg',  # Сжатие для уменьшения размера
+        'jpeg_quality': 85,
+        'tiled': True,  # Тайлинг для лучшей производительности
+        'blockxsize': BLOCK_SIZE,
+        'blockysize': BLOCK_SIZE,
+    })
+    if compress == 'deflate':
+        profile.pop('jpeg_quality')
+        profile.update({'compress': 'deflate', 'predictor': 2})
+        # YCbCr бывает только у JPEG
+        if str(profile.get('photometric', '')).lower() == 'ycbcr':
+            profile.pop('photometric')
+    return profile
+
+
+def output_blocks(width, height, block=BLOCK_SIZE):
+    """Окна выходного растра (row_off, col_off, height, width), выровненные по блокам."""
+    for row in range(0, height, block):
+        for col in range(0, width, block):
+            yield row, col, min(block, height - row), min(block, width - col)
+
+
+def print_summary(input_path, output_path):
+    old_size = input_path.stat().st_size / 1024 / 1024
+    new_size = output_path.stat().st_size / 1024 / 1024
+
+    print(f"✅ Готово!")
+    print(f"   Исходный: {old_size:.1f} MB")
+    print(f"   Новый: {new_size:.1f} MB")
+    print(f"   Уменьшение: {old_size / new_size:.1f}x")
+    print(f"   Геопривязка сохранена ✓")
+
+
+def reduce_geotiff(input_path, output_path, scale_factor=0.3, compress='jpeg'):
     """
     Уменьшает GeoTIFF в scale_factor раз (0.3 = 30% от оригинала).
     Сохраняет всю геопривязку (координаты, проекцию).
-    
+    Каждый канал читается целиком — для больших файлов см. reduce_geotiff_windowed.
+
     Args:
         input_path: путь к исходному GeoTIFF
         output_path: путь для сохранения уменьшенного файла
         scale_factor: коэффициент уменьшения (0.3 = уменьшить до 30%)
+        compress: 'jpeg' или 'deflate' (см. output_profile)
     """
     input_path = Path(input_path)
     output_path = Path(output_path)
-    
+
     if not input_path.exists():
         print(f"❌ Файл не найден: {input_path}")
         return False
-    
+
     print(f"📥 Загружаю: {input_path}")
     print(f"   Размер: {input_path.stat().st_size / 1024 / 1024:.1f} MB")
-    
+
     with rasterio.open(input_path) as src:
         # Вычисляем новые размеры
-        new_width = int(src.width * scale_factor)
-        new_height = int(src.height * scale_factor)
-        
+        new_width, new_height = output_size(src, scale_factor)
+
         print(f"📐 Исходное разрешение: {src.width} x {src.height}")
         print(f"📐 Новое разрешение: {new_width} x {new_height}")
-        
-        # Новые параметры трансформации (геопривязка сохраняется!)
-        transform = src.transform * src.transform.scale(
-            (src.width / new_width),
-            (src.height / new_height)
-        )
-        
-        # Создаем профиль для выходного файла
-        profile = src.profile.copy()
-        profile.update({
-            'width': new_width,
-            'height': new_height,
-            'transform': transform,
-            'compress': 'jpeg',  # Сжатие для уменьшения размера
-            'jpeg_quality': 85,
-            'tiled': True,  # Тайлинг для лучшей производительности
-            'blockxsize': 256,
-            'blockysize': 256,
-        })
-        
+
+        profile = output_profile(src, new_width, new_height, compress)
+
         print(f"📤 Сохраняю: {output_path}")
-        
+
         with rasterio.open(output_path, 'w', **profile) as dst:
             # Пересчитываем данные с ресемплингом
             for i in range(1, src.count + 1):
                 data = src.read(
-                    i, 
-                    out_shape=(new_height, new_width), 
+                    i,
+                    out_shape=(new_height, new_width),
                     resampling=Resampling.bilinear  # Билинейная интерполяция для качества
                 )
                 dst.write(data, i)
-        
-        old_size = input_path.stat().st_size / 1024 / 1024
-        new_size = output_path.stat().st_size / 1024 / 1024
-        
-        print(f"✅ Готово!")
-        print(f"   Исходный: {old_size:.1f} MB")
-        print(f"   Новый: {new_size:.1f} MB")
-        print(f"   Уменьшение: {old_size / new_size:.1f}x")
-        print(f"   Геопривязка сохранена ✓")
-        return True
+
+    print_summary(input_path, output_path)
+    return True
+
+
+# Состояние процесса пула: исходный файл открывается один раз на процесс
+_worker_src = None
+_worker_env = None
+
+
+def _init_worker(input_path, cache_mb):
+    global _worker_src, _worker_env
+    # Без .aux.xml рядом с тайлами PNG/WebP
+    _worker_env = rasterio.Env(GDAL_CACHEMAX=cache_mb, GDAL_PAM_ENABLED='NO')
+    _worker_env.__enter__()
+    warnings.filterwarnings('ignore', category=NotGeoreferencedWarning)
+    _worker_src = rasterio.open(input_path)
+
+
+def _read_block(task):
+    """
+    Один выходной блок всех каналов. Окно источника — то же дробное окно, которое
+    покрывает блок при чтении канала целиком, поэтому ресемплинг совпадает.
+    """
+    row_off, col_off, height, width, scale_x, scale_y = task
+    src_window = Window(col_off * scale_x, row_off * scale_y, width * scale_x, height * scale_y)
+    data = _worker_src.read(
+        window=src_window,
+        out_shape=(_worker_src.count, height, width),
+        resampling=Resampling.bilinear,
+    )
+    return row_off, col_off, data
+
+
+def _print_progress(done, total, started):
+    elapsed = time.monotonic() - started
+    eta = elapsed / done * (total - done) if done else 0
+    print(
+        f"\r⏳ Блоки: {done}/{total} ({done * 100 / total:.0f}%), "
+        f"{elapsed:.0f} с, осталось ~{eta:.0f} с",
+        end="",
+        flush=True,
+    )
+
+
+def reduce_geotiff_windowed(input_path, output_path, scale_factor=0.3, workers=None,
+                            cache_mb=WORKER_CACHE_MB, compress='jpeg'):
+    """
+    То же, что reduce_geotiff, но блоками BLOCK_SIZE×BLOCK_SIZE выходного файла в пуле
+    процессов. В памяти одновременно не больше workers × BLOCKS_IN_FLIGHT_PER_WORKER
+    блоков плюс кэш GDAL каждого процесса (cache_mb). Запись идёт из главного процесса.
+
+    Args:
+        input_path: путь к исходному GeoTIFF
+        output_path: путь для сохранения уменьшенного файла
+        scale_factor: коэффициент уменьшения (0.3 = уменьшить до 30%)
+        workers: число процессов (по умолчанию — число ядер)
+        cache_mb: GDAL_CACHEMAX каждого процесса, МБ
+        compress: 'jpeg' или 'deflate' (см. output_profile)
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+
+    if not input_path.exists():
+        print(f"❌ Файл не найден: {input_path}")
+        return False
+
+    workers = workers or os.cpu_count() or 1
+    print(f"📥 Загружаю: {input_path}")
+    print(f"   Размер: {input_path.stat().st_size / 1024 / 1024:.1f} MB")
+
+    with rasterio.open(input_path) as src:
+        new_width, new_height = output_size(src, scale_factor)
+        print(f"📐 Исходное разрешение: {src.width} x {src.height}")
+        print(f"📐 Новое разрешение: {new_width} x {new_height}")
+        profile = output_profile(src, new_width, new_height, compress)
+        scale_x = src.width / new_width
+        scale_y = src.height / new_height
+
+    blocks = list(output_blocks(new_width, new_height))
+    total = len(blocks)
+    max_in_flight = workers * BLOCKS_IN_FLIGHT_PER_WORKER
+    print(f"📤 Сохраняю: {output_path}")
+    print(f"   Блоков {BLOCK_SIZE}x{BLOCK_SIZE}: {total}, процессов: {workers}")
+
+    started = time.monotonic()
+    done = 0
+    with rasterio.Env(GDAL_CACHEMAX=cache_mb), \
+            rasterio.open(output_path, 'w', **profile) as dst, \
+            ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(str(input_path), cache_mb),
+            ) as pool:
+
+        def write_finished(futures):
+            nonlocal done
+            for future in futures:
+                row_off, col_off, data = future.result()
+                height, width = data.shape[1:]
+                dst.write(data, window=Window(col_off, row_off, width, height))
+                done += 1
+            _print_progress(done, total, started)
+
+        pending = set()
+        for row_off, col_off, height, width in blocks:
+            pending.add(pool.submit(_read_block, (row_off, col_off, height, width, scale_x, scale_y)))
+            if len(pending) >= max_in_flight:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write_finished(finished)
+        write_finished(pending)
+    print()
+
+    print_summary(input_path, output_path)
+    print(f"   Время: {time.monotonic() - started:.1f} с")
+    return True
+
+
+def overview_factors(width, height, min_size=BLOCK_SIZE):
+    """Уровни обзоров 2, 4, 8, ... пока обзор не станет меньше одного блока."""
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= min_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def write_cog(input_path, output_path):
+    """
+    Пересохраняет GeoTIFF как Cloud Optimized GeoTIFF: тайлы BLOCK_SIZE×BLOCK_SIZE,
+    внутренние обзоры и порядок IFD, удобный для чтения по HTTP Range.
+    GDAL >= 3.1 — драйвер COG, иначе GTiff с COPY_SRC_OVERVIEWS.
+    """
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    with rasterio.Env() as env:
+        has_cog_driver = 'COG' in env.drivers()
+
+    if has_cog_driver:
+        rasterio.shutil.copy(input_path, output_path, driver='COG', **COG_OPTIONS)
+    else:
+        # Обзоры строятся во временной копии и переносятся в начало файла
+        tmp = output_path.with_name(output_path.stem + '.ovr.tmp.tif')
+        shutil.copyfile(input_path, tmp)
+        try:
+            with rasterio.open(tmp, 'r+') as dst:
+                dst.build_overviews(overview_factors(dst.width, dst.height), Resampling.average)
+            rasterio.shutil.copy(
+                tmp, output_path, driver='GTiff', COPY_SRC_OVERVIEWS='YES', TILED='YES',
+                BLOCKXSIZE=BLOCK_SIZE, BLOCKYSIZE=BLOCK_SIZE, COMPRESS='JPEG', JPEG_QUALITY=85,
+            )
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    with rasterio.open(output_path) as cog:
+        levels = cog.overviews(1)
+    print(f"🗺  COG: {output_path}, обзоры: {', '.join(f'1/{f}' for f in levels) or 'нет'}")
+    return True
+
+
+def mercator_tile_bounds(z, x, y):
+    """Границы тайла XYZ в EPSG:3857: (west, south, east, north)."""
+    size = 2 * MERCATOR_HALF / 2 ** z
+    return (
+        -MERCATOR_HALF + x * size,
+        MERCATOR_HALF - (y + 1) * size,
+        -MERCATOR_HALF + (x + 1) * size,
+        MERCATOR_HALF - y * size,
+    )
+
+
+def _render_tile(task):
+    """Один тайл XYZ через WarpedVRT в EPSG:3857. Пустые (прозрачные) тайлы не пишутся."""
+    z, x, y, out_dir, fmt = task
+    driver, options = XYZ_FORMATS[fmt]
+    transform = from_bounds(*mercator_tile_bounds(z, x, y), XYZ_TILE_SIZE, XYZ_TILE_SIZE)
+    with WarpedVRT(
+        _worker_src,
+        crs='EPSG:3857',
+        transform=transform,
+        width=XYZ_TILE_SIZE,
+        height=XYZ_TILE_SIZE,
+        resampling=Resampling.bilinear,
+        add_alpha=_worker_src.count == 3,
+    ) as vrt:
+        data = vrt.read()
+    if data.shape[0] == 4 and not data[3].any():
+        return False
+    tile_dir = os.path.join(out_dir, str(z), str(x))
+    os.makedirs(tile_dir, exist_ok=True)
+    path = os.path.join(tile_dir, f"{y}.{fmt}")
+    with rasterio.open(
+        path, 'w', driver=driver, width=XYZ_TILE_SIZE, height=XYZ_TILE_SIZE,
+        count=data.shape[0], dtype=data.dtype, **options,
+    ) as dst:
+        dst.write(data)
+    return True
+
+
+def export_xyz_tiles(input_path, out_dir, min_zoom=None, max_zoom=None, fmt='webp',
+                     workers=None, cache_mb=WORKER_CACHE_MB):
+    """
+    Статическая пирамида тайлов {z}/{x}/{y}.png|webp (схема XYZ, как у подложки карты)
+    из исходного GeoTIFF, в пуле процессов. max_zoom по умолчанию — уровень, где пиксель
+    тайла примерно равен пикселю исходника; min_zoom — на 6 уровней меньше.
+    Рядом пишется metadata.json (границы и уровни) для map.js.
+    """
+    input_path = Path(input_path)
+    if not input_path.exists():
+        print(f"❌ Файл не найден: {input_path}")
+        return False
+    workers = workers or os.cpu_count() or 1
+
+    with rasterio.open(input_path) as src:
+        west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds)
+        with WarpedVRT(src, crs='EPSG:3857') as vrt:
+            native_res = vrt.res[0]
+    if max_zoom is None:
+        max_zoom = math.ceil(math.log2(2 * MERCATOR_HALF / (XYZ_TILE_SIZE * native_res)))
+    if min_zoom is None:
+        min_zoom = max(0, max_zoom - 6)
+
+    tasks = []
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = (int(v) for v in lonlat_to_tile(west, north, z))
+        x1, y1 = (int(v) for v in lonlat_to_tile(east, south, z))
+        tasks.extend((z, x, y, str(out_dir), fmt) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    total = len(tasks)
+    print(f"🧱 Пирамида XYZ: {out_dir}, уровни {min_zoom}–{max_zoom}, тайлов: {total}, процессов: {workers}")
+    started = time.monotonic()
+    done = written = 0
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(str(input_path), cache_mb),
+    ) as pool:
+        for ok in pool.map(_render_tile, tasks, chunksize=8):
+            done += 1
+            written += 1 if ok else 0
+            if done % 50 == 0 or done == total:
+                _print_progress(done, total, started)
+    print()
+
+    metadata = {
+        'format': fmt,
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'bounds': [west, south, east, north],
+        'tiles': written,
+    }
+    with open(os.path.join(out_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"✅ Готово! Записано тайлов: {written} (пустые пропущены), {time.monotonic() - started:.1f} с")
+    return True
+
+
+def compare_geotiffs(path_a, path_b):
+    """
+    Поблочно сравнивает два растра одинакового размера.
+    Возвращает максимальное расхождение по модулю (0 — файлы совпадают).
+    """
+    with rasterio.open(path_a) as a, rasterio.open(path_b) as b:
+        if (a.width, a.height, a.count) != (b.width, b.height, b.count):
+            print(f"❌ Размеры различаются: {a.width}x{a.height}x{a.count} и {b.width}x{b.height}x{b.count}")
+            return None
+        if a.transform != b.transform or a.crs != b.crs:
+            print("❌ Геопривязка различается")
+            return None
+        max_diff = 0
+        for row_off, col_off, height, width in output_blocks(a.width, a.height):
+            window = Window(col_off, row_off, width, height)
+            diff = abs(a.read(window=window).astype("int64") - b.read(window=window).astype("int64"))
+            max_diff = max(max_diff, int(diff.max()))
+        return max_diff
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Уменьшение GeoTIFF с сохранением геопривязки")
+    parser.add_argument("--input", default="odm/odm_orthophoto.tif", help="исходный GeoTIFF")
+    parser.add_argument("--output", default="odm/odm_orthophoto_reduced.tif", help="результат")
+    # 0.3 = 30% от оригинала (примерно 50-60 MB); 0.5 = 50%, 0.2 = 20% (меньше размер, ниже качество)
+    parser.add_argument("--scale", type=float, default=0.3, help="коэффициент уменьшения")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--cache-mb", type=int, default=WORKER_CACHE_MB, help="GDAL_CACHEMAX на процесс, МБ")
+    parser.add_argument("--single-pass", action="store_true", help="старый режим: каждый канал целиком")
+    parser.add_argument(
+        "--verify",
+        metavar="REFERENCE",
+        help="после обработки сравнить результат с файлом однопроходного режима (с теми же --scale и --cog)",
+    )
+    parser.add_argument("--cog", action="store_true", help="сохранить результат как COG с обзорами")
+    parser.add_argument("--xyz", metavar="DIR", help="вместо уменьшения — пирамида тайлов XYZ в DIR")
+    parser.add_argument("--xyz-format", choices=sorted(XYZ_FORMATS), default="webp", help="формат тайлов")
+    parser.add_argument("--min-zoom", type=int, default=None, help="минимальный уровень XYZ")
+    parser.add_argument("--max-zoom", type=int, default=None, help="максимальный уровень XYZ")
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
-    input_file = 'odm/odm_orthophoto.tif'
-    output_file = 'odm/odm_orthophoto_reduced.tif'
-    
-    # Коэффициент уменьшения: 0.3 = 30% от оригинала (примерно 50-60 MB)
-    # Можно изменить: 0.5 = 50%, 0.2 = 20% (меньше размер, но ниже качество)
-    scale = 0.3
-    
+    args = parse_args()
+
     print("=" * 60)
     print("Уменьшение GeoTIFF с сохранением геопривязки")
     print("=" * 60)
-    
-    if reduce_geotiff(input_file, output_file, scale):
+
+    if args.xyz:
+        if not export_xyz_tiles(args.input, args.xyz, args.min_zoom, args.max_zoom,
+                                args.xyz_format, args.workers, args.cache_mb):
+            print("\n❌ Ошибка при обработке файла")
+            sys.exit(1)
         print("\n💡 Теперь обновите map.js:")
-        print(f"   const DRONE_GEOTIFF_URL = 'odm/odm_orthophoto_reduced.tif';")
+        with open(os.path.join(args.xyz, 'metadata.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        print(f"   const DRONE_XYZ = {{ url: '{args.xyz}/{{z}}/{{x}}/{{y}}.{args.xyz_format}', "
+              f"minZoom: {meta['minzoom']}, maxZoom: {meta['maxzoom']} }};")
+        sys.exit(0)
+
+    # COG собирается из промежуточного файла без потерь (DEFLATE): JPEG применяется
+    # один раз, при записи COG
+    reduced = Path(args.output)
+    compress = 'jpeg'
+    if args.cog:
+        reduced = reduced.with_name(reduced.stem + '.tmp.tif')
+        compress = 'deflate'
+
+    if args.single_pass:
+        ok = reduce_geotiff(args.input, reduced, args.scale, compress)
     else:
+        ok = reduce_geotiff_windowed(args.input, reduced, args.scale, args.workers, args.cache_mb, compress)
+
+    if not ok:
         print("\n❌ Ошибка при обработке файла")
+        sys.exit(1)
+
+    if args.cog:
+        try:
+            write_cog(reduced, args.output)
+        finally:
+            reduced.unlink(missing_ok=True)
+
+    if args.verify:
+        diff = compare_geotiffs(args.verify, args.output)
+        if diff is None or diff > 0:
+            print(f"\n❌ Результат отличается от {args.verify} (макс. расхождение: {diff})")
+            sys.exit(1)
+        print(f"\n✓ Совпадает с {args.verify}")
+
+    print("\n💡 Теперь обновите map.js:")
+    print(f"   const DRONE_GEOTIFF_URL = '{args.output}';")
@@ -0,0 +1,229 @@
+"""
+Spatial tiles of the formatted network for the map (stdlib only).
+
+Devices are bucketed into Web Mercator XYZ tiles (the same z/x/y scheme as the
+base map) and written as GeoJSON FeatureCollections:
+
+- zooms below the detail zoom: grid clusters (count, online/offline, per source)
+  per cell of a tile, so a zoomed-out view is a handful of points;
+- the detail zoom: every device (without client_list) and every link whose
+  bounding box touches the tile; the map reuses these tiles when zoomed further in.
+
+Client lists go to one small file per device, loaded when the device is selected.
+Each run writes a new generation directory and then swaps index.json to it, so a
+browser never mixes tiles from two cycles. A generation is removed once it has been
+superseded for TILE_KEEP_SECONDS; the map re-reads index.json when a tile is gone.
+"""
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import shutil
+import threading
+import time
+
+TILES_DIR = "tiles"
+TILE_INDEX = "index.json"
+TILE_MIN_ZOOM = 10
+# ~1.2 km wide tiles at Bombay Beach: the whole network is a few tiles
+TILE_DETAIL_ZOOM = 15
+# Cluster grid per tile side (4 -> 64 px cells on 256 px tiles)
+CLUSTER_CELLS = 4
+# Links spanning more tiles than this are only indexed at their endpoints
+MAX_LINK_TILES = 64
+# Superseded generations stay this long for browsers still paging in their tiles
+TILE_KEEP_SECONDS = float(os.getenv("TILE_KEEP_SECONDS", "900"))
+
+_generation_seq = itertools.count()
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Fractional XYZ tile coordinates of a WGS84 point."""
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    rad = math.radians(lat)
+    y = (1.0 - math.log(math.tan(rad) + 1.0 / math.cos(rad)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def client_file(dev_id):
+    """File name (under clients/) for a device's client list; IDs may contain ':' and '/'."""
+    return hashlib.sha1(str(dev_id).encode("utf-8")).hexdigest()[:16] + ".json"
+
+
+def _devices(data):
+    """(source, device) pairs with coordinates."""
+    for source in ("unifi", "uisp"):
+        for dev in data.get(source) or []:
+            if dev.get("lat") is not None and dev.get("lon") is not None:
+                yield source, dev
+
+
+def _is_online(source, dev):
+    return dev.get("state") == "active" if source == "uisp" else dev.get("state") == 1
+
+
+def build_tiles(data, min_zoom=TILE_MIN_ZOOM, detail_zoom=TILE_DETAIL_ZOOM, cells=CLUSTER_CELLS):
+    """
+    Returns (tiles, clients): tiles maps (z, x, y) -> list of GeoJSON features,
+    clients maps client file name -> client_list for devices that have one.
+    """
+    tiles = {}
+    clients = {}
+    positions = {}
+
+    for source, dev in _devices(data):
+        lon, lat = float(dev["lon"]), float(dev["lat"])
+        positions[dev.get("id")] = (lon, lat)
+        props = {k: v for k, v in dev.items() if k != "client_list"}
+        props["source"] = source
+        if dev.get("client_list"):
+            name = client_file(dev.get("id"))
+            clients[name] = dev["client_list"]
+            props["clients_file"] = name
+        fx, fy = lonlat_to_tile(lon, lat, detail_zoom)
+        tiles.setdefault((detail_zoom, int(fx), int(fy)), []).append(
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": props}
+        )
+
+    for link in data.get("links") or []:
+        a, b = positions.get(link.get("from")), positions.get(link.get("to"))
+        if not a or not b:
+            continue
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": [list(a), list(b)]},
+            "properties": dict(link),
+        }
+        ax, ay = (int(v) for v in lonlat_to_tile(a[0], a[1], detail_zoom))
+        bx, by = (int(v) for v in lonlat_to_tile(b[0], b[1], detail_zoom))
+        xs, ys = range(min(ax, bx), max(ax, bx) + 1), range(min(ay, by), max(ay, by) + 1)
+        if len(xs) * len(ys) <= MAX_LINK_TILES:
+            keys = {(detail_zoom, x, y) for x in xs for y in ys}
+        else:
+            keys = {(detail_zoom, ax, ay), (detail_zoom, bx, by)}
+        for key in keys:
+            tiles.setdefault(key, []).append(feature)
+
+    for zoom in range(min_zoom, detail_zoom):
+        grid = {}
+        for source, dev in _devices(data):
+            lon, lat = float(dev["lon"]), float(dev["lat"])
+            fx, fy = lonlat_to_tile(lon, lat, zoom)
+            cell = (int(fx), int(fy), int(fx * cells) % cells, int(fy * cells) % cells)
+            c = grid.setdefault(cell, {"count": 0, "online": 0, "unifi": 0, "uisp": 0, "lon": 0.0, "lat": 0.0, "ids": []})
+            c["count"] += 1
+            c["online"] += 1 if _is_online(source, dev) else 0
+            c[source] += 1
+            c["lon"] += lon
+            c["lat"] += lat
+            if len(c["ids"]) < 2:
+                c["ids"].append(dev.get("id"))
+        for (x, y, _cx, _cy), c in grid.items():
+            props = {
+                "cluster": True,
+                "count": c["count"],
+                "online": c["online"],
+                "offline": c["count"] - c["online"],
+                "unifi": c["unifi"],
+                "uisp": c["uisp"],
+            }
+            if c["count"] == 1:
+                props["id"] = c["ids"][0]
+            tiles.setdefault((zoom, x, y), []).append(
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": [c["lon"] / c["count"], c["lat"] / c["count"]],
+                    },
+                    "properties": props,
+                }
+            )
+    return tiles, clients
+
+
+def _write_atomic(path, body):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def _dump(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _new_generation(root):
+    """Create and return (name, path) of a fresh generation directory; never reuses one."""
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    while True:
+        generation = f"{stamp}-{os.getpid()}-{next(_generation_seq)}"
+        gen_dir = os.path.join(root, generation)
+        try:
+            os.makedirs(gen_dir)
+        except FileExistsError:
+            continue
+        return generation, gen_dir
+
+
+def _remove_old_generations(root, current, keep_seconds=TILE_KEEP_SECONDS):
+    """
+    Delete generations superseded more than keep_seconds ago. A generation is
+    superseded when the next one is created (its directory mtime), so a browser that
+    loaded index.json just before a swap still has keep_seconds to fetch its tiles.
+    """
+    generations = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name != current and name[:1].isdigit() and os.path.isdir(path):
+            generations.append((os.path.getmtime(path), name))
+    generations.sort()
+    now = time.time()
+    newer = [mtime for mtime, _ in generations[1:]] + [os.path.getmtime(os.path.join(root, current))]
+    for (_, name), superseded_at in zip(generations, newer):
+        if now - superseded_at > keep_seconds:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def write_tiles(data, root=TILES_DIR, min_zoom=TILE_MIN_ZOOM, detail_zoom=TILE_DETAIL_ZOOM, write=None):
+    """
+    Write one generation of tiles and client files under root/<generation>/ and point
+    root/index.json at it. `write(path, bytes)` defaults to an atomic write.
+    Returns {"generation", "tiles", "clients", "bytes"}.
+    """
+    write = write or _write_atomic
+    tiles, clients = build_tiles(data, min_zoom, detail_zoom)
+    generation, gen_dir = _new_generation(root)
+
+    total = 0
+    listing = {}
+    for (z, x, y), features in tiles.items():
+        os.makedirs(os.path.join(gen_dir, str(z), str(x)), exist_ok=True)
+        body = _dump({"type": "FeatureCollection", "features": features})
+        write(os.path.join(gen_dir, str(z), str(x), f"{y}.json"), body)
+        total += len(body)
+        listing.setdefault(str(z), []).append(f"{x}/{y}")
+    if clients:
+        os.makedirs(os.path.join(gen_dir, "clients"), exist_ok=True)
+    for name, client_list in clients.items():
+        body = _dump(client_list)
+        write(os.path.join(gen_dir, "clients", name), body)
+        total += len(body)
+
+    index = {
+        "generation": generation,
+        "min_zoom": min_zoom,
+        "detail_zoom": detail_zoom,
+        "map_metadata": data.get("map_metadata") or {},
+        "tiles": {z: sorted(keys) for z, keys in sorted(listing.items())},
+    }
+    os.makedirs(root, exist_ok=True)
+    write(os.path.join(root, TILE_INDEX), _dump(index))
+
+    _remove_old_generations(root, generation)
+
+    return {"generation": generation, "tiles": len(tiles), "clients": len(clients), "bytes": total}
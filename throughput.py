@@ -0,0 +1,371 @@
+"""
+Throughput rates from the cumulative tx_bytes / rx_bytes counters in snapshot frames.
+
+The frames of a timeline become a [frame][device] counter matrix and are differenced
+in one array pass (NumPy when installed, the same arithmetic in pure Python
+otherwise). A counter that goes down is a reset (reboot, wrap, controller re-adopt):
+its new value is taken as the increase since the reset, as Prometheus' rate() does.
+Per frame the block also carries network-wide totals and the top-N busiest devices.
+ThroughputSeries keeps the rows of a timeline between writes, so a new bucket only
+costs its own row, and gives blocks for any run of buckets (a timeline segment).
+"""
+
+import heapq
+from datetime import datetime
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python path gives the same results
+    np = None
+
+THROUGHPUT_TOP_N = 10
+
+
+def _epoch(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def rate_matrix(ts, counters, use_numpy=None):
+    """
+    Rates (units/s, rounded to int) from cumulative counters: counters[f][e] is entity
+    e's value in frame f (None, or NaN in an array, when missing) and ts[f] the frame
+    time in epoch seconds.
+    Frame 0, and any pair of frames where either sample is missing, give None.
+    Returns (rates, resets) with rates shaped like counters.
+    """
+    if len(counters) == 0:
+        return [], 0
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        rates, resets = _rates_numpy(ts, np.array(counters, dtype=float))  # None -> nan
+        return _to_lists(rates), resets
+    width = len(counters[0])
+    rates = [[None] * width]
+    resets = 0
+    for f in range(1, len(counters)):
+        row = [None] * width
+        dt = ts[f] - ts[f - 1]
+        if dt > 0:
+            for e, (before, now) in enumerate(zip(counters[f - 1], counters[f])):
+                if before is None or now is None:
+                    continue
+                increase = now - before
+                if increase < 0:
+                    increase = now
+                    resets += 1
+                row[e] = round(increase / dt)
+        rates.append(row)
+    return rates, resets
+
+
+def _rates_numpy(ts, values):
+    """Float rate array (NaN = no rate) and reset count from a counter array."""
+    dt = np.diff(np.array(ts, dtype=float))[:, None]
+    increase = values[1:] - values[:-1]
+    reset = increase < 0  # nan compares False
+    increase = np.where(reset, values[1:], increase)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(dt > 0, increase / dt, np.nan)
+    rates = np.rint(np.vstack([np.full((1, values.shape[1]), np.nan), rates]))
+    resets = int(np.count_nonzero(reset & ~np.isnan(rates[1:])))
+    return rates, resets
+
+
+def _to_lists(rates):
+    """Nested lists of ints with None for NaN, for JSON."""
+    valid = ~np.isnan(rates)
+    out = np.full(rates.shape, None, dtype=object)
+    out[valid] = rates[valid].astype(np.int64).tolist()
+    return out.tolist()
+
+
+def throughput_summary(tx_rates, rx_rates, top_n=THROUGHPUT_TOP_N, use_numpy=None):
+    """
+    Per frame: total tx / rx rate over devices that have one (None when none do) and
+    the top_n devices by tx + rx as [device index, bytes/s] pairs, busiest first
+    (ties by index).
+    """
+    if len(tx_rates) == 0:
+        return {"total_tx_rate": [], "total_rx_rate": [], "top": []}
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return _summary_numpy(np.array(tx_rates, dtype=float), np.array(rx_rates, dtype=float), top_n)
+    total_tx, total_rx, top = [], [], []
+    for tx_row, rx_row in zip(tx_rates, rx_rates):
+        tx_values = [v for v in tx_row if v is not None]
+        rx_values = [v for v in rx_row if v is not None]
+        total_tx.append(sum(tx_values) if tx_values else None)
+        total_rx.append(sum(rx_values) if rx_values else None)
+        combined = [
+            (-((tx or 0) + (rx or 0)), e)
+            for e, (tx, rx) in enumerate(zip(tx_row, rx_row))
+            if tx is not None or rx is not None
+        ]
+        combined.sort()
+        top.append([[e, -negative] for negative, e in combined[:top_n] if negative < 0])
+    return {"total_tx_rate": total_tx, "total_rx_rate": total_rx, "top": top}
+
+
+def _summary_numpy(tx, rx, top_n):
+    has_tx = ~np.isnan(tx).all(axis=1)
+    has_rx = ~np.isnan(rx).all(axis=1)
+    total_tx = np.nansum(tx, axis=1)
+    total_rx = np.nansum(rx, axis=1)
+    combined = np.nan_to_num(tx) + np.nan_to_num(rx)
+    order = np.argsort(-combined, axis=1, kind="stable")[:, :top_n]
+    best = np.take_along_axis(combined, order, axis=1)
+    top = [
+        [[e, v] for e, v in zip(idx_row, val_row) if v > 0]
+        for idx_row, val_row in zip(order.tolist(), best.astype(np.int64).tolist())
+    ]
+    return {
+        "total_tx_rate": [int(v) if ok else None for v, ok in zip(total_tx.tolist(), has_tx.tolist())],
+        "total_rx_rate": [int(v) if ok else None for v, ok in zip(total_rx.tolist(), has_rx.tolist())],
+        "top": top,
+    }
+
+
+def throughput_block(frames, top_n=THROUGHPUT_TOP_N, use_numpy=None):
+    """
+    Rate series for a list of snapshot frames, for the timeline payloads:
+    {"devices": [{"id", "source"}], "tx_rate" / "rx_rate": [frame][device] bytes/s,
+     "total_tx_rate" / "total_rx_rate": [frame], "top": [frame][[device, bytes/s]],
+     "resets": counter resets seen}. Only devices that report a counter are listed.
+    Frames without a parseable timestamp are skipped.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    ts, entries = [], []
+    index, devices = {}, []
+    # One pass over the frames: parallel index / tx / rx lists per frame for every
+    # device with a counter (no per-device tuples: at 10k devices x 240 frames the
+    # cyclic GC would otherwise cost as much as the loop itself)
+    for frame in frames:
+        stamp = _epoch(frame.get("ts"))
+        if stamp is None:
+            continue
+        idx, txs, rxs = [], [], []
+        for dev in frame.get("devices", ()):
+            tx, rx = dev.get("tx_bytes"), dev.get("rx_bytes")
+            if tx is None and rx is None:
+                continue
+            key = (dev.get("source"), dev.get("id"))
+            i = index.get(key)
+            if i is None:
+                i = index[key] = len(devices)
+                devices.append({"id": key[1], "source": key[0]})
+            idx.append(i)
+            txs.append(tx)
+            rxs.append(rx)
+        ts.append(stamp)
+        entries.append((idx, txs, rxs))
+
+    if use_numpy and entries:
+        tx_counters = np.full((len(entries), len(devices)), np.nan)
+        rx_counters = np.full((len(entries), len(devices)), np.nan)
+        for f, (idx, txs, rxs) in enumerate(entries):
+            tx_counters[f, idx] = np.array(txs, dtype=float)
+            rx_counters[f, idx] = np.array(rxs, dtype=float)
+        tx_rates, tx_resets = _rates_numpy(ts, tx_counters)
+        rx_rates, rx_resets = _rates_numpy(ts, rx_counters)
+        block = {"devices": devices, "tx_rate": _to_lists(tx_rates), "rx_rate": _to_lists(rx_rates)}
+        block.update(_summary_numpy(tx_rates, rx_rates, top_n))
+        block["resets"] = tx_resets + rx_resets
+        return block
+
+    tx_counters, rx_counters = [], []
+    for idx, txs, rxs in entries:
+        tx_row, rx_row = [None] * len(devices), [None] * len(devices)
+        for i, tx, rx in zip(idx, txs, rxs):
+            tx_row[i] = tx
+            rx_row[i] = rx
+        tx_counters.append(tx_row)
+        rx_counters.append(rx_row)
+    tx_rates, tx_resets = rate_matrix(ts, tx_counters, use_numpy=False)
+    rx_rates, rx_resets = rate_matrix(ts, rx_counters, use_numpy=False)
+    block = {"devices": devices, "tx_rate": tx_rates, "rx_rate": rx_rates}
+    block.update(throughput_summary(tx_rates, rx_rates, top_n, use_numpy=False))
+    block["resets"] = tx_resets + rx_resets
+    return block
+
+
+class _Bucket:
+    """One timeline bucket: its frame's counters and its rates against the bucket before it."""
+
+    __slots__ = ("frame", "ts", "keys", "tx", "rx", "prev", "tx_rate", "rx_rate", "resets", "totals", "busiest", "dense")
+
+    def __init__(self, frame, ts, like=None):
+        self.frame = frame
+        self.ts = ts
+        keys, self.tx, self.rx = [], [], []
+        seen = {}
+        for dev in frame.get("devices", ()):
+            tx, rx = dev.get("tx_bytes"), dev.get("rx_bytes")
+            if tx is None and rx is None:
+                continue
+            key = (dev.get("source"), dev.get("id"))
+            i = seen.get(key)
+            if i is not None:  # a repeated device: the last entry wins, as in throughput_block
+                self.tx[i], self.rx[i] = tx, rx
+                continue
+            seen[key] = len(keys)
+            keys.append(key)
+            self.tx.append(tx)
+            self.rx.append(rx)
+        keys = tuple(keys)
+        # Share the key tuple with the previous bucket when the devices are the same,
+        # so alignment checks further on are identity checks
+        self.keys = like.keys if like is not None and like.keys == keys else keys
+        self.prev = False  # bucket the rates were computed against (None = first)
+        self.dense = None  # (devices, tx row, rx row, top) for that device list
+
+    def rates(self, prev, top_n):
+        """Rates against `prev` (None for the first bucket), as rate_matrix computes them."""
+        self.prev = prev
+        self.dense = None
+        width = len(self.keys)
+        self.tx_rate, self.rx_rate, self.resets = [None] * width, [None] * width, 0
+        self.totals, self.busiest = (None, None), []
+        if prev is None:
+            return
+        dt = self.ts - prev.ts
+        if dt <= 0:
+            return
+        if prev.keys is self.keys:
+            tx_before, rx_before = prev.tx, prev.rx
+        else:
+            at = dict(zip(prev.keys, range(len(prev.keys))))
+            tx_before, rx_before = [None] * width, [None] * width
+            for i, key in enumerate(self.keys):
+                j = at.get(key)
+                if j is not None:
+                    tx_before[i], rx_before[i] = prev.tx[j], prev.rx[j]
+        for now_values, before_values, out in (
+            (self.tx, tx_before, self.tx_rate),
+            (self.rx, rx_before, self.rx_rate),
+        ):
+            for i, (before, now) in enumerate(zip(before_values, now_values)):
+                if before is None or now is None:
+                    continue
+                increase = now - before
+                if increase < 0:
+                    increase = now
+                    self.resets += 1
+                out[i] = round(increase / dt)
+
+        tx_values = [v for v in self.tx_rate if v is not None]
+        rx_values = [v for v in self.rx_rate if v is not None]
+        self.totals = (sum(tx_values) if tx_values else None, sum(rx_values) if rx_values else None)
+        # Top-N candidates by rate only, with every device tied with the last one:
+        # ties go by device index, which depends on the whole window
+        combined = [
+            (-((tx or 0) + (rx or 0)), key)
+            for key, tx, rx in zip(self.keys, self.tx_rate, self.rx_rate)
+            if tx is not None or rx is not None
+        ]
+        top = heapq.nsmallest(top_n, combined, key=itemgetter(0))
+        last = top[-1][0] if top else 0
+        self.busiest = [(negative, key) for negative, key in combined if negative < 0 and negative <= last]
+
+
+class ThroughputSeries:
+    """
+    throughput_block for a timeline that changes a bucket at a time (TimelineBuilder):
+    each bucket keeps its counters, its rate row against the bucket before it and that
+    row laid out for the device list of the last block it was part of. update() only
+    computes the new or replaced bucket (and the one after it, or the new first bucket
+    after expiry); block() reuses the other rows while the device list stays the same.
+    A block over every bucket is the same as throughput_block over the same frames.
+    """
+
+    def __init__(self, top_n=THROUGHPUT_TOP_N):
+        self.top_n = top_n
+        self.buckets = {}  # bucket key -> _Bucket, in time order
+        self.devices = ()  # (source, id) in first-appearance order, as of the last block
+        self.device_list = []
+
+    def update(self, buckets):
+        """Take the timeline's current [(bucket key, frame)] in time order."""
+        current = {}
+        prev = None
+        for key, frame in buckets:
+            bucket = self.buckets.get(key)
+            if bucket is None or bucket.frame is not frame:
+                ts = _epoch(frame.get("ts"))
+                if ts is None:
+                    continue
+                bucket = _Bucket(frame, ts, like=prev)
+            if bucket.prev is not prev:
+                bucket.rates(prev, self.top_n)
+            current[key] = prev = bucket
+        self.buckets = current
+
+    def block(self, keys=None):
+        """
+        Throughput block for the given bucket keys in time order (default: all). Rates of
+        the first one are still against the bucket before it, so the blocks of
+        consecutive key ranges line up with the block over all of them.
+        """
+        if keys is None:
+            rows = list(self.buckets.values())
+        else:
+            rows = [self.buckets[key] for key in keys if key in self.buckets]
+
+        index, order, last = {}, [], None
+        for bucket in rows:
+            if bucket.keys is last:
+                continue
+            last = bucket.keys
+            for device in last:
+                if device not in index:
+                    index[device] = len(order)
+                    order.append(device)
+        order = tuple(order)
+        if order != self.devices:
+            self.devices = order
+            self.device_list = [{"id": device_id, "source": source} for source, device_id in order]
+        devices = self.devices
+
+        block = {
+            "devices": self.device_list,
+            "tx_rate": [],
+            "rx_rate": [],
+            "total_tx_rate": [],
+            "total_rx_rate": [],
+            "top": [],
+            "resets": 0,
+        }
+        width = len(devices)
+        for bucket in rows:
+            if bucket.dense is None or bucket.dense[0] is not devices:
+                bucket.dense = (devices, *self._dense(bucket, devices, index, width))
+            _, tx_row, rx_row, top = bucket.dense
+            block["tx_rate"].append(tx_row)
+            block["rx_rate"].append(rx_row)
+            block["total_tx_rate"].append(bucket.totals[0])
+            block["total_rx_rate"].append(bucket.totals[1])
+            block["top"].append(top)
+            block["resets"] += bucket.resets
+        return block
+
+    def _dense(self, bucket, devices, index, width):
+        """Rate rows over the whole device list and the top-N by device index."""
+        keys = bucket.keys
+        if devices[: len(keys)] == keys:  # positions are device indexes
+            pad = [None] * (width - len(keys))
+            tx_row, rx_row = bucket.tx_rate + pad, bucket.rx_rate + pad
+        else:
+            tx_row, rx_row = [None] * width, [None] * width
+            for key, tx, rx in zip(keys, bucket.tx_rate, bucket.rx_rate):
+                e = index[key]
+                tx_row[e], rx_row[e] = tx, rx
+        top = sorted((negative, index[key]) for negative, key in bucket.busiest)[: self.top_n]
+        return tx_row, rx_row, [[e, -negative] for negative, e in top]
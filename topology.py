@@ -0,0 +1,431 @@
+"""
+Topology graph of the network for path and failure-impact highlighting on the map.
+
+The links of a formatted network_data payload (wired_unifi uplinks and UISP
+data-links) become an adjacency-indexed, undirected graph over device/site ids.
+Per node it keeps:
+
+- hops and parent: breadth-first distance to the nearest gateway and the next node on
+  that shortest path (follow parents to get the whole path);
+- the immediate dominator: the node whose failure is the first to cut this one off
+  from every gateway. The dominator tree gives the exact "what goes dark if this
+  radio dies" set, so a station that can also reach the gateway over a second link
+  is not counted as downstream of the first.
+
+Dominators come from one Tarjan low-link DFS per component (a child whose subtree
+has no back edge above its DFS parent is dominated by that parent). The dominator
+tree is laid out in DFS preorder, so the downstream set of a node is the contiguous
+run of `size - 1` nodes after it.
+
+Updates are incremental. A dominator subtree is attached to the rest of the graph
+only through its root, so when links change inside the subtree of one node, only
+that subtree is recomputed; links that join or split components, new or vanished
+devices and gateway changes recompute the components involved.
+"""
+
+from collections import deque
+
+# UniFi gateways (UGW, UDM, UXG) and UISP routers start the paths
+TOPOLOGY_GATEWAY_TYPES = ("ugw", "udm", "uxg", "router", "erouter")
+INACTIVE_LINK_STATES = ("inactive", "disconnected", "down")
+
+VIRTUAL_ROOT = -1
+
+
+def active_links(data):
+    """(from, to) for every link in a network_data payload that is not down."""
+    for link in data.get("links", []):
+        a, b = link.get("from"), link.get("to")
+        if not a or not b or a == b:
+            continue
+        if str(link.get("state") or "active").lower() in INACTIVE_LINK_STATES:
+            continue
+        yield a, b
+
+
+def gateway_ids(data, extra=()):
+    """Ids of devices whose type marks them as a gateway, plus `extra` ids."""
+    found = set(extra)
+    for source in ("unifi", "uisp"):
+        for dev in data.get(source, []):
+            if str(dev.get("type") or "").lower() in TOPOLOGY_GATEWAY_TYPES and dev.get("id"):
+                found.add(dev["id"])
+    return found
+
+
+class TopologyGraph:
+    """
+    Incrementally maintained topology. Node numbers are interned ids and stay stable
+    across updates; nodes that disappear are kept as absent so their numbers are not
+    reused. hops/parent/idom are -1 for "none" (idom is also -1 for the gateways,
+    whose immediate dominator is the virtual root linking them).
+    """
+
+    def __init__(self, extra_gateways=()):
+        self.extra_gateways = set(extra_gateways)
+        self.index = {}  # id -> node
+        self.ids = []
+        self.present = []
+        self.gateway = []
+        self.present_set = set()
+        self.gateway_set = set()
+        self.adj = []  # node -> {neighbor: number of links}
+        self.incoming = []  # links ending at the node ("to" side)
+        self.edges = {}  # (from node, to node) -> number of links
+        self.hops = []
+        self.parent = []
+        self.idom = []
+        self.comp = []  # node -> component key, or None
+        # key -> {"order": [nodes in dominator preorder], "size": {node: subtree size},
+        #         "pre": {node: position in order}, "rooted": has a gateway}
+        self.components = {}
+        self.next_key = 0
+        self.payload = None
+
+    def _intern(self, node_id):
+        node = self.index.get(node_id)
+        if node is None:
+            node = self.index[node_id] = len(self.ids)
+            self.ids.append(node_id)
+            self.present.append(False)
+            self.gateway.append(False)
+            self.adj.append({})
+            self.incoming.append(0)
+            self.hops.append(-1)
+            self.parent.append(-1)
+            self.idom.append(-1)
+            self.comp.append(None)
+        return node
+
+    def update(self, data):
+        """
+        Bring the graph up to date with a network_data payload.
+        Returns {"changed", "nodes", "links", "components", "recomputed_nodes"}.
+        """
+        present = set()
+        for source in ("unifi", "uisp"):
+            for dev in data.get(source, []):
+                if dev.get("id"):
+                    present.add(self._intern(dev["id"]))
+        edges = {}
+        for a, b in active_links(data):
+            key = (self._intern(a), self._intern(b))
+            present.update(key)
+            edges[key] = edges.get(key, 0) + 1
+        gateways = {self.index[g] for g in gateway_ids(data, self.extra_gateways) if g in self.index}
+
+        changed_edges = []
+        rooting = set()  # nodes whose presence or gateway flag changed
+        sources = set()  # nodes whose "no incoming link" flag changed
+        if edges != self.edges:
+            for key in set(self.edges) | set(edges):
+                delta = edges.get(key, 0) - self.edges.get(key, 0)
+                if delta:
+                    linked, source = self._add_edge(key[0], key[1], delta)
+                    if linked:
+                        changed_edges.append(key)
+                    if source:
+                        sources.add(key[1])
+            self.edges = edges
+        for node in (present ^ self.present_set) | (gateways ^ self.gateway_set):
+            self.present[node], self.gateway[node] = node in present, node in gateways
+            rooting.add(node)
+        self.present_set, self.gateway_set = present, gateways
+        # Without gateways a component is rooted at its sources, so those count too
+        rooting.update(
+            n for n in sources if self.comp[n] is None or not self.components[self.comp[n]]["rooted"]
+        )
+
+        changed = bool(changed_edges or rooting)
+        recomputed = self._apply(changed_edges, rooting) if changed else 0
+        if changed:
+            self.payload = None
+        return {
+            "changed": changed,
+            "nodes": len(present),
+            "links": sum(edges.values()),
+            "components": len(self.components),
+            "recomputed_nodes": recomputed,
+        }
+
+    def _add_edge(self, a, b, delta):
+        """Adjust link counts. Returns (adjacency changed, b's "no incoming link" flag changed)."""
+        linked = False
+        for x, y in ((a, b), (b, a)):
+            before = self.adj[x].get(y, 0)
+            count = before + delta
+            if count > 0:
+                self.adj[x][y] = count
+            else:
+                self.adj[x].pop(y, None)
+            linked = linked or (before > 0) != (count > 0)
+        before = self.incoming[b]
+        self.incoming[b] += delta
+        return linked, (before > 0) != (self.incoming[b] > 0)
+
+    def _apply(self, changed_edges, rooting):
+        """Recompute what the changes can affect. Returns the number of nodes recomputed."""
+        full = set(rooting)
+        inside = {}  # component key -> links changed within it
+        for a, b in changed_edges:
+            key = self.comp[a]
+            if key is None or key != self.comp[b] or not self.components[key]["rooted"]:
+                full.update((a, b))
+            else:
+                inside.setdefault(key, []).append((a, b))
+
+        full_keys = {self.comp[n] for n in full}
+        regions = []
+        for key, links in inside.items():
+            if key in full_keys:
+                # Rebuilt anyway; the endpoints make sure every piece of a split is found
+                full.update(node for link in links for node in link)
+                continue
+            tops = {self._common_dominator(a, b) for a, b in links}
+            if VIRTUAL_ROOT in tops:
+                full.update(node for link in links for node in link)
+                continue
+            # Keep the outermost subtrees; nested ones are rebuilt with them
+            for top in tops:
+                up = self.idom[top]
+                while up != VIRTUAL_ROOT and up not in tops:
+                    up = self.idom[up]
+                if up == VIRTUAL_ROOT:
+                    regions.append((key, top))
+        total = self._recompute_components(full) if full else 0
+        for key, top in regions:
+            total += self._recompute_region(key, top)
+        return total
+
+    def _common_dominator(self, a, b):
+        """Deepest node dominating both a and b (VIRTUAL_ROOT if only the virtual root does)."""
+        ancestors = {a}
+        while a != VIRTUAL_ROOT:
+            a = self.idom[a]
+            ancestors.add(a)
+        while b not in ancestors:
+            b = self.idom[b]
+        return b
+
+    def _recompute_components(self, dirty):
+        """Rebuild every component that holds a dirty node, as the graph is now."""
+        seen = set()
+        affected = []
+        for start in sorted(dirty):
+            if start in seen:
+                continue
+            members = self._component(start) if self.present[start] else [start]
+            seen.update(members)
+            affected.append(members)
+        # Old components may have split or merged: drop every one a member was in first
+        for members in affected:
+            for node in members:
+                if self.comp[node] is not None:
+                    self.components.pop(self.comp[node], None)
+                    self.comp[node] = None
+        total = 0
+        for members in affected:
+            if self.present[members[0]]:
+                self._solve(members)
+                total += len(members)
+            else:
+                self.hops[members[0]] = self.parent[members[0]] = self.idom[members[0]] = -1
+        return total
+
+    def _component(self, start):
+        members = [start]
+        seen = {start}
+        queue = deque(members)
+        while queue:
+            node = queue.popleft()
+            for nb in self.adj[node]:
+                if nb not in seen:
+                    seen.add(nb)
+                    members.append(nb)
+                    queue.append(nb)
+        return members
+
+    def _roots(self, members):
+        """Gateways in the component; without any, the nodes no link points to (not lone nodes)."""
+        roots = [n for n in members if self.gateway[n]]
+        if not roots and len(members) > 1:
+            roots = [n for n in members if self.incoming[n] == 0]
+        return sorted(roots, key=self.ids.__getitem__)
+
+    def _solve(self, members):
+        """Hops, parents, dominators and the preorder layout for one whole component."""
+        key = self.next_key
+        self.next_key += 1
+        for node in members:
+            self.comp[node] = key
+            self.hops[node] = self.parent[node] = self.idom[node] = -1
+        roots = self._roots(members)
+        if roots:
+            order, size = self._layout(VIRTUAL_ROOT, roots)
+        else:
+            order, size = list(members), {node: 1 for node in members}
+        self.components[key] = {
+            "order": order,
+            "size": size,
+            "pre": {node: i for i, node in enumerate(order)},
+            # Only gateways keep a component's roots fixed; fallback roots are rebuilt each time
+            "rooted": any(self.gateway[n] for n in roots),
+        }
+
+    def _recompute_region(self, key, top):
+        """
+        Rebuild the dominator subtree of `top`, whose own path is unaffected. Nodes
+        cut off from `top` can reach nothing else, so they become components of their own.
+        """
+        component = self.components[key]
+        start, count = component["pre"][top], component["size"][top]
+        region = component["order"][start:start + count]
+        order, size = self._layout(top, None, set(region))
+        component["order"][start:start + count] = order
+        component["size"].update(size)
+        lost = [node for node in region if node not in size]
+        if lost:
+            for node in lost:
+                del component["size"][node]
+                self.comp[node] = None
+            ancestor = self.idom[top]
+            while ancestor != VIRTUAL_ROOT:
+                component["size"][ancestor] -= len(lost)
+                ancestor = self.idom[ancestor]
+            component["pre"] = {node: i for i, node in enumerate(component["order"])}
+            self._recompute_components(lost)
+        else:
+            for i, node in enumerate(order, start):
+                component["pre"][node] = i
+        return count
+
+    def _layout(self, top, roots, inside=None):
+        """
+        Shortest paths and dominators below `top`: either VIRTUAL_ROOT linked to
+        `roots`, or a node (keeping its own hops) restricted to the `inside` nodes.
+        Returns (dominator-tree preorder, {node: subtree size}) for the nodes reached,
+        `top` included when it is a real node.
+        """
+        adj = self.adj
+        virtual = top == VIRTUAL_ROOT
+        first = roots if virtual else [n for n in adj[top] if n in inside]
+        root_set = set(roots or ())
+
+        # Shortest paths: every root at 0, or counting on from top's own hops
+        depth = {}
+        queue = deque()
+        if virtual:
+            for root in roots:
+                depth[root] = 0
+                self.parent[root] = -1
+                queue.append(root)
+        else:
+            depth[top] = self.hops[top]
+            queue.append(top)
+        while queue:
+            node = queue.popleft()
+            for nb in adj[node]:
+                if nb not in depth and (inside is None or nb in inside):
+                    depth[nb] = depth[node] + 1
+                    self.parent[nb] = node
+                    queue.append(nb)
+
+        # Tarjan low-links; a root's link to the virtual root is a back edge to disc 0
+        disc, low = {top: 0}, {top: 0}
+        tree_parent = {}
+        preorder = []
+        stack = [(top, iter(first))]
+        while stack:
+            node, neighbors = stack[-1]
+            for nb in neighbors:
+                if inside is not None and nb not in inside:
+                    continue
+                if nb not in disc:
+                    disc[nb] = low[nb] = len(disc)
+                    if nb in root_set:
+                        low[nb] = 0
+                    tree_parent[nb] = node
+                    preorder.append(nb)
+                    stack.append((nb, iter(adj[nb])))
+                    break
+                if nb != tree_parent.get(node) and disc[nb] < low[node]:
+                    low[node] = disc[nb]
+            else:
+                stack.pop()
+                if stack:
+                    up = stack[-1][0]
+                    if low[node] < low[up]:
+                        low[up] = low[node]
+
+        idom = {}
+        children = {}
+        for node in preorder:
+            up = tree_parent[node]
+            if up == top or low[node] >= disc[up]:
+                idom[node] = up
+            else:
+                idom[node] = idom[up]
+            children.setdefault(idom[node], []).append(node)
+            self.idom[node] = idom[node]
+            self.hops[node] = depth[node]
+
+        order = []
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(reversed(children.get(node, ())))
+        size = {}
+        for node in reversed(order):
+            size[node] = size.get(node, 0) + 1
+            if node != top:
+                size[idom[node]] = size.get(idom[node], 0) + size[node]
+        if virtual:
+            order.pop(0)
+            size.pop(VIRTUAL_ROOT)
+        return order, size
+
+    def to_payload(self):
+        """
+        Compact artifact for the map, nodes in dominator-tree preorder:
+        {"nodes": [id], "gateways": [i], "hops": [i], "parent": [i], "dom": [i],
+         "size": [i]} with -1 for "none". The downstream set of node i is
+        nodes[i + 1 : i + size[i]]; its path to the gateway follows parent.
+        """
+        if self.payload is not None:
+            return self.payload
+        layout = []
+        sizes = {}
+        for component in sorted(self.components.values(), key=lambda c: self.ids[c["order"][0]]):
+            layout.extend(component["order"])
+            sizes.update(component["size"])
+        position = {node: i for i, node in enumerate(layout)}
+        self.payload = {
+            "nodes": [self.ids[n] for n in layout],
+            "gateways": [i for i, n in enumerate(layout) if self.hops[n] == 0],
+            "hops": [self.hops[n] for n in layout],
+            "parent": [position.get(self.parent[n], -1) for n in layout],
+            "dom": [position.get(self.idom[n], -1) for n in layout],
+            "size": [sizes[n] for n in layout],
+        }
+        return self.payload
+
+    def path_to_gateway(self, node_id):
+        """Ids from `node_id` to its nearest gateway (inclusive); [] when none is reachable."""
+        node = self.index.get(node_id)
+        if node is None or self.hops[node] < 0:
+            return []
+        path = [node_id]
+        while self.parent[node] >= 0:
+            node = self.parent[node]
+            path.append(self.ids[node])
+        return path
+
+    def downstream(self, node_id):
+        """Ids that lose every path to a gateway if `node_id` fails."""
+        node = self.index.get(node_id)
+        if node is None or self.comp[node] is None or self.hops[node] < 0:
+            return []
+        component = self.components[self.comp[node]]
+        start = component["pre"][node]
+        return [self.ids[n] for n in component["order"][start + 1:start + component["size"][node]]]
@@ -0,0 +1,155 @@
+"""
+Static file server for the map (used by the web container).
+Like `python -m http.server`, but when the browser accepts it and a fresh
+precompressed sibling exists (file.json.br / file.json.gz written by the
+collector), that sibling is sent with the matching Content-Encoding.
+Single byte ranges (`Range: bytes=a-b`) are answered with 206, so a
+Cloud Optimized GeoTIFF is read tile by tile instead of downloaded whole.
+"""
+
+import argparse
+import os
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# Preferred first: Content-Encoding token -> file suffix
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(header):
+    """Parse Accept-Encoding into the set of tokens with non-zero quality."""
+    accepted = set()
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(token.lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None if the header is
+    absent or not a single byte range (served as a full 200), or ValueError
+    if the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, sep, last = header[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+class PrecompressedHandler(SimpleHTTPRequestHandler):
+    # Bytes left to send for a 206 response (None: copy the whole file)
+    range_remaining = None
+
+    def send_head(self):
+        self.range_remaining = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and self.headers.get("Range"):
+            return self.send_range(path)
+        if os.path.isfile(path):
+            accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+            for encoding, suffix in PRECOMPRESSED:
+                if encoding not in accepted:
+                    continue
+                sibling = path + suffix
+                try:
+                    if os.stat(sibling).st_mtime_ns < os.stat(path).st_mtime_ns:
+                        continue  # stale sibling from an older write
+                except OSError:
+                    continue
+                return self.send_precompressed(path, sibling, encoding)
+        return super().send_head()
+
+    def send_precompressed(self, path, sibling, encoding):
+        try:
+            f = open(sibling, "rb")
+        except OSError:
+            return super().send_head()
+        fs = os.fstat(f.fileno())
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(fs.st_size))
+        self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        return f
+
+    def send_range(self, path):
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return super().send_head()
+        fs = os.fstat(f.fileno())
+        try:
+            byte_range = parse_range(self.headers.get("Range"), fs.st_size)
+        except ValueError:
+            f.close()
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{fs.st_size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+        if byte_range is None:
+            f.close()
+            return super().send_head()
+        start, end = byte_range
+        f.seek(start)
+        self.range_remaining = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{fs.st_size}")
+        self.send_header("Content-Length", str(self.range_remaining))
+        self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if self.range_remaining is None:
+            return super().copyfile(source, outputfile)
+        remaining = self.range_remaining
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the map with precompressed JSON.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--bind", default="0.0.0.0")
+    parser.add_argument("--directory", default=os.getcwd())
+    args = parser.parse_args()
+
+    handler = lambda *a, **kw: PrecompressedHandler(*a, directory=args.directory, **kw)  # noqa: E731
+    server = ThreadingHTTPServer((args.bind, args.port), handler)
+    print(f"[web] serving {args.directory} on http://{args.bind}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()